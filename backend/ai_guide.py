@@ -1,38 +1,62 @@
 # /backend/ai_guide.py
-import os
-import google.generativeai as genai
+from typing import AsyncIterator
 from dotenv import load_dotenv
 
+from llm_client import aqi_band_description, get_llm_client, make_cache_key, parse_health_conditions
+
 load_dotenv()
 
-# Configure the Gemini API with your key
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-pro')
+FALLBACK_MESSAGE = "I'm sorry, I'm having trouble connecting to my reasoning engine right now. Please try again in a moment."
 
-def get_gemini_response(user_profile: dict, air_quality: dict, user_question: str) -> str:
+def build_prompt(user_profile: dict, air_quality: dict, user_question: str) -> str:
     """
-    Constructs a detailed prompt and gets a personalized response from Gemini.
+    Constructs the prompt for the AI guide.
+
+    Answers are cached and shared between users with the same persona,
+    health conditions and AQI band, so the prompt deliberately leaves out
+    anything user-specific beyond those (e.g. the user's name) and gives
+    the AQI only as its band, never the exact value.
     """
-    try:
-        # --- This is our Prompt Engineering ---
-        # We create a detailed context for the AI so it can give a relevant answer.
-        prompt = f"""
-        You are AURA, a helpful and friendly AI environmental assistant. 
-        Your user's name is {user_profile.get('name', 'there')}.
-        Their persona is '{user_profile.get('persona', 'a concerned citizen')}'.
-        Their known health conditions are: {user_profile.get('health_conditions', 'none')}.
+    # --- This is our Prompt Engineering ---
+    # We create a detailed context for the AI so it can give a relevant answer.
+    conditions = parse_health_conditions(user_profile.get('health_conditions')) or ['none']
+    return f"""
+    You are AURA, a helpful and friendly AI environmental assistant.
+    Your user's persona is '{user_profile.get('persona') or 'a concerned citizen'}'.
+    Their known health conditions are: {', '.join(conditions)}.
 
-        Current environmental data for their location:
-        - Air Quality Index (AQI): {air_quality.get('aqi', 'not available')}
+    Current environmental data for their location:
+    - Air quality category: {aqi_band_description(air_quality.get('aqi')) or 'not available'}
 
-        Based on all this context, please answer the following question from the user in a helpful and concise way.
-        
-        User's question: "{user_question}"
-        """
+    Based on all this context, please answer the following question from the user in a helpful and concise way.
+    Do not address the user by name.
 
-        response = model.generate_content(prompt)
-        return response.text
+    User's question: "{user_question}"
+    """
 
+def _cache_key(user_profile: dict, air_quality: dict, user_question: str) -> tuple:
+    return make_cache_key(user_question, user_profile.get('persona'),
+                          user_profile.get('health_conditions'), air_quality.get('aqi'))
+
+async def get_gemini_response(user_profile: dict, air_quality: dict, user_question: str) -> str:
+    """
+    Gets a personalized response from Gemini without blocking the event loop.
+    """
+    try:
+        prompt = build_prompt(user_profile, air_quality, user_question)
+        return await get_llm_client().generate(prompt, cache_key=_cache_key(user_profile, air_quality, user_question))
     except Exception as e:
         print(f"Error communicating with Gemini API: {e}")
-        return "I'm sorry, I'm having trouble connecting to my reasoning engine right now. Please try again in a moment."
\ No newline at end of file
+        return FALLBACK_MESSAGE
+
+async def stream_gemini_response(user_profile: dict, air_quality: dict, user_question: str) -> AsyncIterator[str]:
+    """
+    Same as get_gemini_response but yields tokens as they are generated.
+    """
+    try:
+        prompt = build_prompt(user_profile, air_quality, user_question)
+        async for token in get_llm_client().stream(prompt, cache_key=_cache_key(user_profile, air_quality, user_question)):
+            yield token
+    except Exception as e:
+        print(f"Error streaming from Gemini API: {e}")
+        yield FALLBACK_MESSAGE
@@ -0,0 +1,155 @@
+# /backend/alert_engine.py
+"""
+Batch personalized alerting for every registered user.
+
+One run loads all users with a work location and the latest reading at
+every monitoring location, matches each user to the nearest reading with
+a KD-tree, scores everyone at once with personalization_engine's batch
+rules and writes an alert only for users whose risk level changed since
+the previous run. The ingestion daemon runs a cycle as its "alerts" source.
+"""
+import time
+import numpy as np
+from scipy.spatial import cKDTree
+from sqlalchemy import text
+from database import SessionLocal
+from grid_utils import EARTH_RADIUS_KM, to_xyz
+from personalization_engine import classify_batch
+from rules_engine import get_rules
+
+# --- CONFIGURATION ---
+RECENT_WINDOW_HOURS = 12      # same window the single-user endpoint uses
+MAX_MATCH_DISTANCE_KM = 100   # users further than this from any reading get no alert
+WRITE_CHUNK_SIZE = 10_000
+
+CREATE_ALERT_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS alerts (
+        id BIGSERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        risk_level VARCHAR(20) NOT NULL,
+        previous_risk_level VARCHAR(20),
+        recommendation TEXT,
+        aqi DOUBLE PRECISION,
+        latitude DOUBLE PRECISION,
+        longitude DOUBLE PRECISION
+    );
+    CREATE INDEX IF NOT EXISTS idx_alerts_user_created ON alerts (user_id, created_at DESC);
+
+    CREATE TABLE IF NOT EXISTS user_alert_state (
+        user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+        risk_level VARCHAR(20) NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+"""
+
+
+def load_users(db):
+    rows = db.execute(text("""
+        SELECT u.id, u.health_conditions,
+               ST_Y(u.work_location) AS lat, ST_X(u.work_location) AS lon,
+               s.risk_level AS previous_risk_level
+        FROM users u
+        LEFT JOIN user_alert_state s ON s.user_id = u.id
+        WHERE u.work_location IS NOT NULL;
+    """)).all()
+    if not rows:
+        return None
+    ids, conditions, lats, lons, previous = zip(*rows)
+    return {
+        "id": np.asarray(ids, dtype=np.int64),
+        "lat": np.asarray(lats, dtype=float),
+        "lon": np.asarray(lons, dtype=float),
+        "condition_masks": get_rules().condition_masks(conditions),
+        "previous_risk_level": np.asarray(previous, dtype=object),
+    }
+
+
+def load_latest_readings(db):
+    """The most recent reading at each location within the recent window."""
+    rows = db.execute(text(f"""
+        SELECT DISTINCT ON (latitude, longitude)
+            latitude, longitude, computed_aqi AS aqi
+        FROM air_quality_data
+        WHERE time > (SELECT MAX(time) FROM air_quality_data) - INTERVAL '{RECENT_WINDOW_HOURS} hours'
+          AND computed_aqi IS NOT NULL
+        ORDER BY latitude, longitude, time DESC;
+    """)).all()
+    if not rows:
+        return None
+    lats, lons, aqi = (np.asarray(col, dtype=float) for col in zip(*rows))
+    return {"lat": lats, "lon": lons, "aqi": aqi}
+
+
+def match_users_to_readings(users, readings):
+    """Nearest reading for every user; AQI is NaN where the nearest one is too far away."""
+    tree = cKDTree(to_xyz(readings["lat"], readings["lon"], radius=1.0))
+    chord, idx = tree.query(to_xyz(users["lat"], users["lon"], radius=1.0), k=1)
+    distance_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+    aqi = readings["aqi"][idx].copy()
+    aqi[distance_km > MAX_MATCH_DISTANCE_KM] = np.nan
+    return aqi, idx
+
+
+def write_changed_alerts(db, users, aqi, risk_levels, recommendations, reading_idx, readings):
+    changed = risk_levels != users["previous_risk_level"]
+    changed &= ~np.isnan(aqi)
+    positions = np.flatnonzero(changed)
+    if positions.size == 0:
+        return 0
+
+    alert_rows = [{
+        "user_id": int(users["id"][i]),
+        "risk_level": risk_levels[i],
+        "previous_risk_level": users["previous_risk_level"][i],
+        "recommendation": recommendations[i],
+        "aqi": float(aqi[i]),
+        "lat": float(readings["lat"][reading_idx[i]]),
+        "lon": float(readings["lon"][reading_idx[i]]),
+    } for i in positions]
+
+    insert_alert = text("""
+        INSERT INTO alerts (user_id, risk_level, previous_risk_level, recommendation, aqi, latitude, longitude)
+        VALUES (:user_id, :risk_level, :previous_risk_level, :recommendation, :aqi, :lat, :lon);
+    """)
+    upsert_state = text("""
+        INSERT INTO user_alert_state (user_id, risk_level, updated_at)
+        VALUES (:user_id, :risk_level, NOW())
+        ON CONFLICT (user_id) DO UPDATE SET risk_level = EXCLUDED.risk_level, updated_at = NOW();
+    """)
+    for start in range(0, len(alert_rows), WRITE_CHUNK_SIZE):
+        chunk = alert_rows[start:start + WRITE_CHUNK_SIZE]
+        db.execute(insert_alert, chunk)
+        db.execute(upsert_state, chunk)
+    return len(alert_rows)
+
+
+def run_alert_cycle() -> dict:
+    """Scores every user against the latest data and records changed alerts."""
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        users = load_users(db)
+        readings = load_latest_readings(db)
+        if users is None or readings is None:
+            print("No users with a work location or no recent readings; nothing to do.")
+            return {"users": 0, "alerts": 0}
+
+        aqi, reading_idx = match_users_to_readings(users, readings)
+        risk_levels, recommendations = classify_batch(aqi, users["condition_masks"])
+        written = write_changed_alerts(db, users, aqi, risk_levels, recommendations, reading_idx, readings)
+        db.commit()
+
+        elapsed = time.perf_counter() - started
+        print(f"✅ Scored {len(users['id'])} users in {elapsed:.2f}s; {written} risk levels changed.")
+        return {"users": int(len(users["id"])), "alerts": written, "seconds": round(elapsed, 3)}
+    except Exception as e:
+        print(f"An error occurred during the alert cycle: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_alert_cycle()
@@ -0,0 +1,343 @@
+# /backend/analytics_store.py
+"""
+Columnar copy of the ingested data for analytics and model training.
+
+Postgres stays the store the API writes to and reads recent data from.
+Every ingested batch is also appended here, so long-range reads (training
+sets, trends) scan compressed columns on disk instead of pulling millions
+of rows through the DB driver:
+
+    ANALYTICS_DIR/
+      air_quality/date=2025-09-16/source=WAQI/part-<uuid>.parquet
+      weather/date=2025-09-16/part-<uuid>.parquet
+      tempo_grid.zarr             (time, lat, lon) cube of TEMPO NO2
+
+Parquet datasets are hive-partitioned, so `read_*` prunes whole
+directories by date/source before opening a file. The remaining filters
+are pushed down to row-group statistics and only the requested columns
+are decoded. Batches are append-only. A re-sent row is deduplicated on
+read (the latest non-null value per column wins, as with the 'coalesce'
+upsert), and `compact()` rewrites a day into one deduplicated file.
+
+TEMPO level-1 cells are binned onto a fixed TEMPO_CUBE_STEP_DEG grid, one
+time slice per hour. A later granule in the same hour fills in the cells it
+covers. There is one writer per store (the ingestion process); readers may be
+anywhere.
+
+pyarrow (Parquet) and zarr are imported on first use. Exports never fail an
+ingest; they log and return 0.
+"""
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+
+# --- CONFIGURATION ---
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", "analytics")
+ANALYTICS_EXPORT = os.getenv("ANALYTICS_EXPORT", "1") == "1"   # set 0 to stop appending on ingest
+STATION_DATASET = "air_quality"
+WEATHER_DATASET = "weather"
+TEMPO_CUBE = "tempo_grid.zarr"
+STATION_KEYS = ["time", "latitude", "longitude"]
+STATION_COLUMNS = ["time", "latitude", "longitude", "source", "aqi", "pm25", "pm10", "o3", "no2", "so2", "co",
+                   "computed_aqi", "dominant_pollutant"]
+WEATHER_COLUMNS = ["time", "latitude", "longitude", "temperature_2m", "relative_humidity_2m",
+                   "precipitation", "wind_speed_10m"]
+
+# TEMPO field of regard; override for other regions, e.g. "8,68,37,97".
+TEMPO_CUBE_BBOX = tuple(float(v) for v in os.getenv("TEMPO_CUBE_BBOX", "14,-141,64,-41").split(","))
+TEMPO_CUBE_STEP_DEG = float(os.getenv("TEMPO_CUBE_STEP_DEG", "0.05"))
+TEMPO_CUBE_CHUNKS = (1, 256, 256)
+TEMPO_CUBE_VARIABLES = ["no2_tropospheric"]
+
+
+def _path(name):
+    return os.path.join(ANALYTICS_DIR, name)
+
+def has_data(name: str = STATION_DATASET) -> bool:
+    return os.path.isdir(_path(name)) and any(os.scandir(_path(name)))
+
+
+# --- Parquet datasets ---
+
+def _schema(names):
+    import pyarrow as pa
+    types = {"time": pa.timestamp("us", tz="UTC"), "ingested_at": pa.timestamp("us", tz="UTC"),
+             "source": pa.string(), "dominant_pollutant": pa.string(), "aqi": pa.int32()}
+    return pa.schema([(n, types.get(n, pa.float64())) for n in names])
+
+def _partitioning(name):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    fields = [("date", pa.string())] + ([("source", pa.string())] if name == STATION_DATASET else [])
+    return ds.partitioning(pa.schema(fields), flavor="hive")
+
+def _to_table(columns: dict, names):
+    """Equal-length columns (arrays, Series, lists) -> an Arrow table with a UTC `date` partition column."""
+    import pandas as pd
+    import pyarrow as pa
+    n = len(columns["time"])
+    frame = pd.DataFrame({name: (columns[name] if name in columns else [None] * n) for name in names})
+    frame["time"] = pd.to_datetime(frame["time"], utc=True, format="mixed")
+    frame["ingested_at"] = pd.Timestamp.now(tz="UTC")
+    frame = frame.dropna(subset=STATION_KEYS)
+    if "aqi" in frame:
+        frame["aqi"] = pd.to_numeric(frame["aqi"], errors="coerce").astype("Int32")
+    table = pa.Table.from_pandas(frame, schema=_schema(list(names) + ["ingested_at"]), preserve_index=False)
+    return table.append_column("date", pa.array(frame["time"].dt.strftime("%Y-%m-%d"), pa.string()))
+
+def _append(name, columns: dict, names) -> int:
+    if not ANALYTICS_EXPORT or len(columns["time"]) == 0:
+        return 0
+    try:
+        import pyarrow.dataset as ds
+        table = _to_table(columns, names)
+        ds.write_dataset(table, _path(name), format="parquet", partitioning=_partitioning(name),
+                         basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                         existing_data_behavior="overwrite_or_ignore")
+        return table.num_rows
+    except Exception as e:
+        print(f"❌ Analytics export to '{name}' failed: {e}")
+        return 0
+
+def append_stations(columns: dict) -> int:
+    """Appends station rows (keys as STATION_COLUMNS; missing pollutants are null)."""
+    return _append(STATION_DATASET, columns, STATION_COLUMNS)
+
+def append_station_records(records: list) -> int:
+    """append_stations for list-of-dict batches (lat/lon keys accepted as in the WAQI ingestors)."""
+    if not records:
+        return 0
+    columns = {name: [r.get(name) for r in records] for name in STATION_COLUMNS}
+    columns["latitude"] = [r.get("latitude", r.get("lat")) for r in records]
+    columns["longitude"] = [r.get("longitude", r.get("lon")) for r in records]
+    return append_stations(columns)
+
+def append_weather(columns: dict) -> int:
+    return _append(WEATHER_DATASET, columns, WEATHER_COLUMNS)
+
+
+def _filter(start=None, end=None, sources=None, bbox=None):
+    """pyarrow expression for the common predicates; date/source terms prune partitions."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    expr = None
+
+    def both(term):
+        return term if expr is None else expr & term
+
+    if start is not None:
+        start = _utc(start)
+        expr = both(ds.field("date") >= start.strftime("%Y-%m-%d"))
+        expr = both(ds.field("time") >= pa.scalar(start, pa.timestamp("us", tz="UTC")))
+    if end is not None:
+        end = _utc(end)
+        expr = both(ds.field("date") <= end.strftime("%Y-%m-%d"))
+        expr = both(ds.field("time") < pa.scalar(end, pa.timestamp("us", tz="UTC")))
+    if sources:
+        expr = both(ds.field("source").isin(list(sources)))
+    if bbox is not None:
+        lat_min, lon_min, lat_max, lon_max = bbox
+        expr = both((ds.field("latitude") >= lat_min) & (ds.field("latitude") <= lat_max)
+                    & (ds.field("longitude") >= lon_min) & (ds.field("longitude") <= lon_max))
+    return expr
+
+def _utc(value) -> datetime:
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def _dedupe(frame, keys):
+    """Latest non-null value per column for each key (frames carry ingested_at)."""
+    if frame.empty:
+        return frame
+    frame = frame.sort_values("ingested_at", kind="stable")
+    return frame.groupby(keys, as_index=False, sort=False).last()
+
+def _read(name, columns=None, start=None, end=None, sources=None, bbox=None, dedupe=True):
+    import pandas as pd
+    import pyarrow.dataset as ds
+    if not has_data(name):
+        return pd.DataFrame(columns=columns or [])
+    dataset = ds.dataset(_path(name), format="parquet", partitioning=_partitioning(name))
+    wanted = None
+    if columns is not None:
+        wanted = list(dict.fromkeys(list(columns) + (STATION_KEYS + ["ingested_at"] if dedupe else [])))
+    frame = dataset.to_table(columns=wanted, filter=_filter(start, end, sources, bbox)).to_pandas()
+    if dedupe:
+        frame = _dedupe(frame, STATION_KEYS)
+    frame = frame.drop(columns=[c for c in ("ingested_at", "date") if c in frame and (columns is None or c not in columns)])
+    return frame[list(columns)] if columns is not None else frame
+
+def read_stations(columns=None, start=None, end=None, sources=None, bbox=None, dedupe=True):
+    """
+    Station rows as a DataFrame. columns: subset to decode (None for all);
+    start/end: datetimes or ISO strings ([start, end)); sources: e.g. ['WAQI'];
+    bbox: (lat_min, lon_min, lat_max, lon_max).
+    """
+    return _read(STATION_DATASET, columns, start, end, sources, bbox, dedupe)
+
+def read_weather(columns=None, start=None, end=None, bbox=None, dedupe=True):
+    return _read(WEATHER_DATASET, columns, start, end, None, bbox, dedupe)
+
+def daily_trend(pollutant: str = "computed_aqi", start=None, end=None, sources=None, bbox=None):
+    """Daily mean / max / count of one pollutant, reading only the columns it needs."""
+    frame = read_stations(["time", pollutant], start, end, sources, bbox)
+    frame = frame.dropna(subset=[pollutant])
+    if frame.empty:
+        return []
+    grouped = frame.groupby(frame["time"].dt.strftime("%Y-%m-%d"))[pollutant]
+    trend = grouped.agg(["mean", "max", "count"]).reset_index()
+    trend.columns = ["date", "mean", "max", "count"]
+    return trend.round({"mean": 2, "max": 2}).to_dict("records")
+
+def compact(day, name: str = STATION_DATASET) -> int:
+    """Rewrites one day's partitions as deduplicated files; returns the rows kept."""
+    import shutil
+    import pyarrow.dataset as ds
+    day = _utc(day).strftime("%Y-%m-%d")
+    day_dir = _path(os.path.join(name, f"date={day}"))
+    if not os.path.isdir(day_dir):
+        return 0
+    frame = _read(name, start=day, end=_utc(day) + timedelta(days=1), dedupe=True)
+    names = STATION_COLUMNS if name == STATION_DATASET else WEATHER_COLUMNS
+    table = _to_table({c: frame[c] for c in names}, names)
+    staging = day_dir + ".compact"
+    ds.write_dataset(table, staging, format="parquet", partitioning=_partitioning(name),
+                     basename_template="compacted-{i}.parquet", existing_data_behavior="delete_matching")
+    shutil.rmtree(day_dir)
+    os.replace(os.path.join(staging, f"date={day}"), day_dir)
+    shutil.rmtree(staging)
+    return table.num_rows
+
+
+# --- TEMPO cube (Zarr) ---
+
+def cube_axes(bbox=TEMPO_CUBE_BBOX, step: float = TEMPO_CUBE_STEP_DEG):
+    """Cell-centre latitudes and longitudes of the cube grid."""
+    lat_min, lon_min, lat_max, lon_max = bbox
+    lats = lat_min + step * (np.arange(int(round((lat_max - lat_min) / step))) + 0.5)
+    lons = lon_min + step * (np.arange(int(round((lon_max - lon_min) / step))) + 0.5)
+    return lats, lons
+
+def bin_to_grid(latitude, longitude, values, bbox=TEMPO_CUBE_BBOX, step: float = TEMPO_CUBE_STEP_DEG):
+    """Mean of the finite values falling in each grid cell; NaN where none do."""
+    lats, lons = cube_axes(bbox, step)
+    latitude, longitude, values = (np.asarray(a, dtype=float) for a in (latitude, longitude, values))
+    rows = np.floor((latitude - bbox[0]) / step).astype(np.int64)
+    cols = np.floor((longitude - bbox[1]) / step).astype(np.int64)
+    keep = np.isfinite(values) & (rows >= 0) & (rows < len(lats)) & (cols >= 0) & (cols < len(lons))
+    cell = rows[keep] * len(lons) + cols[keep]
+    size = len(lats) * len(lons)
+    total = np.bincount(cell, weights=values[keep], minlength=size)
+    count = np.bincount(cell, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grid = np.where(count > 0, total / count, np.nan)
+    return grid.reshape(len(lats), len(lons)).astype(np.float32)
+
+def append_tempo(columns: dict) -> int:
+    """
+    Bins TEMPO cells ({time, latitude, longitude, <TEMPO_CUBE_VARIABLES>})
+    into one cube slice per hour. Returns the number of hours written.
+    """
+    if not ANALYTICS_EXPORT or len(columns["time"]) == 0:
+        return 0
+    try:
+        import xarray as xr
+        path = _path(TEMPO_CUBE)
+        lats, lons = cube_axes()
+        hours = np.asarray(columns["time"], dtype="datetime64[ns]").astype("datetime64[h]")
+        written = 0
+        for hour in np.unique(hours):
+            in_hour = hours == hour
+            grids = {v: bin_to_grid(np.asarray(columns["latitude"])[in_hour], np.asarray(columns["longitude"])[in_hour],
+                                    np.asarray(columns[v])[in_hour]) for v in TEMPO_CUBE_VARIABLES}
+            stamp = np.array([hour.astype("datetime64[ns]")])
+            existing = xr.open_zarr(path, consolidated=False) if os.path.exists(path) else None
+            position = None
+            if existing is not None:
+                matches = np.nonzero(existing["time"].values == stamp[0])[0]
+                position = int(matches[0]) if len(matches) else None
+            if position is not None:
+                # Same hour seen before: keep its cells where this granule has none
+                for v in grids:
+                    old = existing[v].isel(time=position).values
+                    grids[v] = np.where(np.isfinite(grids[v]), grids[v], old)
+            cube = xr.Dataset({v: (("time", "lat", "lon"), g[None]) for v, g in grids.items()},
+                              coords={"time": stamp, "lat": lats, "lon": lons})
+            if existing is None:
+                encoding = {v: {"chunks": TEMPO_CUBE_CHUNKS} for v in grids}
+                encoding["time"] = {"units": "hours since 2000-01-01", "dtype": "int64"}
+                cube.to_zarr(path, mode="w-", encoding=encoding, consolidated=False)
+            elif position is None:
+                cube.to_zarr(path, append_dim="time", consolidated=False)
+            else:
+                cube.drop_vars(["lat", "lon", "time"]).to_zarr(path, region={"time": slice(position, position + 1)},
+                                                               consolidated=False)
+            written += 1
+        return written
+    except Exception as e:
+        print(f"❌ Analytics export to '{TEMPO_CUBE}' failed: {e}")
+        return 0
+
+def read_tempo(start=None, end=None, bbox=None, variables=None):
+    """
+    The TEMPO cube restricted to [start, end) and bbox, as an xarray Dataset.
+    Only the Zarr chunks overlapping the selection are read.
+    """
+    import xarray as xr
+    cube = xr.open_zarr(_path(TEMPO_CUBE), consolidated=False)
+    if variables is not None:
+        cube = cube[list(variables)]
+    times = cube["time"].values
+    keep = np.ones(len(times), dtype=bool)
+    if start is not None:
+        keep &= times >= np.datetime64(_utc(start).replace(tzinfo=None), "ns")
+    if end is not None:
+        keep &= times < np.datetime64(_utc(end).replace(tzinfo=None), "ns")
+    cube = cube.isel(time=np.nonzero(keep)[0])
+    if bbox is not None:
+        lat_min, lon_min, lat_max, lon_max = bbox
+        cube = cube.sel(lat=slice(lat_min, lat_max), lon=slice(lon_min, lon_max))
+    return cube.sortby("time").load()
+
+
+# --- Backfill ---
+
+def export_from_db(db, start, end, chunk_rows: int = 200_000) -> int:
+    """Copies air_quality_data and weather_forecasts rows in [start, end) from Postgres."""
+    import pandas as pd
+    from sqlalchemy import text
+    total = 0
+    for table, columns, append in (("air_quality_data", STATION_COLUMNS, append_stations),
+                                   ("weather_forecasts", WEATHER_COLUMNS, append_weather)):
+        query = text(f"SELECT {', '.join(columns)} FROM {table} WHERE time >= :start AND time < :end")
+        for chunk in pd.read_sql(query, db.connection(), params={"start": _utc(start), "end": _utc(end)},
+                                 chunksize=chunk_rows):
+            total += append({c: chunk[c] for c in columns})
+    return total
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Backfill and compact the columnar analytics store.")
+    parser.add_argument("--backfill-days", type=int, default=0, help="Copy this many past days from Postgres.")
+    parser.add_argument("--compact-days", type=int, default=0, help="Compact this many past days.")
+    args = parser.parse_args()
+
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if args.backfill_days:
+        db = SessionLocal()
+        try:
+            for offset in range(args.backfill_days, -1, -1):
+                day = today - timedelta(days=offset)
+                print(f"Exporting {day:%Y-%m-%d}: {export_from_db(db, day, day + timedelta(days=1))} rows")
+        finally:
+            db.close()
+    for offset in range(args.compact_days, -1, -1) if args.compact_days else []:
+        day = today - timedelta(days=offset)
+        for name in (STATION_DATASET, WEATHER_DATASET):
+            print(f"Compacted {name} {day:%Y-%m-%d}: {compact(day, name)} rows")
@@ -0,0 +1,304 @@
+# /backend/aqi_calculator.py
+"""
+Standards-correct AQI computation from raw pollutant concentrations.
+
+Each pollutant's concentration is mapped to a sub-index with the
+piecewise-linear breakpoint table of the chosen standard (US EPA by
+default, Indian NAQI optionally); the overall AQI is the maximum
+sub-index and the pollutant that produced it is the dominant pollutant.
+Everything is vectorized over NumPy arrays so a whole ingest batch is
+computed at once.
+
+Canonical input units (what `compute_aqi` expects):
+    pm25, pm10: µg/m³    o3, no2, so2: ppb    co: ppm
+Use `to_canonical_units` to convert other units first.
+
+The result is stored at ingest time in `air_quality_data.computed_aqi` /
+`dominant_pollutant`, so the read path never recomputes it.
+"""
+import numpy as np
+from sqlalchemy import text
+
+POLLUTANTS = ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
+
+ADD_COMPUTED_AQI_COLUMNS_SQL = [
+    "ALTER TABLE air_quality_data ADD COLUMN IF NOT EXISTS computed_aqi DOUBLE PRECISION;",
+    "ALTER TABLE air_quality_data ADD COLUMN IF NOT EXISTS dominant_pollutant VARCHAR(10);",
+    # Every map/alert query filters on "latest rows that have an AQI".
+    """CREATE INDEX IF NOT EXISTS idx_air_quality_computed_time
+       ON air_quality_data (time DESC) WHERE computed_aqi IS NOT NULL;""",
+]
+
+# Molecular weights (g/mol) and molar volume at 25 °C, 1 atm, for ppb <-> µg/m³.
+MOLECULAR_WEIGHTS = {'o3': 48.00, 'no2': 46.01, 'so2': 64.07, 'co': 28.01}
+MOLAR_VOLUME_L = 24.45
+
+# --- Breakpoint Tables ---
+# pollutant: [(C_lo, C_hi, I_lo, I_hi), ...] in canonical units.
+
+US_EPA = {
+    # PM2.5 24-hour, 2024 revision
+    'pm25': [(0.0, 9.0, 0, 50), (9.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
+             (55.5, 125.4, 151, 200), (125.5, 225.4, 201, 300), (225.5, 325.4, 301, 500)],
+    'pm10': [(0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
+             (255, 354, 151, 200), (355, 424, 201, 300), (425, 604, 301, 500)],
+    # O3 8-hour up to 200 ppb; above that the 1-hour table's hazardous range
+    'o3': [(0, 54, 0, 50), (55, 70, 51, 100), (71, 85, 101, 150),
+           (86, 105, 151, 200), (106, 200, 201, 300), (201, 604, 301, 500)],
+    'no2': [(0, 53, 0, 50), (54, 100, 51, 100), (101, 360, 101, 150),
+            (361, 649, 151, 200), (650, 1249, 201, 300), (1250, 2049, 301, 500)],
+    'so2': [(0, 35, 0, 50), (36, 75, 51, 100), (76, 185, 101, 150),
+            (186, 304, 151, 200), (305, 604, 201, 300), (605, 1004, 301, 500)],
+    'co': [(0.0, 4.4, 0, 50), (4.5, 9.4, 51, 100), (9.5, 12.4, 101, 150),
+           (12.5, 15.4, 151, 200), (15.5, 30.4, 201, 300), (30.5, 50.4, 301, 500)],
+}
+# Decimal places EPA truncates each concentration to before lookup.
+US_EPA_TRUNCATION = {'pm25': 1, 'pm10': 0, 'o3': 0, 'no2': 0, 'so2': 0, 'co': 1}
+
+# Indian National AQI (CPCB). Gases are defined in µg/m³ (CO in mg/m³), so
+# canonical ppb/ppm inputs are converted before lookup.
+INDIA_NAQI = {
+    'pm25': [(0, 30, 0, 50), (31, 60, 51, 100), (61, 90, 101, 200),
+             (91, 120, 201, 300), (121, 250, 301, 400), (251, 380, 401, 500)],
+    'pm10': [(0, 50, 0, 50), (51, 100, 51, 100), (101, 250, 101, 200),
+             (251, 350, 201, 300), (351, 430, 301, 400), (431, 510, 401, 500)],
+    'o3': [(0, 50, 0, 50), (51, 100, 51, 100), (101, 168, 101, 200),
+           (169, 208, 201, 300), (209, 748, 301, 400), (749, 1000, 401, 500)],
+    'no2': [(0, 40, 0, 50), (41, 80, 51, 100), (81, 180, 101, 200),
+            (181, 280, 201, 300), (281, 400, 301, 400), (401, 520, 401, 500)],
+    'so2': [(0, 40, 0, 50), (41, 80, 51, 100), (81, 380, 101, 200),
+            (381, 800, 201, 300), (801, 1600, 301, 400), (1601, 2100, 401, 500)],
+    'co': [(0.0, 1.0, 0, 50), (1.1, 2.0, 51, 100), (2.1, 10.0, 101, 200),
+           (10.1, 17.0, 201, 300), (17.1, 34.0, 301, 400), (34.1, 46.0, 401, 500)],
+}
+INDIA_NAQI_TRUNCATION = {'pm25': 0, 'pm10': 0, 'o3': 0, 'no2': 0, 'so2': 0, 'co': 1}
+
+STANDARDS = {
+    'us_epa': (US_EPA, US_EPA_TRUNCATION),
+    'india_naqi': (INDIA_NAQI, INDIA_NAQI_TRUNCATION),
+}
+MAX_AQI = 500
+
+
+class _CompiledTable:
+    """One pollutant's breakpoints as parallel arrays for np.searchsorted."""
+
+    def __init__(self, rows, decimals):
+        rows = np.asarray(rows, dtype=float)
+        self.c_lo, self.c_hi, self.i_lo, self.i_hi = rows.T
+        self.decimals = decimals
+
+    def sub_index(self, conc):
+        conc = np.asarray(conc, dtype=float)
+        scale = 10.0 ** self.decimals
+        conc = np.floor(np.clip(conc, 0, None) * scale) / scale
+        # First band whose upper bound is >= C; values between bands
+        # (e.g. 9.05 for PM2.5) fall into the next band as EPA specifies.
+        band = np.minimum(np.searchsorted(self.c_hi, conc, side='left'), len(self.c_hi) - 1)
+        c_lo, c_hi = self.c_lo[band], self.c_hi[band]
+        i_lo, i_hi = self.i_lo[band], self.i_hi[band]
+        index = (i_hi - i_lo) / (c_hi - c_lo) * (np.maximum(conc, c_lo) - c_lo) + i_lo
+        return np.where(np.isnan(conc), np.nan, np.minimum(np.round(index), MAX_AQI))
+
+
+_compiled = {
+    name: {p: _CompiledTable(table[p], truncation[p]) for p in POLLUTANTS}
+    for name, (table, truncation) in STANDARDS.items()
+}
+
+
+def to_canonical_units(pollutant: str, values, unit: str):
+    """Converts concentrations to the canonical unit for `pollutant`."""
+    values = np.asarray(values, dtype=float)
+    unit = (unit or '').lower().replace('µ', 'u').replace('³', '3').replace(' ', '')
+    if pollutant in ('pm25', 'pm10'):
+        if unit in ('ug/m3', ''):
+            return values
+        if unit == 'mg/m3':
+            return values * 1000.0
+    else:
+        mw = MOLECULAR_WEIGHTS[pollutant]
+        target_ppm = pollutant == 'co'
+        if unit == 'ppb':
+            return values / 1000.0 if target_ppm else values
+        if unit == 'ppm':
+            return values if target_ppm else values * 1000.0
+        if unit == 'ug/m3':
+            ppb = values * MOLAR_VOLUME_L / mw
+            return ppb / 1000.0 if target_ppm else ppb
+        if unit == 'mg/m3':
+            ppb = values * 1000.0 * MOLAR_VOLUME_L / mw
+            return ppb / 1000.0 if target_ppm else ppb
+    raise ValueError(f"Unsupported unit '{unit}' for {pollutant}")
+
+
+def _to_naqi_units(pollutant, values):
+    if pollutant in ('pm25', 'pm10'):
+        return values
+    if pollutant == 'co':
+        return values * MOLECULAR_WEIGHTS['co'] / MOLAR_VOLUME_L            # ppm -> mg/m³
+    return values * MOLECULAR_WEIGHTS[pollutant] / MOLAR_VOLUME_L           # ppb -> µg/m³
+
+
+def sub_indices(concentrations: dict, standard: str = 'us_epa') -> dict:
+    """{pollutant: concentration array} -> {pollutant: sub-index array} (NaN where missing)."""
+    tables = _compiled[standard]
+    result = {}
+    for pollutant, values in concentrations.items():
+        if pollutant not in tables or values is None:
+            continue
+        values = np.asarray(values, dtype=float)
+        if standard == 'india_naqi':
+            values = _to_naqi_units(pollutant, values)
+        result[pollutant] = tables[pollutant].sub_index(values)
+    return result
+
+
+def combine_sub_indices(indices: dict):
+    """
+    Overall AQI is the max sub-index; returns (aqi, dominant_pollutant)
+    arrays, with NaN / None where no pollutant was available.
+    """
+    if not indices:
+        return np.array([]), np.array([], dtype=object)
+    names = list(indices)
+    stacked = np.vstack([np.asarray(indices[n], dtype=float) for n in names])
+    all_missing = np.all(np.isnan(stacked), axis=0)
+    filled = np.where(np.isnan(stacked), -np.inf, stacked)
+    winner = np.argmax(filled, axis=0)
+    aqi = np.where(all_missing, np.nan, filled[winner, np.arange(stacked.shape[1])])
+    dominant = np.array(names, dtype=object)[winner]
+    dominant[all_missing] = None
+    return aqi, dominant
+
+
+def compute_aqi(concentrations: dict, standard: str = 'us_epa'):
+    """Concentrations in canonical units -> (aqi, dominant_pollutant) arrays."""
+    return combine_sub_indices(sub_indices(concentrations, standard))
+
+
+# --- Applying It to Ingested Records ---
+
+def _as_float(value):
+    # WAQI uses "-" for missing values
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def annotate_records(records: list, mode: str = 'concentration', units: dict = None,
+                     standard: str = 'us_epa'):
+    """
+    Adds `computed_aqi` and `dominant_pollutant` to each record dict in place.
+
+    mode='concentration': pollutant fields are concentrations in `units`
+        (per pollutant; canonical units when omitted).
+    mode='sub_index': pollutant fields are already sub-indices (e.g. WAQI
+        `iaqi` values); an `aqi` field, if present, is used as reported.
+    """
+    if not records:
+        return records
+    columns = {}
+    for pollutant in POLLUTANTS:
+        values = np.array([_as_float(r.get(pollutant)) for r in records])
+        if np.all(np.isnan(values)):
+            continue
+        if mode == 'concentration' and units and units.get(pollutant):
+            values = to_canonical_units(pollutant, values, units[pollutant])
+        columns[pollutant] = values
+
+    if mode == 'sub_index':
+        aqi, dominant = combine_sub_indices(columns)
+    else:
+        aqi, dominant = compute_aqi(columns, standard)
+
+    reported = np.array([_as_float(r.get('aqi')) for r in records]) if mode == 'sub_index' else None
+    for i, record in enumerate(records):
+        value = aqi[i] if len(aqi) else np.nan
+        if reported is not None and not np.isnan(reported[i]):
+            value = reported[i]
+        record['computed_aqi'] = None if np.isnan(value) else float(value)
+        record['dominant_pollutant'] = dominant[i] if len(dominant) else None
+    return records
+
+
+# How each source's pollutant columns should be read when (re)computing.
+# WAQI reports per-pollutant sub-indices; OpenAQ stores concentrations
+# already converted to canonical units by its ingestor (whatever unit each
+# station reports); NASA satellite columns are column densities, not
+# surface concentrations, so they get no AQI.
+SOURCE_PROFILES = [
+    ('WAQI', {'mode': 'sub_index'}),
+    ('OpenAQ', {'mode': 'concentration'}),
+    ('NASA-', None),
+]
+
+def profile_for_source(source: str):
+    for prefix, profile in SOURCE_PROFILES:
+        if (source or '').startswith(prefix):
+            return profile
+    return {'mode': 'concentration'}
+
+
+_update_computed_sql = text("""
+    UPDATE air_quality_data AS a
+    SET computed_aqi = v.computed_aqi, dominant_pollutant = v.dominant_pollutant
+    FROM (
+        SELECT unnest(CAST(:times AS TIMESTAMPTZ[])) AS time,
+               unnest(CAST(:lats AS DOUBLE PRECISION[])) AS latitude,
+               unnest(CAST(:lons AS DOUBLE PRECISION[])) AS longitude,
+               unnest(CAST(:aqis AS DOUBLE PRECISION[])) AS computed_aqi,
+               unnest(CAST(:dominants AS TEXT[])) AS dominant_pollutant
+    ) AS v
+    WHERE a.time = v.time AND a.latitude = v.latitude AND a.longitude = v.longitude;
+""")
+
+def recompute_rows(db, where_sql: str = "TRUE", params: dict = None, chunk_size: int = 50_000) -> int:
+    """
+    Recomputes computed_aqi for rows matching `where_sql` from their stored
+    pollutant columns, using each row's source profile. Used for backfills
+    and for ingestors that write one pollutant at a time. Rows are read in
+    keyset pages of `chunk_size` on (time, latitude, longitude), so a
+    full-table backfill never holds more than one page in memory.
+    """
+    page_sql = text(f"""
+        SELECT time, latitude, longitude, source, aqi, {', '.join(POLLUTANTS)}
+        FROM air_quality_data
+        WHERE ({where_sql})
+          AND (CAST(:after_time AS TIMESTAMPTZ) IS NULL
+               OR (time, latitude, longitude) > (:after_time, :after_lat, :after_lon))
+        ORDER BY time, latitude, longitude
+        LIMIT :page_size;
+    """)
+    page_params = {**(params or {}), "after_time": None, "after_lat": None, "after_lon": None,
+                   "page_size": chunk_size}
+
+    updated = 0
+    while True:
+        rows = db.execute(page_sql, page_params).mappings().all()
+        if not rows:
+            return updated
+        last = rows[-1]
+        page_params.update(after_time=last['time'], after_lat=last['latitude'], after_lon=last['longitude'])
+
+        by_profile = {}
+        for row in rows:
+            profile = profile_for_source(row['source'])
+            if profile is None:
+                continue
+            key = repr(sorted(profile.items()))
+            by_profile.setdefault(key, (profile, []))[1].append(dict(row))
+
+        for profile, records in by_profile.values():
+            annotate_records(records, profile['mode'], profile.get('units'))
+            db.execute(_update_computed_sql, {
+                "times": [r['time'] for r in records],
+                "lats": [r['latitude'] for r in records],
+                "lons": [r['longitude'] for r in records],
+                "aqis": [r['computed_aqi'] for r in records],
+                "dominants": [r['dominant_pollutant'] for r in records],
+            })
+            updated += len(records)
+        if len(rows) < chunk_size:
+            return updated
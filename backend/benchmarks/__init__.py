@@ -0,0 +1,12 @@
+# /backend/benchmarks/__init__.py
+"""
+Benchmark and load-test tooling for the AURA backend.
+
+Everything in this package runs against local stand-ins only: a throwaway
+PostGIS database seeded with synthetic data and mock HTTP servers for the
+third-party APIs. Run it from the /backend directory, e.g.
+
+    python -m benchmarks.run_api_benchmark --scale 2 --duration 60
+    python -m benchmarks.microbench --size medium --json results.json
+    python -m benchmarks.startup_bench --rounds 5 --serve
+"""
@@ -0,0 +1,176 @@
+# /backend/benchmarks/load_test.py
+"""
+Closed-loop load generator that replays realistic user actions against a
+running API and tile server, then reports throughput and latency
+percentiles per endpoint.
+"""
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import mercantile
+import numpy as np
+import requests
+
+from ai_guide import FALLBACK_MESSAGE
+from benchmarks.synthetic import BBOX
+
+# Relative weight of each user action in the default mix.
+DEFAULT_MIX = {
+    "map_pan": 0.55,
+    "point_click": 0.35,
+    "chat": 0.10,
+}
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyRecorder:
+    """Thread-safe collection of (endpoint, seconds, ok) samples."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            self.samples[name].append(seconds)
+            if not ok:
+                self.errors[name] += 1
+
+    def timed(self, session, name, method, url, **kwargs):
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = session.request(method, url, timeout=30, **kwargs)
+            ok = response.status_code < 400 and not _is_error_body(response)
+        except requests.exceptions.RequestException:
+            pass
+        self.record(name, time.perf_counter() - start, ok)
+
+
+def _is_error_body(response):
+    # Several endpoints report failures as {"error": ...} with a 200 status,
+    # and the AI guide answers a failed LLM call with its fallback message.
+    if "application/json" not in response.headers.get("Content-Type", ""):
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return True
+    return isinstance(body, dict) and ("error" in body or body.get("response") == FALLBACK_MESSAGE)
+
+
+def _random_point(rng):
+    south, west, north, east = BBOX
+    return rng.uniform(south, north), rng.uniform(west, east)
+
+
+def map_pan(session, recorder, api_url, tile_url, rng, user_count):
+    """A pan at a random zoom level: one viewport of tiles plus the grid overlay."""
+    lat, lon = _random_point(rng)
+    zoom = rng.randint(4, 10)
+    center = mercantile.tile(lon, lat, zoom)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            recorder.timed(session, "tile", "GET", f"{tile_url}/tiles/{zoom}/{center.x + dx}/{center.y + dy}.png")
+    recorder.timed(session, "grid_current", "GET", f"{api_url}/api/v1/grid/current",
+                   params={"pollutant": "auto", "time_offset": rng.randint(-3, 0)})
+
+
+def point_click(session, recorder, api_url, tile_url, rng, user_count):
+    """What page.tsx does on a map click, plus opening the forecast modal."""
+    lat, lon = _random_point(rng)
+    recorder.timed(session, "context_location", "POST", f"{api_url}/api/v1/context/location",
+                   json={"lat": lat, "lon": lon})
+    recorder.timed(session, "location_name", "GET", f"{api_url}/api/v1/location/name",
+                   params={"lat": lat, "lon": lon})
+    recorder.timed(session, "forecast_point", "GET", f"{api_url}/api/v1/forecast/point",
+                   params={"lat": lat, "lon": lon})
+
+
+def chat(session, recorder, api_url, tile_url, rng, user_count):
+    lat, lon = _random_point(rng)
+    question = rng.choice([
+        "Is it safe to go for a run now?",
+        "Should my kids play outside today?",
+        "What mask should I wear?",
+    ])
+    recorder.timed(session, "ai_guide_chat", "POST", f"{api_url}/api/v1/ai_guide/chat",
+                   json={"userId": rng.randint(1, user_count), "question": question, "lat": lat, "lon": lon})
+
+
+ACTIONS = {
+    "map_pan": map_pan,
+    "point_click": point_click,
+    "chat": chat,
+}
+
+
+def run_load(api_url, tile_url, duration_s=30.0, concurrency=16, mix=None, user_count=1000, seed=42):
+    """
+    Runs `concurrency` virtual users for `duration_s` seconds, each looping
+    over actions drawn from `mix`, and returns the recorder.
+    """
+    mix = mix or DEFAULT_MIX
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    recorder = LatencyRecorder()
+    deadline = time.monotonic() + duration_s
+
+    def virtual_user(worker_id):
+        rng = random.Random(seed + worker_id)
+        with requests.Session() as session:
+            while time.monotonic() < deadline:
+                action = rng.choices(names, weights=weights)[0]
+                ACTIONS[action](session, recorder, api_url, tile_url, rng, user_count)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(virtual_user, range(concurrency)))
+    recorder.elapsed = time.monotonic() - started
+    return recorder
+
+
+def summarize(recorder) -> dict:
+    """Throughput and p50/p95/p99 (in ms) per endpoint and overall."""
+    report = {"elapsed_s": round(recorder.elapsed, 2), "endpoints": {}}
+    all_samples = []
+    for name, samples in sorted(recorder.samples.items()):
+        arr = np.asarray(samples) * 1000.0
+        all_samples.append(arr)
+        report["endpoints"][name] = {
+            "requests": int(arr.size),
+            "errors": recorder.errors[name],
+            "rps": round(arr.size / recorder.elapsed, 2),
+            **{f"p{p}_ms": round(float(np.percentile(arr, p)), 2) for p in PERCENTILES},
+        }
+    if all_samples:
+        merged = np.concatenate(all_samples)
+        report["total"] = {
+            "requests": int(merged.size),
+            "errors": sum(recorder.errors.values()),
+            "rps": round(merged.size / recorder.elapsed, 2),
+            **{f"p{p}_ms": round(float(np.percentile(merged, p)), 2) for p in PERCENTILES},
+        }
+    return report
+
+
+def print_report(report: dict):
+    header = f"{'endpoint':<20}{'reqs':>8}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["endpoints"].items())
+    if "total" in report:
+        rows.append(("TOTAL", report["total"]))
+    for name, r in rows:
+        print(f"{name:<20}{r['requests']:>8}{r['errors']:>6}{r['rps']:>9}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+
+def save_report(report: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
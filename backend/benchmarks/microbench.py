@@ -0,0 +1,321 @@
+# /backend/benchmarks/microbench.py
+"""
+Microbenchmarks for the ingestion and raster processing hot paths.
+
+Each case runs in a fresh child process against synthetic granules
+generated up front, with the database session swapped for an in-memory
+sink. Every case reports wall time (min / median over rounds), peak RSS
+of its process and rows/sec, and the whole run can be written as JSON
+to diff against a previous run:
+
+    python -m benchmarks.microbench --size medium --rounds 5 --json after.json --compare before.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (scanlines, cross-track pixels) of the synthetic TEMPO granule per size preset.
+# A real TEMPO NO2 granule is roughly 130 x 2048; AIRS L2 is 45 x 30.
+SIZES = {
+    "small": (256, 256),
+    "medium": (1024, 1024),
+    "large": (2048, 2048),
+}
+AIRS_REPEAT = {"small": 4, "medium": 16, "large": 32}
+TILE_ZOOMS = {"small": [4], "medium": [4, 5], "large": [4, 5, 6]}
+
+
+class MemorySink:
+    """
+    Stands in for a SQLAlchemy Session: records how many rows each
+    execute() would have written instead of talking to Postgres.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.statements = 0
+        self.is_active = True
+
+    def execute(self, statement, params=None, *args, **kwargs):
+        self.statements += 1
+        if isinstance(params, list):
+            self.rows += len(params)
+        elif isinstance(params, dict) and any(isinstance(v, list) for v in params.values()):
+            # Columnar (unnest) statements: one list per column
+            self.rows += max(len(v) for v in params.values() if isinstance(v, list))
+        elif params is not None:
+            self.rows += 1
+        return self
+
+    def scalar(self):
+        return None
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.is_active = False
+
+
+@contextmanager
+def patched(module, **attrs):
+    originals = {name: getattr(module, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(module, name, value)
+
+
+def _prepare_child_environment():
+    """Lets the backend modules import without a real database."""
+    for key, default in (("DB_USER", "bench"), ("DB_PASSWORD", "bench"), ("DB_HOST", "127.0.0.1"),
+                         ("DB_PORT", "5432"), ("DB_NAME", "bench")):
+        os.environ.setdefault(key, default)
+    for path in (BACKEND_DIR, os.path.join(BACKEND_DIR, "script")):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+# --- Cases ---
+# Each case takes the prepared fixture paths and returns a callable that
+# performs one timed round and returns the number of rows it produced.
+
+def case_ingest_tempo(fixtures):
+    import ingest_tempo
+
+    def run():
+        sink = MemorySink()
+        with patched(ingest_tempo, FILE_PATH=fixtures["tempo"], SessionLocal=lambda: sink):
+            ingest_tempo.process_tempo_file_to_grid()
+        return sink.rows
+    return run
+
+
+def case_intelligent_ingestor(fixtures):
+    import intelligent_ingestor
+    import schema_registry
+    # Report every column as already present so no ALTER TABLE is attempted.
+    columns = ["time", "latitude", "longitude", "source", *intelligent_ingestor.VARIABLE_MAP]
+
+    def run():
+        sink = MemorySink()
+        with patched(intelligent_ingestor, FILE_PATH=fixtures["tempo"], SessionLocal=lambda: sink), \
+                patched(schema_registry, get_columns=lambda table_name: columns,
+                        record_ingested_rows=lambda db, records: None,
+                        record_ingested_columns=lambda db, times, cols: None):
+            intelligent_ingestor.intelligent_ingestor()
+        return sink.rows
+    return run
+
+
+def case_ingest_airs(fixtures):
+    import ingest_airs
+
+    def run():
+        sink = MemorySink()
+        with patched(ingest_airs, FILE_PATH=fixtures["airs"], SessionLocal=lambda: sink), \
+                patched(ingest_airs.schema_registry, record_ingested_rows=lambda db, records: None):
+            ingest_airs.process_airs_file()
+        return sink.rows
+    return run
+
+
+def _load_swath(path):
+    import xarray as xr
+    with xr.open_dataset(path, group="product") as ds, xr.open_dataset(path, group="geolocation") as geo:
+        da = ds["vertical_column_troposphere"].load()
+        return da, geo["latitude"].values, geo["longitude"].values
+
+
+def case_handle_swath_grid(fixtures):
+    import new
+    da, lat, lon = _load_swath(fixtures["tempo"])
+    out_tif = os.path.join(fixtures["workdir"], "swath_4326.tif")
+
+    def run():
+        new.handle_swath_grid(da, lat, lon, out_tif, resolution_deg=fixtures["resolution_deg"])
+        import rasterio
+        with rasterio.open(out_tif) as src:
+            return src.width * src.height
+    return run
+
+
+def case_reproject_to_3857(fixtures):
+    import new
+    import rasterio
+    da, lat, lon = _load_swath(fixtures["tempo"])
+    src_tif = os.path.join(fixtures["workdir"], "reproject_src_4326.tif")
+    dst_tif = os.path.join(fixtures["workdir"], "reproject_dst_3857.tif")
+    new.handle_swath_grid(da, lat, lon, src_tif, resolution_deg=fixtures["resolution_deg"])
+
+    def run():
+        new.reproject_to_3857(src_tif, dst_tif)
+        with rasterio.open(dst_tif) as dst:
+            return dst.width * dst.height
+    return run
+
+
+def case_generate_tile_bytes(fixtures):
+    os.environ["AURA_COG_PATH"] = fixtures["cog"]
+    os.environ["AURA_META_PATH"] = fixtures["cog_meta"]
+    import mercantile
+    import tile_server
+    from benchmarks.synthetic import BBOX
+    south, west, north, east = BBOX
+    tiles = list(mercantile.tiles(west, south, east, north, fixtures["tile_zooms"]))
+    # Bypass the lru_cache so every round renders from the COG.
+    render = tile_server.generate_tile_bytes.__wrapped__
+
+    def run():
+        for t in tiles:
+            render(t.z, t.x, t.y)
+        return len(tiles)
+    return run
+
+
+CASES = {
+    "ingest_tempo.process_tempo_file_to_grid": case_ingest_tempo,
+    "intelligent_ingestor.intelligent_ingestor": case_intelligent_ingestor,
+    "ingest_airs.process_airs_file": case_ingest_airs,
+    "new.handle_swath_grid": case_handle_swath_grid,
+    "new.reproject_to_3857": case_reproject_to_3857,
+    "tile_server.generate_tile_bytes": case_generate_tile_bytes,
+}
+
+
+def _run_case_in_child(name, fixtures, rounds, queue):
+    _prepare_child_environment()
+    import io
+    from contextlib import redirect_stdout
+    try:
+        with redirect_stdout(io.StringIO()):  # the ingestors are chatty
+            run = CASES[name](fixtures)
+            timings, rows = [], 0
+            for _ in range(rounds):
+                start = time.perf_counter()
+                rows = run()
+                timings.append(time.perf_counter() - start)
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        queue.put({"timings": timings, "rows": rows, "peak_rss_mb": round(peak_rss_kb / 1024, 1)})
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_case(name, fixtures, rounds):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_case_in_child, args=(name, fixtures, rounds, queue))
+    process.start()
+    outcome = queue.get()
+    process.join()
+    if "error" in outcome:
+        return {"name": name, "error": outcome["error"]}
+
+    timings = outcome["timings"]
+    median = statistics.median(timings)
+    return {
+        "name": name,
+        "rounds": rounds,
+        "min_s": round(min(timings), 4),
+        "median_s": round(median, 4),
+        "max_s": round(max(timings), 4),
+        "rows": outcome["rows"],
+        "rows_per_s": round(outcome["rows"] / median, 1) if median > 0 else None,
+        "peak_rss_mb": outcome["peak_rss_mb"],
+    }
+
+
+def build_fixtures(size, workdir, scan=None, xtrack=None):
+    from benchmarks.synthetic import write_synthetic_airs_granule, write_synthetic_cog, write_synthetic_tempo_granule
+
+    n_scan, n_xtrack = SIZES[size]
+    n_scan, n_xtrack = scan or n_scan, xtrack or n_xtrack
+    repeat = AIRS_REPEAT[size]
+    cog, cog_meta = write_synthetic_cog(workdir, size=max(n_scan, n_xtrack, 512))
+    return {
+        "workdir": workdir,
+        "shape": [n_scan, n_xtrack],
+        "tempo": write_synthetic_tempo_granule(os.path.join(workdir, "tempo.nc"), n_scan, n_xtrack),
+        "airs": write_synthetic_airs_granule(os.path.join(workdir, "airs.hdf"), 45 * repeat, 30 * repeat),
+        "cog": cog,
+        "cog_meta": cog_meta,
+        "resolution_deg": 29.0 / max(n_scan, n_xtrack),
+        "tile_zooms": TILE_ZOOMS[size],
+    }
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {c["name"]: c for c in json.load(f)["cases"]}
+    print(f"\n{'case':<45}{'before s':>10}{'after s':>10}{'change':>10}")
+    for case in current:
+        before = baseline.get(case["name"])
+        if not before or "median_s" not in before or "median_s" not in case:
+            continue
+        change = (case["median_s"] - before["median_s"]) / before["median_s"]
+        print(f"{case['name']:<45}{before['median_s']:>10}{case['median_s']:>10}{change:>+10.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time ingestion and raster hot paths on synthetic granules.")
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument("--scan", type=int, default=None, help="Override the number of scanlines.")
+    parser.add_argument("--xtrack", type=int, default=None, help="Override the number of cross-track pixels.")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("-k", dest="only", default=None, help="Only run cases whose name contains this.")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write results as JSON here.")
+    parser.add_argument("--compare", default=None, help="Previous JSON results to compare against.")
+    args = parser.parse_args()
+
+    _prepare_child_environment()
+    names = [n for n in CASES if not args.only or args.only in n]
+
+    with tempfile.TemporaryDirectory(prefix="aura-bench-") as workdir:
+        print(f"Generating synthetic granules ({args.size}) in {workdir}...")
+        fixtures = build_fixtures(args.size, workdir, args.scan, args.xtrack)
+
+        results = []
+        print(f"\n{'case':<45}{'median s':>10}{'rows/s':>14}{'peak MB':>10}")
+        for name in names:
+            result = run_case(name, fixtures, args.rounds)
+            results.append(result)
+            if "error" in result:
+                print(f"{name:<45}  ERROR {result['error']}")
+            else:
+                print(f"{name:<45}{result['median_s']:>10}{result['rows_per_s']:>14}{result['peak_rss_mb']:>10}")
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "size": args.size,
+        "shape": fixtures["shape"],
+        "cases": results,
+    }
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
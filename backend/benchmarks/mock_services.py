@@ -0,0 +1,175 @@
+# /backend/benchmarks/mock_services.py
+"""
+Local stand-ins for the third-party HTTP APIs the backend calls
+(Open-Meteo, WAQI, MapTiler and Gemini), each with a configurable
+artificial latency so we can measure how the API behaves when an
+upstream is slow.
+"""
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Routes every request to the JSON responder of the owning server."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # keep the benchmark output readable
+
+    def _reply(self):
+        self.server.sleep_latency()
+        body_len = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(body_len) if body_len else b""
+        payload = self.server.responder(urlparse(self.path), body)
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = _reply
+    do_POST = _reply
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, responder, latency_ms: float = 50.0, jitter_ms: float = 0.0):
+        super().__init__(("127.0.0.1", 0), MockHandler)
+        self.responder = responder
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def sleep_latency(self):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# --- Responders ---
+
+def open_meteo_responder(url, body):
+    """
+    Serves both /v1/forecast (weather) and /v1/air-quality. Comma-separated
+    coordinates return one result per location, as the real API does.
+    """
+    query = parse_qs(url.query)
+    n_locations = len((query.get("latitude") or [""])[0].split(","))
+    if n_locations > 1:
+        return [_open_meteo_location(url, query) for _ in range(n_locations)]
+    return _open_meteo_location(url, query)
+
+
+def _open_meteo_location(url, query):
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    hours = [now + timedelta(hours=h) for h in range(-24, 72)]
+    if (query.get("timeformat") or [""])[0] == "unixtime":
+        times = [int(t.timestamp()) for t in hours]
+    else:
+        times = [t.strftime("%Y-%m-%dT%H:%M") for t in hours]
+    if url.path.endswith("/air-quality"):
+        hourly = {"time": times}
+        for key in ["pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "carbon_dioxide",
+                    "sulphur_dioxide", "ozone", "us_aqi"]:
+            hourly[key] = [round(random.uniform(5, 180), 1) for _ in times]
+        return {"current": {"us_aqi": 90, "pm2_5": 35.0, "nitrogen_dioxide": 40.0}, "hourly": hourly}
+    return {
+        "current": {"temperature_2m": 29.5, "relative_humidity_2m": 70, "precipitation": 0.0, "wind_speed_10m": 8.2},
+        "hourly": {
+            "time": times,
+            "temperature_2m": [round(random.uniform(20, 35), 1) for _ in times],
+            "relative_humidity_2m": [random.randint(30, 90) for _ in times],
+            "precipitation": [0.0 for _ in times],
+            "wind_speed_10m": [round(random.uniform(0, 20), 1) for _ in times],
+        },
+    }
+
+
+def waqi_responder(url, body):
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:00:00")
+    if url.path.startswith("/map/bounds"):
+        stations = []
+        for uid in range(200):
+            stations.append({
+                "uid": uid, "lat": round(random.uniform(8, 37), 4), "lon": round(random.uniform(68, 97), 4),
+                "aqi": str(random.randint(20, 300)), "station": {"name": f"Mock Station {uid}", "time": now},
+                "time": {"s": now},
+            })
+        return {"status": "ok", "data": stations}
+    match = re.match(r"^/feed/@(\d+)", url.path)
+    idx = int(match.group(1)) if match else 0
+    return {"status": "ok", "data": {
+        "idx": idx, "aqi": random.randint(20, 300), "dominentpol": "pm25",
+        "city": {"name": f"Mock City {idx}", "geo": [28.61, 77.20]},
+        "iaqi": {"pm25": {"v": 80}, "no2": {"v": 20}, "o3": {"v": 15}},
+        "time": {"s": now}, "forecast": {"daily": {}},
+    }}
+
+
+def maptiler_responder(url, body):
+    return {"features": [{"place_name": "Mock Place, Mock City", "center": [77.20, 28.61]}]}
+
+
+def gemini_responder(url, body):
+    """Answers generateContent in the shape of the Gemini REST API."""
+    return {"candidates": [{
+        "content": {"role": "model", "parts": [{"text": "This is a canned answer from the local Gemini stand-in."}]},
+        "finishReason": "STOP", "index": 0,
+    }]}
+
+
+def start_mock_services(latency_ms: float = 50.0, jitter_ms: float = 10.0, llm_latency_ms: float = None) -> dict:
+    """
+    Starts all stand-ins on ephemeral ports and returns them by name.
+    The LLM stand-in gets its own latency since real LLM calls are much slower.
+    """
+    llm_latency = latency_ms * 10 if llm_latency_ms is None else llm_latency_ms
+    servers = {
+        "open_meteo": MockServer(open_meteo_responder, latency_ms, jitter_ms),
+        "waqi": MockServer(waqi_responder, latency_ms, jitter_ms),
+        "maptiler": MockServer(maptiler_responder, latency_ms, jitter_ms),
+        "gemini": MockServer(gemini_responder, llm_latency, jitter_ms),
+    }
+    for server in servers.values():
+        server.start()
+    return servers
+
+
+def mock_environment(servers: dict) -> dict:
+    """Environment variables that point the backend at the stand-ins."""
+    return {
+        "OPEN_METEO_WEATHER_URL": servers["open_meteo"].url,
+        "OPEN_METEO_AQ_URL": servers["open_meteo"].url,
+        "WAQI_API_URL": servers["waqi"].url,
+        "WAQI_API_KEY": "benchmark",
+        "MAPTILER_API_URL": servers["maptiler"].url,
+        "MAPTILER_API_KEY": "benchmark",
+        "GEMINI_API_ENDPOINT": servers["gemini"].url,
+        "GEMINI_API_KEY": "benchmark",
+    }
+
+
+def stop_mock_services(servers: dict):
+    for server in servers.values():
+        server.stop()
@@ -0,0 +1,147 @@
+# /backend/benchmarks/run_api_benchmark.py
+"""
+End-to-end API benchmark.
+
+1. Starts local stand-ins for Open-Meteo, WAQI, MapTiler and Gemini.
+2. Seeds a local PostGIS (taken from the usual DB_* variables) with synthetic data.
+3. Writes a synthetic COG and launches main.py and tile_server.py with uvicorn.
+4. Drives a realistic request mix and reports throughput and p50/p95/p99.
+
+Point DB_* at a throwaway database: the benchmark tables are truncated.
+
+    python -m benchmarks.run_api_benchmark --scale 2 --duration 60 --concurrency 32 \
+        --output bench.json --compare baseline.json
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from benchmarks import load_test
+from benchmarks.mock_services import mock_environment, start_mock_services, stop_mock_services
+from benchmarks.synthetic import scaled_counts, seed_database, write_synthetic_cog
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_PORT = 8100
+TILE_PORT = 8101
+STARTUP_TIMEOUT_S = 120
+
+
+def launch_server(app_ref, port, env, workers):
+    """Starts `uvicorn <app_ref>` as a child process from the backend directory."""
+    cmd = [sys.executable, "-m", "uvicorn", app_ref, "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+
+
+def wait_until_up(url, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_S
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server for {url} exited with code {process.returncode}")
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.5)
+    raise TimeoutError(f"Server at {url} did not come up within {STARTUP_TIMEOUT_S}s")
+
+
+def compare_reports(current: dict, baseline: dict, tolerance: float) -> list:
+    """Returns human-readable regressions where p95 grew by more than `tolerance`."""
+    regressions = []
+    for name, result in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before or not before.get("p95_ms"):
+            continue
+        growth = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+        if growth > tolerance:
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms (+{growth:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test main.py and tile_server.py against local stand-ins.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the synthetic data volume.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load to apply.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of virtual users.")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers per server.")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Latency of the mock HTTP APIs.")
+    parser.add_argument("--llm-latency-ms", type=float, default=None, help="Latency of the mock LLM (default 10x).")
+    parser.add_argument("--mix", type=str, default=None,
+                        help="Action weights, e.g. 'map_pan=0.6,point_click=0.3,chat=0.1'.")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already in the database.")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report here.")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline JSON report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed p95 growth before flagging.")
+    args = parser.parse_args()
+
+    mix = None
+    if args.mix:
+        mix = {k: float(v) for k, v in (item.split("=") for item in args.mix.split(","))}
+
+    print("--- Starting mock services ---")
+    servers = start_mock_services(args.latency_ms, llm_latency_ms=args.llm_latency_ms)
+    env = {**os.environ, **mock_environment(servers)}
+    os.environ.update(mock_environment(servers))
+    processes = []
+
+    try:
+        counts = scaled_counts(args.scale)
+        if not args.skip_seed:
+            # Imported late so --help works without database credentials.
+            from database import engine
+            import update_schema
+            print("--- Applying schema and seeding synthetic data ---")
+            update_schema.main()
+            inserted = seed_database(engine, args.scale)
+            print(f"Seeded: {inserted}")
+
+        cog_path, meta_path = write_synthetic_cog(os.path.join(BACKEND_DIR, "bench_output"))
+        env["AURA_COG_PATH"] = cog_path
+        env["AURA_META_PATH"] = meta_path
+
+        print("--- Launching API and tile server ---")
+        api = launch_server("main:app", API_PORT, env, args.workers)
+        tiles = launch_server("tile_server:app", TILE_PORT, env, args.workers)
+        processes = [api, tiles]
+        api_url = f"http://127.0.0.1:{API_PORT}"
+        tile_url = f"http://127.0.0.1:{TILE_PORT}"
+        wait_until_up(f"{api_url}/docs", api)
+        wait_until_up(f"{tile_url}/metadata", tiles)
+
+        print(f"--- Driving load for {args.duration:.0f}s with {args.concurrency} virtual users ---")
+        recorder = load_test.run_load(api_url, tile_url, args.duration, args.concurrency, mix,
+                                      user_count=counts["users"])
+        report = load_test.summarize(recorder)
+        report["config"] = vars(args)
+        load_test.print_report(report)
+
+        if args.output:
+            load_test.save_report(report, args.output)
+            print(f"\nReport written to {args.output}")
+
+        if args.compare:
+            import json
+            with open(args.compare) as f:
+                baseline = json.load(f)
+            regressions = compare_reports(report, baseline, args.tolerance)
+            if regressions:
+                print("\n❌ Regressions detected:")
+                for line in regressions:
+                    print(f"  - {line}")
+                sys.exit(1)
+            print("\n✅ No p95 regressions against the baseline.")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+        stop_mock_services(servers)
+
+
+if __name__ == "__main__":
+    main()
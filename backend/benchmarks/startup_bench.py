@@ -0,0 +1,150 @@
+# /backend/benchmarks/startup_bench.py
+"""
+Startup benchmark for the API.
+
+Each round imports a module (main.py by default) in a fresh interpreter
+with `-X importtime`. It reports the wall time of the import and the
+modules with the largest cumulative import time, so anything heavy that
+creeps back into the import path shows up. With --serve it also launches
+uvicorn and times how long the server takes to answer its first request
+and to report ready on /api/v1/health/ready.
+
+    python -m benchmarks.startup_bench --rounds 5 --json after.json --compare before.json
+    python -m benchmarks.startup_bench --serve
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVE_PORT = 8102
+SERVE_TIMEOUT_S = 120
+
+
+def _child_environment() -> dict:
+    """Lets main.py import without a real database (connections are only made on request)."""
+    env = dict(os.environ)
+    for key, default in (("DB_USER", "bench"), ("DB_PASSWORD", "bench"), ("DB_HOST", "127.0.0.1"),
+                         ("DB_PORT", "5432"), ("DB_NAME", "bench")):
+        env.setdefault(key, default)
+    return env
+
+
+def parse_importtime(stderr: str) -> dict:
+    """`-X importtime` output -> {module: (self_us, cumulative_us)}, keeping the first import of each."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.setdefault(name.strip(), (int(self_us), int(cumulative_us)))
+    return modules
+
+
+def time_import(module: str) -> dict:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=BACKEND_DIR, env=_child_environment(), capture_output=True, text=True)
+    wall_s = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    return {"wall_s": wall_s, "modules": parse_importtime(proc.stderr)}
+
+
+def time_serve(app_ref: str) -> dict:
+    """Seconds from launching uvicorn to the first answered request and to readiness."""
+    cmd = [sys.executable, "-m", "uvicorn", app_ref, "--host", "127.0.0.1", "--port", str(SERVE_PORT),
+           "--log-level", "warning"]
+    url = f"http://127.0.0.1:{SERVE_PORT}/api/v1/health/ready"
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=_child_environment())
+    first_response_s = ready_s = None
+    try:
+        while time.perf_counter() - start < SERVE_TIMEOUT_S:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            try:
+                response = requests.get(url, timeout=2)
+            except requests.exceptions.RequestException:
+                time.sleep(0.05)
+                continue
+            elapsed = time.perf_counter() - start
+            first_response_s = first_response_s or elapsed
+            if response.status_code == 200:
+                ready_s = elapsed
+                break
+            time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait()
+    return {"first_response_s": first_response_s, "ready_s": ready_s}
+
+
+def run(module: str, rounds: int, top: int, serve: bool) -> dict:
+    timings, cumulative = [], {}
+    for _ in range(rounds):
+        result = time_import(module)
+        timings.append(result["wall_s"])
+        for name, (_, cumulative_us) in result["modules"].items():
+            cumulative.setdefault(name, []).append(cumulative_us)
+
+    median_cumulative = {name: statistics.median(values) for name, values in cumulative.items()}
+    heaviest = sorted(((name, us) for name, us in median_cumulative.items() if name != module),
+                      key=lambda item: item[1], reverse=True)[:top]
+    report = {
+        "module": module,
+        "rounds": rounds,
+        "min_s": round(min(timings), 4),
+        "median_s": round(statistics.median(timings), 4),
+        "import_s": round(median_cumulative.get(module, 0) / 1e6, 4),
+        "heaviest": [{"module": name, "cumulative_s": round(us / 1e6, 4)} for name, us in heaviest],
+    }
+    if serve:
+        report["serve"] = time_serve(f"{module}:app")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time how long the API takes to import and start.")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="How many of the heaviest imports to list.")
+    parser.add_argument("--serve", action="store_true", help="Also time uvicorn to first response and readiness.")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write results as JSON here.")
+    parser.add_argument("--compare", default=None, help="Previous JSON results to compare against.")
+    args = parser.parse_args()
+
+    report = run(args.module, args.rounds, args.top, args.serve)
+    print(f"import {report['module']}: median {report['median_s']}s wall, "
+          f"{report['import_s']}s in imports (min {report['min_s']}s over {report['rounds']} rounds)")
+    print(f"\n{'heaviest imports':<50}{'cumulative s':>14}")
+    for item in report["heaviest"]:
+        print(f"{item['module']:<50}{item['cumulative_s']:>14}")
+    if "serve" in report:
+        print(f"\nuvicorn: first response after {report['serve']['first_response_s']}s, "
+              f"ready after {report['serve']['ready_s']}s")
+
+    report["created_at"] = datetime.now(timezone.utc).isoformat()
+    report["machine"] = {"python": platform.python_version(), "platform": platform.platform(),
+                         "cpus": os.cpu_count()}
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+    if args.compare:
+        with open(args.compare) as f:
+            before = json.load(f)
+        change = (report["median_s"] - before["median_s"]) / before["median_s"]
+        print(f"\nimport {report['module']}: {before['median_s']}s -> {report['median_s']}s ({change:+.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+# /backend/benchmarks/synthetic.py
+"""
+Synthetic data generators for the benchmark suite.
+
+The generators are deterministic for a given seed so two benchmark runs
+against the same scale see exactly the same data.
+"""
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import text
+
+# --- CONFIGURATION ---
+# Bounding box for India (south, west, north, east), same as the WAQI ingestor.
+BBOX = (8.0, 68.0, 37.0, 97.0)
+POLLUTANTS = ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
+HEALTH_CONDITIONS = ['Asthma', 'Allergies', 'Heart Condition', 'Pregnancy']
+PERSONAS = ['Parent', 'Athlete', 'Commuter', 'Senior', 'Student']
+
+# Row counts at scale=1. Everything grows linearly with --scale.
+BASE_COUNTS = {
+    "stations": 200,
+    "hours": 48,
+    "tempo_cells": 10_000,
+    "users": 1_000,
+    "reports": 500,
+}
+INSERT_CHUNK_SIZE = 5_000
+
+
+def scaled_counts(scale: float) -> dict:
+    """Returns the row counts for each synthetic table at the given scale."""
+    counts = {k: max(1, int(v * scale)) for k, v in BASE_COUNTS.items()}
+    counts["hours"] = BASE_COUNTS["hours"]  # the time window does not grow with scale
+    return counts
+
+
+def _random_points(rng, n):
+    south, west, north, east = BBOX
+    lats = rng.uniform(south, north, n).round(4)
+    lons = rng.uniform(west, east, n).round(4)
+    return lats, lons
+
+
+def generate_air_quality_rows(rng, stations: int, hours: int, end_time: datetime):
+    """Hourly readings for `stations` fixed sites over the last `hours` hours, in canonical units."""
+    lats, lons = _random_points(rng, stations)
+    base = rng.gamma(2.0, 40.0, stations)
+    for h in range(hours):
+        t = (end_time - timedelta(hours=hours - 1 - h)).isoformat()
+        diurnal = 1.0 + 0.3 * np.sin(2 * np.pi * h / 24)
+        for i in range(stations):
+            level = base[i] * diurnal
+            yield {
+                "time": t, "lat": float(lats[i]), "lon": float(lons[i]),
+                "source": f"SYNTH-@{i}",
+                "aqi": int(min(level, 500)),
+                "pm25": float(level * 0.6), "pm10": float(level * 0.9),
+                "o3": float(rng.uniform(5, 80)), "no2": float(rng.uniform(5, 120)),
+                "so2": float(rng.uniform(1, 40)), "co": float(rng.uniform(0.1, 4.0)),
+            }
+
+
+def generate_tempo_rows(rng, cells: int, end_time: datetime):
+    """A single TEMPO-like NO2 grid at the latest timestamp."""
+    side = int(np.ceil(np.sqrt(cells)))
+    south, west, north, east = BBOX
+    lat_axis = np.linspace(south, north, side)
+    lon_axis = np.linspace(west, east, side)
+    t = end_time.isoformat()
+    count = 0
+    for lat in lat_axis:
+        for lon in lon_axis:
+            if count >= cells:
+                return
+            count += 1
+            yield {
+                "time": t, "lat": float(round(lat, 4)), "lon": float(round(lon, 4)),
+                "no2_tropospheric": float(rng.lognormal(36.0, 0.5)),
+                "terrain_height": float(rng.uniform(0, 3000)),
+                "surface_pressure": float(rng.uniform(850, 1013)),
+                "quality_flag": 0,
+            }
+
+
+def generate_user_rows(rng, users: int):
+    lats, lons = _random_points(rng, users)
+    for i in range(users):
+        conditions = [c for c in HEALTH_CONDITIONS if rng.random() < 0.2]
+        days = [d for d in ['Weekdays', 'Weekends'] if rng.random() < 0.6] or ['Weekdays']
+        yield {
+            "name": f"Synthetic User {i}",
+            "health_conditions": json.dumps(conditions),
+            "age_group": str(rng.choice(['18-30', '31-50', '51-65', '65+'])),
+            "persona": str(rng.choice(PERSONAS)),
+            "work_location": f"POINT({lons[i]} {lats[i]})",
+            "outdoor_schedule": json.dumps({"days": days, "time": str(rng.choice(['morning', 'afternoon', 'evening']))}),
+            "podcast_keywords": json.dumps([]),
+        }
+
+
+def generate_report_rows(rng, reports: int, user_count: int, end_time: datetime):
+    lats, lons = _random_points(rng, reports)
+    for i in range(reports):
+        yield {
+            "user_id": int(rng.integers(1, user_count + 1)),
+            "lat": float(lats[i]), "lon": float(lons[i]),
+            "description": f"Synthetic report {i}",
+            "image_url": None,
+            "status": 'verified' if rng.random() < 0.8 else 'pending',
+            "created_at": (end_time - timedelta(minutes=int(rng.integers(0, 60 * 24 * 30)))).isoformat(),
+        }
+
+
+def _with_computed_aqi(rows):
+    """Adds computed_aqi/dominant_pollutant, as the ingestors do, one insert chunk at a time."""
+    import aqi_calculator
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_CHUNK_SIZE:
+            yield from aqi_calculator.annotate_records(batch)
+            batch = []
+    yield from aqi_calculator.annotate_records(batch)
+
+
+def _insert_chunked(connection, query, rows):
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_CHUNK_SIZE:
+            connection.execute(query, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        connection.execute(query, batch)
+        total += len(batch)
+    return total
+
+
+def seed_database(engine, scale: float = 1.0, seed: int = 42) -> dict:
+    """
+    Truncates the benchmark tables and fills them with synthetic data.
+    Must only ever be pointed at a throwaway database.
+    """
+    rng = np.random.default_rng(seed)
+    counts = scaled_counts(scale)
+    end_time = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    with engine.connect() as connection:
+        with connection.begin():
+            connection.execute(text("TRUNCATE citizen_reports, users, air_quality_data, tempo_grid_data RESTART IDENTITY CASCADE;"))
+
+            inserted = {}
+            inserted["air_quality_data"] = _insert_chunked(connection, text("""
+                INSERT INTO air_quality_data (time, latitude, longitude, source, aqi, pm25, pm10, o3, no2, so2, co,
+                                              computed_aqi, dominant_pollutant)
+                VALUES (:time, :lat, :lon, :source, :aqi, :pm25, :pm10, :o3, :no2, :so2, :co,
+                        :computed_aqi, :dominant_pollutant)
+                ON CONFLICT (time, latitude, longitude) DO NOTHING;
+            """), _with_computed_aqi(generate_air_quality_rows(rng, counts["stations"], counts["hours"], end_time)))
+
+            inserted["tempo_grid_data"] = _insert_chunked(connection, text("""
+                INSERT INTO tempo_grid_data (time, latitude, longitude, no2_tropospheric, terrain_height, surface_pressure, quality_flag)
+                VALUES (:time, :lat, :lon, :no2_tropospheric, :terrain_height, :surface_pressure, :quality_flag)
+                ON CONFLICT DO NOTHING;
+            """), generate_tempo_rows(rng, counts["tempo_cells"], end_time))
+
+            inserted["users"] = _insert_chunked(connection, text("""
+                INSERT INTO users (name, health_conditions, age_group, persona, work_location, outdoor_schedule, podcast_keywords)
+                VALUES (:name, :health_conditions, :age_group, :persona, ST_GeomFromText(:work_location, 4326),
+                        :outdoor_schedule, :podcast_keywords)
+            """), generate_user_rows(rng, counts["users"]))
+
+            inserted["citizen_reports"] = _insert_chunked(connection, text("""
+                INSERT INTO citizen_reports (user_id, latitude, longitude, description, image_url, status, created_at)
+                VALUES (:user_id, :lat, :lon, :description, :image_url, :status, :created_at)
+            """), generate_report_rows(rng, counts["reports"], counts["users"], end_time))
+
+        connection.execute(text("ANALYZE;"))
+        connection.commit()
+
+    return inserted
+
+
+def write_synthetic_cog(out_dir: str, size: int = 2048, seed: int = 42):
+    """
+    Writes a Web-Mercator COG and metadata JSON in the layout that
+    tile_server.py expects (see AURA_COG_PATH / AURA_META_PATH).
+    """
+    import rasterio
+    from rasterio.transform import from_bounds
+    from pyproj import Transformer
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    cog_path = os.path.join(out_dir, "synthetic_no2_3857_cog.tif")
+    meta_path = os.path.join(out_dir, "synthetic_metadata.json")
+
+    south, west, north, east = BBOX
+    transformer = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
+    minx, miny = transformer.transform(west, south)
+    maxx, maxy = transformer.transform(east, north)
+
+    yy, xx = np.mgrid[0:size, 0:size] / size
+    data = (np.sin(6 * xx) * np.cos(4 * yy) + 1.5) * 1e15
+    data += rng.normal(0, 1e14, data.shape)
+    data = data.astype("float32")
+
+    profile = {
+        "driver": "GTiff", "dtype": "float32", "count": 1,
+        "height": size, "width": size, "crs": "EPSG:3857",
+        "transform": from_bounds(minx, miny, maxx, maxy, size, size),
+        "nodata": np.nan, "tiled": True, "blockxsize": 512, "blockysize": 512,
+        "compress": "deflate",
+    }
+    with rasterio.open(cog_path, "w", **profile) as dst:
+        dst.write(data, 1)
+        dst.build_overviews([2, 4, 8, 16], rasterio.enums.Resampling.average)
+
+    with open(meta_path, "w") as f:
+        json.dump({
+            "variable": "synthetic_no2",
+            "vmin": float(np.percentile(data, 2)),
+            "vmax": float(np.percentile(data, 98)),
+            "cog_path": os.path.abspath(cog_path),
+        }, f, indent=2)
+
+    return cog_path, meta_path
+
+
+# --- Synthetic satellite granules (for the microbenchmarks) ---
+
+TEMPO_EPOCH = "seconds since 1980-01-06T00:00:00Z"
+AIRS_SWATH = "/HDFEOS/SWATHS/L2_Standard_atmospheric&surface_product"
+
+
+def _swath_geolocation(rng, n_scan: int, n_xtrack: int):
+    """A slightly skewed lat/lon swath over the bounding box, like a real scan."""
+    south, west, north, east = BBOX
+    scan = np.linspace(0.0, 1.0, n_scan)[:, None]
+    xtrack = np.linspace(0.0, 1.0, n_xtrack)[None, :]
+    lat = south + (north - south) * (scan + 0.05 * xtrack)
+    lon = west + (east - west) * (xtrack + 0.05 * scan)
+    return lat.astype("float32"), lon.astype("float32")
+
+
+def write_synthetic_tempo_granule(path: str, n_scan: int = 512, n_xtrack: int = 512,
+                                  invalid_fraction: float = 0.2, seed: int = 42) -> str:
+    """
+    Writes a NetCDF file with the same group / variable layout as a TEMPO
+    NO2 L2 granule (geolocation, product, support_data).
+    """
+    import netCDF4
+
+    rng = np.random.default_rng(seed)
+    lat, lon = _swath_geolocation(rng, n_scan, n_xtrack)
+    no2 = rng.lognormal(36.0, 0.6, (n_scan, n_xtrack))
+    invalid = rng.random((n_scan, n_xtrack)) < invalid_fraction
+    no2[rng.random((n_scan, n_xtrack)) < invalid_fraction / 4] = np.nan
+    quality = np.where(invalid, 1, 0).astype("float32")
+    quality[rng.random((n_scan, n_xtrack)) < 0.01] = np.nan
+
+    with netCDF4.Dataset(path, "w") as root:
+        root.createDimension("mirror_step", n_scan)
+        root.createDimension("xtrack", n_xtrack)
+
+        geo = root.createGroup("geolocation")
+        for name, values in (("latitude", lat), ("longitude", lon)):
+            var = geo.createVariable(name, "f4", ("mirror_step", "xtrack"), zlib=True)
+            var[:] = values
+        time_var = geo.createVariable("time", "f8", ("mirror_step",))
+        time_var.units = TEMPO_EPOCH
+        time_var[:] = 1.4e9 + np.arange(n_scan) * 2.9
+
+        product = root.createGroup("product")
+        var = product.createVariable("vertical_column_troposphere", "f8", ("mirror_step", "xtrack"), zlib=True)
+        var[:] = no2
+        var = product.createVariable("main_data_quality_flag", "f4", ("mirror_step", "xtrack"), zlib=True)
+        var[:] = quality
+
+        support = root.createGroup("support_data")
+        for name, low, high in (("terrain_height", 0, 3000), ("surface_pressure", 850, 1013), ("wind_speed", 0, 20)):
+            var = support.createVariable(name, "f4", ("mirror_step", "xtrack"), zlib=True)
+            var[:] = rng.uniform(low, high, (n_scan, n_xtrack)).astype("float32")
+
+    return path
+
+
+def write_synthetic_airs_granule(path: str, n_scan: int = 45, n_xtrack: int = 30,
+                                 fill_fraction: float = 0.1, seed: int = 42) -> str:
+    """Writes an HDF5 file with the AIRS L2 swath paths that ingest_airs.py reads."""
+    import h5py
+
+    rng = np.random.default_rng(seed)
+    lat, lon = _swath_geolocation(rng, n_scan, n_xtrack)
+    fill_value = -9999
+    raw = rng.integers(1000, 30000, (n_scan, n_xtrack)).astype("int32")
+    raw[rng.random((n_scan, n_xtrack)) < fill_fraction] = fill_value
+
+    with h5py.File(path, "w") as f:
+        data = f.create_dataset(f"{AIRS_SWATH}/Data Fields/TotCO_A", data=raw)
+        data.attrs["_FillValue"] = np.array([fill_value], dtype="int32")
+        data.attrs["scale_factor"] = np.array([1e14], dtype="float64")
+        data.attrs["add_offset"] = np.array([0.0], dtype="float64")
+        f.create_dataset(f"{AIRS_SWATH}/Geolocation Fields/Latitude", data=lat.astype("float64"))
+        f.create_dataset(f"{AIRS_SWATH}/Geolocation Fields/Longitude", data=lon.astype("float64"))
+
+    return path
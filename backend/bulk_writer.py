@@ -0,0 +1,78 @@
+# /backend/bulk_writer.py
+"""
+Set-based bulk upserts.
+
+Instead of one parameter set (and one server round trip) per row, each
+column is sent as a single array and the rows are rebuilt server-side
+with unnest(), so a batch of any size is one INSERT ... ON CONFLICT.
+Columns may be NumPy arrays, pandas Series or plain lists.
+"""
+from datetime import timezone
+import numpy as np
+from sqlalchemy import text
+
+# --- CONFIGURATION ---
+DEFAULT_CHUNK_SIZE = 100_000   # rows per statement; keeps parameter arrays a sane size
+
+_sql_cache = {}
+
+
+def _to_list(values):
+    """Array-like -> list of Python scalars with NaN/NaT as None."""
+    if hasattr(values, 'tolist') and not isinstance(values, list):
+        arr = np.asarray(values)
+        if arr.dtype.kind == 'f':
+            return [None if v != v else v for v in arr.tolist()]
+        if arr.dtype.kind == 'M':
+            # datetime64[ns].tolist() gives ints; microseconds give datetimes (NaT -> None).
+            # datetime64 carries no zone; it is UTC throughout this codebase.
+            return [None if v is None else v.replace(tzinfo=timezone.utc)
+                    for v in arr.astype('datetime64[us]').tolist()]
+        values = arr.tolist()
+    return [None if isinstance(v, float) and v != v else v for v in values]
+
+
+def _build_sql(table, column_types, conflict_columns, on_conflict):
+    names = list(column_types)
+    arrays = ",\n            ".join(f"CAST(:{n} AS {column_types[n]}[])" for n in names)
+    updatable = [n for n in names if n not in conflict_columns]
+    if on_conflict == 'nothing' or not updatable:
+        action = "DO NOTHING"
+    elif on_conflict == 'coalesce':
+        # Keep existing values for columns this batch has no value for
+        action = "DO UPDATE SET " + ", ".join(f"{n} = COALESCE(EXCLUDED.{n}, {table}.{n})" for n in updatable)
+    else:
+        action = "DO UPDATE SET " + ", ".join(f"{n} = EXCLUDED.{n}" for n in updatable)
+    return text(f"""
+        INSERT INTO {table} ({', '.join(names)})
+        SELECT * FROM unnest(
+            {arrays}
+        )
+        ON CONFLICT ({', '.join(conflict_columns)}) {action};
+    """)
+
+
+def upsert_columns(db, table: str, columns: dict, column_types: dict, conflict_columns,
+                   on_conflict: str = 'overwrite', chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Upserts equal-length `columns` ({name: values}) into `table`.
+
+    column_types maps each name to its Postgres type (e.g. 'TIMESTAMPTZ').
+    on_conflict is 'overwrite', 'coalesce' (only non-null values replace
+    existing ones) or 'nothing'. Returns the number of rows sent. Duplicate
+    conflict keys within one batch must be removed by the caller.
+    """
+    names = list(columns)
+    n_rows = len(columns[names[0]]) if names else 0
+    if n_rows == 0:
+        return 0
+    types = {n: column_types[n] for n in names}
+    key = (table, tuple(types.items()), tuple(conflict_columns), on_conflict)
+    if key not in _sql_cache:
+        _sql_cache[key] = _build_sql(table, types, conflict_columns, on_conflict)
+    statement = _sql_cache[key]
+
+    lists = {n: _to_list(columns[n]) for n in names}
+    for start in range(0, n_rows, chunk_size):
+        db.execute(statement, {n: values[start:start + chunk_size] for n, values in lists.items()})
+    return n_rows
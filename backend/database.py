@@ -1,7 +1,8 @@
 # /backend/database.py
 
 import os
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
@@ -18,8 +19,32 @@ if not all([DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME]):
     raise ValueError("One or more database environment variables are not set.")
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(DATABASE_URL)
+# --- Pool / Connection Tuning (all overridable from .env) ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))        # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))      # seconds before a connection is replaced
+# Server-side limit for any single statement; 0 disables it (e.g. for one-off backfills).
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+# Size of SQLAlchemy's compiled-statement cache and asyncpg's prepared-statement cache.
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "aura-backend")
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    query_cache_size=DB_STATEMENT_CACHE_SIZE,
+    connect_args={
+        "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+        "application_name": DB_APPLICATION_NAME,
+    },
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -27,4 +52,84 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# --- Pool Saturation Metrics ---
+_pool_counters = {"checkouts": 0, "peak_checked_out": 0}
+_pool_counters_lock = threading.Lock()
+
+@event.listens_for(engine, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    with _pool_counters_lock:
+        _pool_counters["checkouts"] += 1
+        _pool_counters["peak_checked_out"] = max(_pool_counters["peak_checked_out"], engine.pool.checkedout())
+
+def _describe_pool(pool, peak=None, checkouts=None):
+    capacity = DB_POOL_SIZE + DB_MAX_OVERFLOW
+    checked_out = pool.checkedout()
+    stats = {
+        "pool_size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "saturation": round(checked_out / capacity, 3) if capacity else None,
+    }
+    if peak is not None:
+        stats["peak_checked_out"] = peak
+        stats["total_checkouts"] = checkouts
+    return stats
+
+def get_pool_stats() -> dict:
+    """
+    Returns current utilisation of the sync (and, if started, async) pools.
+    A saturation close to 1.0 means requests are queueing for connections.
+    """
+    with _pool_counters_lock:
+        peak = _pool_counters["peak_checked_out"]
+        checkouts = _pool_counters["checkouts"]
+    stats = {"sync": _describe_pool(engine.pool, peak, checkouts)}
+    if _async_engine is not None:
+        stats["async"] = _describe_pool(_async_engine.sync_engine.pool)
+    return stats
+
+
+# --- Async Engine (asyncpg) ---
+# Created lazily so that scripts which never touch it don't need asyncpg installed.
+_async_engine = None
+_async_sessionmaker = None
+_async_lock = threading.Lock()
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        with _async_lock:
+            if _async_engine is None:
+                from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+                server_settings = {"application_name": DB_APPLICATION_NAME}
+                if DB_STATEMENT_TIMEOUT_MS:
+                    server_settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+
+                _async_engine = create_async_engine(
+                    ASYNC_DATABASE_URL,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=True,
+                    query_cache_size=DB_STATEMENT_CACHE_SIZE,
+                    connect_args={
+                        "server_settings": server_settings,
+                        "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+                    },
+                )
+                _async_sessionmaker = async_sessionmaker(_async_engine, expire_on_commit=False)
+    return _async_engine
+
+async def get_async_db():
+    """FastAPI dependency for `async def` endpoints; never blocks the event loop."""
+    get_async_engine()
+    async with _async_sessionmaker() as db:
+        yield db
@@ -0,0 +1,315 @@
+# /backend/exposure_engine.py
+"""
+Schedule-aware exposure forecasting.
+
+Each user's `outdoor_schedule` ({"days": ["Weekdays", "Weekends"], "time": "morning"})
+is turned into a users x hours boolean mask over the next 72 hours (in the
+local time of their work location) and combined with the hourly AQI
+forecast at that location, giving the expected and peak AQI for every
+scheduled outdoor window.
+
+One cycle:
+  1. refresh_forecasts() pulls the Open-Meteo hourly US AQI forecast for
+     every distinct (snapped) user location, many locations per request.
+  2. compute_exposures() scores all users with array operations and
+     replaces the `exposure_forecasts` cache table, tagged with the
+     forecast issue time, so readers are served from it until the next refresh.
+
+The ingestion daemon runs a cycle every hour as its "exposure" source.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import requests
+from sqlalchemy import text
+
+from database import SessionLocal
+from forecasting_engine import API_URL
+from personalization_engine import classify_batch
+from rules_engine import get_rules
+
+# --- CONFIGURATION ---
+HORIZON_HOURS = 72
+GRID_STEP_DEG = 0.25            # CAMS forecasts are ~0.4°, so finer snapping gains nothing
+LOCATIONS_PER_REQUEST = 50      # Open-Meteo accepts comma-separated coordinate lists
+MAX_CONCURRENT_REQUESTS = 4
+MAX_RETRIES = 3
+WRITE_CHUNK_SIZE = 10_000
+
+# Local hours covered by each `outdoor_schedule.time` value (matches RegistrationModal.tsx).
+TIME_SLOTS = {
+    "morning": range(6, 12),
+    "afternoon": range(12, 18),
+    "evening": range(18, 22),
+}
+# Which local weekdays (Mon=0) each `outdoor_schedule.days` value covers.
+DAY_TYPES = {
+    "weekdays": [0, 1, 2, 3, 4],
+    "weekends": [5, 6],
+    "monday": [0], "tuesday": [1], "wednesday": [2], "thursday": [3],
+    "friday": [4], "saturday": [5], "sunday": [6],
+}
+
+CREATE_EXPOSURE_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS aqi_forecasts (
+        time TIMESTAMPTZ NOT NULL,
+        latitude DOUBLE PRECISION NOT NULL,
+        longitude DOUBLE PRECISION NOT NULL,
+        us_aqi DOUBLE PRECISION,
+        utc_offset_seconds INTEGER NOT NULL DEFAULT 0,
+        issued_at TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (time, latitude, longitude)
+    );
+
+    CREATE TABLE IF NOT EXISTS exposure_forecasts (
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        window_start TIMESTAMPTZ NOT NULL,
+        window_end TIMESTAMPTZ NOT NULL,
+        expected_aqi DOUBLE PRECISION,
+        peak_aqi DOUBLE PRECISION,
+        risk_level VARCHAR(20),
+        forecast_issued_at TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (user_id, window_start)
+    );
+"""
+
+
+# --- Schedules ---
+
+def snap(values):
+    return np.round(np.asarray(values, dtype=float) / GRID_STEP_DEG) * GRID_STEP_DEG
+
+def schedule_tables():
+    """
+    Lookup tables indexed by a user's slot / day-type code:
+    hour_mask[slot, local_hour] and day_mask[day_code, local_weekday].
+    Day codes are 7-bit weekday sets, so any combination of `days` works.
+    """
+    slot_names = list(TIME_SLOTS)
+    hour_mask = np.zeros((len(slot_names) + 1, 24), dtype=bool)   # last row: no slot -> never outside
+    for i, name in enumerate(slot_names):
+        hour_mask[i, list(TIME_SLOTS[name])] = True
+    day_mask = ((np.arange(128)[:, None] >> np.arange(7)[None, :]) & 1).astype(bool)
+    return slot_names, hour_mask, day_mask
+
+def encode_schedule(schedule, slot_names) -> tuple:
+    """Returns (slot index, weekday bitmask) for one `outdoor_schedule` value."""
+    if isinstance(schedule, str):
+        try:
+            schedule = json.loads(schedule)
+        except ValueError:
+            schedule = None
+    if not schedule:
+        return len(slot_names), 0
+    slot = (schedule.get('time') or '').lower()
+    slot_idx = slot_names.index(slot) if slot in slot_names else len(slot_names)
+    bits = 0
+    for day in schedule.get('days') or []:
+        for weekday in DAY_TYPES.get(str(day).lower(), []):
+            bits |= 1 << weekday
+    return slot_idx, bits
+
+
+# --- Forecast Refresh ---
+
+def _fetch_forecast_batch(points):
+    params = {
+        "latitude": ",".join(f"{lat:.4f}" for lat, _ in points),
+        "longitude": ",".join(f"{lon:.4f}" for _, lon in points),
+        "hourly": "us_aqi",
+        "forecast_days": 4,
+        "timezone": "auto",
+        "timeformat": "unixtime",
+    }
+    for attempt in range(MAX_RETRIES):
+        try:
+            response = requests.get(API_URL, params=params, timeout=30)
+            if response.status_code == 429:
+                time.sleep(2 ** attempt * 15)
+                continue
+            response.raise_for_status()
+            data = response.json()
+            return data if isinstance(data, list) else [data]
+        except requests.exceptions.RequestException as e:
+            print(f"AQI forecast batch of {len(points)} locations failed (attempt {attempt + 1}): {e}")
+            time.sleep(2 ** attempt)
+    return None
+
+def refresh_forecasts(db) -> int:
+    """
+    Fetches hourly AQI forecasts for every distinct snapped user location.
+    Batches that still fail after MAX_RETRIES are skipped and the rest are
+    stored; raises RequestException only if every batch failed.
+    """
+    cells = db.execute(text(f"""
+        SELECT DISTINCT ROUND(ST_Y(work_location) / {GRID_STEP_DEG}) * {GRID_STEP_DEG} AS lat,
+                        ROUND(ST_X(work_location) / {GRID_STEP_DEG}) * {GRID_STEP_DEG} AS lon
+        FROM users WHERE work_location IS NOT NULL;
+    """)).all()
+    if not cells:
+        return 0
+
+    points = [(float(lat), float(lon)) for lat, lon in cells]
+    batches = [points[i:i + LOCATIONS_PER_REQUEST] for i in range(0, len(points), LOCATIONS_PER_REQUEST)]
+    issued_at = datetime.now(timezone.utc)
+
+    records, failed = [], 0
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as pool:
+        for batch, results in zip(batches, pool.map(_fetch_forecast_batch, batches)):
+            if results is None:
+                failed += 1
+                continue
+            for (lat, lon), result in zip(batch, results):
+                hourly = result.get('hourly', {})
+                offset = int(result.get('utc_offset_seconds', 0))
+                for ts, value in zip(hourly.get('time', []), hourly.get('us_aqi', [])):
+                    records.append({
+                        "time": datetime.fromtimestamp(ts, timezone.utc), "lat": lat, "lon": lon,
+                        "aqi": value, "offset": offset, "issued_at": issued_at,
+                    })
+
+    if failed == len(batches):
+        raise requests.exceptions.RequestException(f"All {failed} AQI forecast batches failed.")
+    if failed:
+        print(f"❌ {failed} of {len(batches)} AQI forecast batches failed; storing the rest.")
+
+    upsert = text("""
+        INSERT INTO aqi_forecasts (time, latitude, longitude, us_aqi, utc_offset_seconds, issued_at)
+        VALUES (:time, :lat, :lon, :aqi, :offset, :issued_at)
+        ON CONFLICT (time, latitude, longitude) DO UPDATE SET
+            us_aqi = EXCLUDED.us_aqi, utc_offset_seconds = EXCLUDED.utc_offset_seconds,
+            issued_at = EXCLUDED.issued_at;
+    """)
+    for start in range(0, len(records), WRITE_CHUNK_SIZE):
+        db.execute(upsert, records[start:start + WRITE_CHUNK_SIZE])
+    db.execute(text("DELETE FROM aqi_forecasts WHERE time < NOW() - INTERVAL '1 day';"))
+    db.commit()
+    return len(records)
+
+
+# --- Exposure Computation ---
+
+def load_forecast_matrix(db, start_hour: datetime):
+    """
+    Returns (cell_lats, cell_lons, offsets, aqi[cells, HORIZON_HOURS], issued_at)
+    aligned on UTC hours from `start_hour`; missing hours are NaN.
+    """
+    rows = db.execute(text("""
+        SELECT latitude, longitude, EXTRACT(EPOCH FROM time)::BIGINT AS ts, us_aqi,
+               utc_offset_seconds, issued_at
+        FROM aqi_forecasts
+        WHERE time >= :start AND time < :start + (INTERVAL '1 hour' * :hours);
+    """), {"start": start_hour, "hours": HORIZON_HOURS}).all()
+    if not rows:
+        return None
+
+    lats, lons, ts, aqi, offsets, issued = zip(*rows)
+    coords = np.column_stack((np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)))
+    cells, cell_idx = np.unique(coords, axis=0, return_inverse=True)
+    cell_idx = cell_idx.ravel()
+    hour_idx = ((np.asarray(ts, dtype=np.int64) - int(start_hour.timestamp())) // 3600).astype(int)
+
+    matrix = np.full((len(cells), HORIZON_HOURS), np.nan)
+    matrix[cell_idx, hour_idx] = np.asarray(aqi, dtype=float)
+    cell_offsets = np.zeros(len(cells), dtype=np.int64)
+    cell_offsets[cell_idx] = np.asarray(offsets, dtype=np.int64)
+    return cells[:, 0], cells[:, 1], cell_offsets, matrix, max(issued)
+
+def compute_exposures(db) -> int:
+    start_hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    forecast = load_forecast_matrix(db, start_hour)
+    if forecast is None:
+        print("No forecasts available; run refresh_forecasts first.")
+        return 0
+    cell_lats, cell_lons, cell_offsets, matrix, issued_at = forecast
+
+    users = db.execute(text("""
+        SELECT id, ST_Y(work_location), ST_X(work_location), outdoor_schedule, health_conditions
+        FROM users WHERE work_location IS NOT NULL AND outdoor_schedule IS NOT NULL;
+    """)).all()
+    if not users:
+        return 0
+    user_ids, lats, lons, schedules, conditions = zip(*users)
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+
+    # Map every user to their forecast cell by snapped coordinates.
+    cell_lookup = {(round(a, 6), round(b, 6)): i for i, (a, b) in enumerate(zip(cell_lats, cell_lons))}
+    snapped = np.column_stack((snap(lats), snap(lons)))
+    user_cell = np.array([cell_lookup.get((round(a, 6), round(b, 6)), -1) for a, b in snapped])
+    has_cell = user_cell >= 0
+
+    slot_names, hour_mask, day_mask = schedule_tables()
+    codes = np.array([encode_schedule(s, slot_names) for s in schedules], dtype=np.int64)
+    slot_idx, day_bits = codes[:, 0], codes[:, 1]
+
+    # users x hours: local hour of day / weekday / calendar day at the user's location.
+    utc_epoch = int(start_hour.timestamp()) + 3600 * np.arange(HORIZON_HOURS)
+    local_epoch = utc_epoch[None, :] + cell_offsets[np.maximum(user_cell, 0)][:, None]
+    local_hour = (local_epoch // 3600) % 24
+    local_day = local_epoch // 86400
+    local_weekday = (local_day + 3) % 7      # 1970-01-01 was a Thursday (Mon=0)
+
+    outside = hour_mask[slot_idx[:, None], local_hour] & day_mask[day_bits[:, None], local_weekday]
+    outside &= has_cell[:, None]
+    aqi = matrix[np.maximum(user_cell, 0)]                       # users x hours
+    outside &= ~np.isnan(aqi)
+
+    # Each scheduled window lies within one local day, so aggregate per day.
+    first_day = local_day.min()
+    rows = []
+    condition_masks = get_rules().condition_masks(conditions)
+    for day in range(first_day, local_day.max() + 1):
+        in_window = outside & (local_day == day)
+        counts = in_window.sum(axis=1)
+        active = np.flatnonzero(counts)
+        if active.size == 0:
+            continue
+        window_aqi = np.where(in_window[active], aqi[active], np.nan)
+        expected = np.nanmean(window_aqi, axis=1)
+        peak = np.nanmax(window_aqi, axis=1)
+        first_hour = in_window[active].argmax(axis=1)
+        last_hour = HORIZON_HOURS - 1 - in_window[active][:, ::-1].argmax(axis=1)
+        risk_levels, _ = classify_batch(peak, condition_masks[active])
+        for j, u in enumerate(active):
+            rows.append({
+                "user_id": int(user_ids[u]),
+                "window_start": datetime.fromtimestamp(int(utc_epoch[first_hour[j]]), timezone.utc),
+                "window_end": datetime.fromtimestamp(int(utc_epoch[last_hour[j]]) + 3600, timezone.utc),
+                "expected_aqi": round(float(expected[j]), 1),
+                "peak_aqi": float(peak[j]),
+                "risk_level": risk_levels[j],
+                "issued_at": issued_at,
+            })
+
+    db.execute(text("DELETE FROM exposure_forecasts;"))
+    insert = text("""
+        INSERT INTO exposure_forecasts (user_id, window_start, window_end, expected_aqi, peak_aqi, risk_level, forecast_issued_at)
+        VALUES (:user_id, :window_start, :window_end, :expected_aqi, :peak_aqi, :risk_level, :issued_at);
+    """)
+    for start in range(0, len(rows), WRITE_CHUNK_SIZE):
+        db.execute(insert, rows[start:start + WRITE_CHUNK_SIZE])
+    db.commit()
+    return len(rows)
+
+def run_exposure_cycle(refresh: bool = True) -> dict:
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        fetched = refresh_forecasts(db) if refresh else 0
+        windows = compute_exposures(db)
+        elapsed = time.perf_counter() - started
+        print(f"✅ Exposure cycle: {fetched} forecast rows, {windows} scheduled windows in {elapsed:.2f}s.")
+        return {"forecast_rows": fetched, "windows": windows, "seconds": round(elapsed, 3)}
+    except Exception as e:
+        print(f"An error occurred during the exposure cycle: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_exposure_cycle()
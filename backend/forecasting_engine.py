@@ -1,8 +1,10 @@
+import os
 import requests
 from typing import List, Dict, Any, Optional
 
 # The dedicated Air Quality API URL from Open-Meteo
-API_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
+# (Overridable so the benchmark suite can point it at a local stand-in.)
+API_URL = os.getenv("OPEN_METEO_AQ_URL", "https://air-quality-api.open-meteo.com") + "/v1/air-quality"
 
 def generate_forecast(
     lat: float, 
@@ -0,0 +1,200 @@
+# /backend/frame_bundles.py
+"""
+Prebuilt animation frames for the map's time scrubber.
+
+A bundle holds a whole window of hourly frames (default the 48 hours up to
+the newest observation) for a fixed set of grid cells. It has three parts:
+
+    cells    lat/lon of each CELL_STEP_DEG cell that has data in the window
+    frames   ISO hour of each frame
+    data     frames x cells matrix, quantized to uint8/uint16
+             (value = offset + q * scale; q == nodata means no value),
+             delta-encoded between frames (q[t] - q[t-1], wrapping in the
+             dtype), then zlib-compressed and base64'd
+
+Consecutive hours barely change, so most deltas are 0 and compress to
+almost nothing. The client downloads one bundle, decodes it once and then
+scrubs without further requests (frontend/src/lib/frameBundle.ts).
+
+Bundles are stored in `frame_bundles`. The ingestion daemon rebuilds them
+after any ingestion run that wrote rows, and the API builds one on demand
+if it is missing.
+"""
+import base64
+import json
+import zlib
+from datetime import timedelta
+import numpy as np
+from sqlalchemy import text
+
+# --- CONFIGURATION ---
+POLLUTANTS = {'auto': 'computed_aqi', 'pm25': 'pm25', 'pm10': 'pm10', 'o3': 'o3',
+              'no2': 'no2', 'so2': 'so2', 'co': 'co'}
+DEFAULT_HOURS = 48
+MAX_HOURS = 168
+CELL_STEP_DEG = 0.25
+MAX_CELLS = 5000          # cells with the most observations are kept
+FILL_HOURS = 3            # a cell shows its nearest observation up to this many hours away (as /grid/current's ±3h)
+DTYPES = {'uint8': np.uint8, 'uint16': np.uint16}
+DEFAULT_DTYPE = 'uint16'
+
+CREATE_FRAME_BUNDLES_SQL = """
+    CREATE TABLE IF NOT EXISTS frame_bundles (
+        pollutant VARCHAR(20) NOT NULL,
+        hours INTEGER NOT NULL,
+        anchor TIMESTAMPTZ NOT NULL,
+        built_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        bundle JSONB NOT NULL,
+        PRIMARY KEY (pollutant, hours)
+    );
+"""
+
+
+def _observations_sql(column):
+    return text(f"""
+        SELECT EXTRACT(EPOCH FROM date_trunc('hour', time, 'UTC')) AS hour,
+               ROUND(latitude / {CELL_STEP_DEG}) * {CELL_STEP_DEG} AS lat,
+               ROUND(longitude / {CELL_STEP_DEG}) * {CELL_STEP_DEG} AS lon,
+               AVG({column}) AS value
+        FROM air_quality_data
+        WHERE {column} IS NOT NULL
+          AND source NOT LIKE 'NASA-%'
+          AND time > CAST(:anchor AS TIMESTAMPTZ) - make_interval(hours => :hours) AND time <= :anchor
+        GROUP BY 1, 2, 3;
+    """)
+
+
+def fill_gaps(matrix, max_hours: int = FILL_HOURS):
+    """Fills NaNs from the nearest non-NaN frame at most max_hours away (earlier frame wins ties)."""
+    original = matrix
+    matrix = matrix.copy()
+    for k in range(1, max_hours + 1):
+        for source, target in ((original[:-k], matrix[k:]), (original[k:], matrix[:-k])):
+            missing = np.isnan(target) & ~np.isnan(source)
+            target[missing] = source[missing]
+    return matrix
+
+
+def quantize(matrix, dtype: str = DEFAULT_DTYPE):
+    """float matrix -> (q, offset, scale, nodata), NaN -> nodata."""
+    np_dtype = DTYPES[dtype]
+    nodata = int(np.iinfo(np_dtype).max)
+    finite = np.isfinite(matrix)
+    offset = float(matrix[finite].min()) if finite.any() else 0.0
+    span = float(matrix[finite].max()) - offset if finite.any() else 0.0
+    scale = span / (nodata - 1) if span > 0 else 1.0
+    q = np.full(matrix.shape, nodata, dtype=np_dtype)
+    q[finite] = np.round((matrix[finite] - offset) / scale).astype(np_dtype)
+    return q, offset, scale, nodata
+
+
+def delta_encode(q):
+    """Frame-to-frame differences, wrapping in q's unsigned dtype (cumsum in the same dtype decodes)."""
+    deltas = q.copy()
+    deltas[1:] = q[1:] - q[:-1]
+    return deltas
+
+
+def delta_decode(deltas):
+    return np.cumsum(deltas, axis=0, dtype=deltas.dtype)
+
+
+def build_bundle(db, pollutant: str = 'auto', hours: int = DEFAULT_HOURS, dtype: str = DEFAULT_DTYPE):
+    """Builds the bundle for the `hours` hourly frames ending at the newest observation; None if no data."""
+    column = POLLUTANTS[pollutant]
+    anchor = db.execute(text("SELECT date_trunc('hour', MAX(time), 'UTC') FROM air_quality_data;")).scalar()
+    if anchor is None:
+        return None
+    rows = db.execute(_observations_sql(column), {"anchor": anchor + timedelta(hours=1), "hours": hours}).all()
+    if not rows:
+        return None
+    hour, lat, lon, value = (np.array(col, dtype=float) for col in zip(*rows))
+
+    first = anchor.timestamp() - (hours - 1) * 3600
+    frame_index = np.round((hour - first) / 3600).astype(np.int64)
+    cells, cell_index, counts = np.unique(np.column_stack([lat, lon]), axis=0, return_inverse=True, return_counts=True)
+    cell_index = cell_index.ravel()
+    if len(cells) > MAX_CELLS:
+        keep = np.sort(np.argsort(counts, kind="stable")[::-1][:MAX_CELLS])
+        remap = np.full(len(cells), -1)
+        remap[keep] = np.arange(len(keep))
+        cells, cell_index = cells[keep], remap[cell_index]
+    valid = (cell_index >= 0) & (frame_index >= 0) & (frame_index < hours)
+
+    matrix = np.full((hours, len(cells)), np.nan)
+    matrix[frame_index[valid], cell_index[valid]] = value[valid]
+    matrix = fill_gaps(matrix)
+
+    q, offset, scale, nodata = quantize(matrix, dtype)
+    payload = zlib.compress(delta_encode(q).astype(q.dtype.newbyteorder('<')).tobytes(), 9)
+    return {
+        "pollutant": pollutant,
+        "anchor": anchor.isoformat(),
+        "frames": [(anchor - timedelta(hours=hours - 1 - i)).isoformat() for i in range(hours)],
+        "cells": {"lat": cells[:, 0].round(4).tolist(), "lon": cells[:, 1].round(4).tolist()},
+        "encoding": {"dtype": dtype, "offset": offset, "scale": scale, "nodata": nodata,
+                     "delta": True, "compression": "deflate", "layout": "frames x cells, little-endian"},
+        "data": base64.b64encode(payload).decode("ascii"),
+    }
+
+
+def decode_bundle(bundle) -> np.ndarray:
+    """frames x cells float matrix (NaN = no value); the Python twin of the client decoder."""
+    encoding = bundle["encoding"]
+    np_dtype = np.dtype(DTYPES[encoding["dtype"]]).newbyteorder('<')
+    shape = (len(bundle["frames"]), len(bundle["cells"]["lat"]))
+    q = delta_decode(np.frombuffer(zlib.decompress(base64.b64decode(bundle["data"])), dtype=np_dtype).reshape(shape))
+    values = encoding["offset"] + q.astype(float) * encoding["scale"]
+    values[q == encoding["nodata"]] = np.nan
+    return values
+
+
+_store_bundle_sql = text("""
+    INSERT INTO frame_bundles (pollutant, hours, anchor, built_at, bundle)
+    VALUES (:pollutant, :hours, :anchor, NOW(), CAST(:bundle AS JSONB))
+    ON CONFLICT (pollutant, hours) DO UPDATE SET
+        anchor = EXCLUDED.anchor, built_at = EXCLUDED.built_at, bundle = EXCLUDED.bundle;
+""")
+
+def store_bundle(db, bundle: dict, hours: int):
+    db.execute(_store_bundle_sql, {"pollutant": bundle["pollutant"], "hours": hours,
+                                   "anchor": bundle["anchor"], "bundle": json.dumps(bundle)})
+
+
+def get_bundle(db, pollutant: str = 'auto', hours: int = DEFAULT_HOURS):
+    """(bundle, built_at) from the table, building and storing it first if missing."""
+    row = db.execute(text("SELECT bundle, built_at FROM frame_bundles WHERE pollutant = :p AND hours = :h;"),
+                     {"p": pollutant, "h": hours}).first()
+    if row:
+        return row[0], row[1]
+    bundle = build_bundle(db, pollutant, hours)
+    if bundle is None:
+        return None, None
+    store_bundle(db, bundle, hours)
+    db.commit()
+    return get_bundle(db, pollutant, hours)
+
+
+def rebuild_stale_bundles(db) -> int:
+    """
+    Rebuilds every stored bundle (and the default-window ones) if an
+    ingestion run has written rows since it was built. Returns the number rebuilt.
+    """
+    last_ingest = db.execute(text("""
+        SELECT MAX(finished_at) FROM ingestion_runs
+        WHERE status = 'ok' AND rows_written > 0 AND source NOT IN ('frame_bundles', 'rollups', 'fusion', 'alerts', 'exposure');
+    """)).scalar()
+    built = dict(((p, h), b) for p, h, b in db.execute(text(
+        "SELECT pollutant, hours, built_at FROM frame_bundles;")).all())
+    wanted = set(built) | {(p, DEFAULT_HOURS) for p in POLLUTANTS}
+
+    rebuilt = 0
+    for pollutant, hours in sorted(wanted):
+        built_at = built.get((pollutant, hours))
+        if built_at is not None and (last_ingest is None or built_at >= last_ingest):
+            continue
+        bundle = build_bundle(db, pollutant, hours)
+        if bundle is not None:
+            store_bundle(db, bundle, hours)
+            rebuilt += 1
+    return rebuilt
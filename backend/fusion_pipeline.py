@@ -0,0 +1,253 @@
+# /backend/fusion_pipeline.py
+"""
+Hourly fused NO2 surface from TEMPO and ground stations, one COG per hour.
+
+TEMPO measures the NO2 column (molecules/cm²) and ground stations measure
+surface concentration, so the two can't be mixed as they are. For each hour:
+
+1. TEMPO cells of the hour are binned onto a regular FUSION_STEP_DEG grid
+   over FUSION_BBOX (analytics_store.bin_to_grid).
+2. Each station's grid cell is paired with its reading. A linear fit
+   surface = a + b * column over those co-located pairs converts the
+   satellite grid to surface units (bias correction).
+3. The station residuals against the corrected grid are interpolated with
+   IDW (interpolation_engine) and added back, so the surface matches the
+   stations where there are stations and follows the satellite pattern
+   between them.
+4. Where TEMPO has no data, the surface is plain IDW of the stations.
+
+The grid is written in EPSG:4326 and reprojected to a Web-Mercator COG
+with the helpers in new.py. Hours run in parallel in a process pool; each
+worker opens its own database session, so only hour timestamps cross
+process boundaries. FUSED_DIR/index.json lists the available hours with
+their calibration and colour range for the tile endpoint.
+
+    python fusion_pipeline.py --hours 24
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+import multiprocessing
+import numpy as np
+from sqlalchemy import text
+
+# --- CONFIGURATION ---
+FUSED_DIR = os.getenv("FUSED_DIR", "fused_output")
+INDEX_PATH = os.path.join(FUSED_DIR, "index.json")
+FUSION_BBOX = tuple(float(v) for v in os.getenv("FUSION_BBOX", "14,-141,64,-41").split(","))  # TEMPO field of regard
+FUSION_STEP_DEG = float(os.getenv("FUSION_STEP_DEG", "0.1"))
+TEMPO_LEVEL = 4              # ~0.1° cells; level 1 is finer than the fusion grid
+GROUND_POLLUTANT = 'no2'
+MIN_COLOCATED = 10           # fewer pairs than this fall back to a ratio of means
+KEEP_HOURS = 72              # older COGs are deleted
+MAX_WORKERS = int(os.getenv("FUSION_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+
+def _ground_source_filter() -> str:
+    """SQL excluding sources whose pollutant columns are not concentrations (sub-indices, satellite)."""
+    import aqi_calculator
+    prefixes = [prefix for prefix, profile in aqi_calculator.SOURCE_PROFILES
+                if profile is None or profile.get('mode') == 'sub_index']
+    return " AND ".join(f"source NOT LIKE '{prefix}%'" for prefix in prefixes) or "TRUE"
+
+_tempo_hour_sql = text("""
+    SELECT latitude, longitude, no2_tropospheric
+    FROM tempo_grid_data
+    WHERE resolution_level = :level AND no2_tropospheric IS NOT NULL
+      AND time >= :hour AND time < CAST(:hour AS TIMESTAMPTZ) + INTERVAL '1 hour';
+""")
+
+def _ground_hour_sql():
+    return text(f"""
+        SELECT DISTINCT ON (latitude, longitude) latitude, longitude, {GROUND_POLLUTANT}
+        FROM air_quality_data
+        WHERE {GROUND_POLLUTANT} IS NOT NULL AND {_ground_source_filter()}
+          AND time >= :hour AND time < CAST(:hour AS TIMESTAMPTZ) + INTERVAL '1 hour'
+        ORDER BY latitude, longitude, time DESC;
+    """)
+
+
+def load_hour(db, hour: datetime):
+    """(tempo, ground) arrays of (lat, lon, value) for one hour."""
+    def columns(rows):
+        return tuple(np.array(col, dtype=float) for col in zip(*rows)) if rows else (np.empty(0),) * 3
+    tempo = columns(db.execute(_tempo_hour_sql, {"hour": hour, "level": TEMPO_LEVEL}).all())
+    ground = columns(db.execute(_ground_hour_sql(), {"hour": hour}).all())
+    return tempo, ground
+
+
+# --- Fusion ---
+
+def fit_bias(column, surface):
+    """(intercept, slope, pairs) mapping satellite column to surface values; None if there is nothing to fit."""
+    pairs = int(len(column))
+    if pairs >= MIN_COLOCATED and np.ptp(column) > 0:
+        slope, intercept = np.polyfit(column, surface, 1)
+        if slope > 0:
+            return float(intercept), float(slope), pairs
+    if pairs and column.mean() > 0:
+        return 0.0, float(surface.mean() / column.mean()), pairs
+    return None
+
+def fuse(tempo, ground, bbox=FUSION_BBOX, step: float = FUSION_STEP_DEG):
+    """
+    Fused surface grid (lat ascending x lon ascending, NaN = no estimate)
+    and a summary of how it was made.
+    """
+    from analytics_store import bin_to_grid, cube_axes
+    from interpolation_engine import SpatialField
+
+    lats, lons = cube_axes(bbox, step)
+    satellite = bin_to_grid(*tempo, bbox=bbox, step=step).astype(float)
+    g_lat, g_lon, g_value = ground
+    cell_lat, cell_lon = (a.ravel() for a in np.meshgrid(lats, lons, indexing='ij'))
+    summary = {"stations": int(len(g_value)), "satellite_cells": int(np.isfinite(satellite).sum()), "calibration": None}
+
+    # Satellite value in each station's cell
+    rows = np.floor((g_lat - bbox[0]) / step).astype(np.int64)
+    cols = np.floor((g_lon - bbox[1]) / step).astype(np.int64)
+    inside = (rows >= 0) & (rows < len(lats)) & (cols >= 0) & (cols < len(lons))
+    at_station = np.full(len(g_value), np.nan)
+    at_station[inside] = satellite[rows[inside], cols[inside]]
+    colocated = np.isfinite(at_station)
+
+    fused = np.full(satellite.shape, np.nan)
+    calibration = fit_bias(at_station[colocated], g_value[colocated])
+    if calibration is not None:
+        intercept, slope, pairs = calibration
+        summary["calibration"] = {"intercept": intercept, "slope": slope, "pairs": pairs}
+        corrected = intercept + slope * satellite
+        residual = g_value[colocated] - (intercept + slope * at_station[colocated])
+        has_satellite = np.isfinite(corrected).ravel()
+        correction = SpatialField('residual', g_lat[colocated], g_lon[colocated], residual).estimate(
+            cell_lat[has_satellite], cell_lon[has_satellite])['estimate']
+        fused.ravel()[has_satellite] = corrected.ravel()[has_satellite] + np.nan_to_num(correction)
+
+    # Plain station interpolation wherever the satellite saw nothing
+    missing = np.isnan(fused).ravel()
+    if len(g_value) and missing.any():
+        fused.ravel()[missing] = SpatialField(GROUND_POLLUTANT, g_lat, g_lon, g_value).estimate(
+            cell_lat[missing], cell_lon[missing])['estimate']
+    np.clip(fused, 0.0, None, out=fused)
+    return fused.astype(np.float32), summary
+
+
+def hour_path(hour: datetime) -> str:
+    return os.path.join(FUSED_DIR, f"fused_{GROUND_POLLUTANT}_{hour:%Y%m%dT%H}_3857_cog.tif")
+
+def write_fused_cog(grid, path: str, bbox=FUSION_BBOX, step: float = FUSION_STEP_DEG):
+    """Writes a lat-ascending EPSG:4326 grid as a Web-Mercator COG; the file appears atomically."""
+    import rasterio
+    from rasterio.transform import from_origin
+    from new import reproject_to_3857, create_cog
+
+    tmp_4326, tmp_3857, tmp_cog = (f"{path}.{suffix}.tmp" for suffix in ("4326", "3857", "cog"))
+    profile = {
+        'driver': 'GTiff', 'dtype': 'float32', 'count': 1,
+        'height': grid.shape[0], 'width': grid.shape[1],
+        'crs': 'EPSG:4326', 'transform': from_origin(bbox[1], bbox[2], step, step), 'nodata': np.nan
+    }
+    try:
+        with rasterio.open(tmp_4326, 'w', **profile) as dst:
+            dst.write(grid[::-1], 1)   # north-up
+            dst.update_tags(variable=GROUND_POLLUTANT)
+        reproject_to_3857(tmp_4326, tmp_3857)
+        create_cog(tmp_3857, tmp_cog)
+        os.replace(tmp_cog, path)
+    finally:
+        for tmp in (tmp_4326, tmp_3857, tmp_cog):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return path
+
+def process_hour(hour: datetime):
+    """Worker: loads, fuses and writes one hour. Returns its index entry, or None without data."""
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        tempo, ground = load_hour(db, hour)
+    finally:
+        db.close()
+    if not len(tempo[2]) and not len(ground[2]):
+        return None
+    grid, summary = fuse(tempo, ground)
+    finite = grid[np.isfinite(grid)]
+    if not finite.size:
+        return None
+    path = write_fused_cog(grid, hour_path(hour))
+    return {"hour": hour.isoformat(), "path": path, **summary,
+            "vmin": float(np.percentile(finite, 2)), "vmax": float(np.percentile(finite, 98))}
+
+
+# --- Index ---
+
+def read_index() -> dict:
+    if not os.path.exists(INDEX_PATH):
+        return {"variable": GROUND_POLLUTANT, "hours": {}}
+    with open(INDEX_PATH) as f:
+        return json.load(f)
+
+def _write_index(index: dict):
+    tmp = INDEX_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, INDEX_PATH)
+
+def latest_hour(index: dict = None):
+    hours = (index or read_index())["hours"]
+    return hours[max(hours)] if hours else None
+
+
+def pending_hours(db, lookback_hours: int, rebuild: bool = False) -> list:
+    """Hours in the lookback with TEMPO data and no COG yet (the current, still-filling hour is always redone)."""
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    rows = db.execute(text("""
+        SELECT DISTINCT date_trunc('hour', time, 'UTC') FROM tempo_grid_data
+        WHERE resolution_level = :level AND time >= :since;
+    """), {"level": TEMPO_LEVEL, "since": now - timedelta(hours=lookback_hours)}).scalars().all()
+    return sorted(hour for hour in rows if rebuild or hour >= now or not os.path.exists(hour_path(hour)))
+
+def run(lookback_hours: int = 24, workers: int = MAX_WORKERS, rebuild: bool = False) -> int:
+    """Fuses every pending hour in the lookback in a process pool. Returns the number of hours written."""
+    from database import SessionLocal
+    os.makedirs(FUSED_DIR, exist_ok=True)
+    db = SessionLocal()
+    try:
+        hours = pending_hours(db, lookback_hours, rebuild)
+    finally:
+        db.close()
+    if not hours:
+        return 0
+
+    print(f"Fusing {len(hours)} hour(s) with {min(workers, len(hours))} worker(s)...")
+    index, written = read_index(), 0
+    # spawn: workers must not inherit the parent's database connections
+    with ProcessPoolExecutor(max_workers=min(workers, len(hours)),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        for hour, entry in zip(hours, pool.map(process_hour, hours)):
+            if entry is None:
+                print(f"  {hour:%Y-%m-%d %H}:00 no data")
+                continue
+            index["hours"][entry["hour"]] = entry
+            written += 1
+            print(f"  ✅ {hour:%Y-%m-%d %H}:00 -> {entry['path']}")
+
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=KEEP_HOURS)).isoformat()
+    for key in [key for key in index["hours"] if key < cutoff]:
+        expired = index["hours"].pop(key)
+        if os.path.exists(expired["path"]):
+            os.remove(expired["path"])
+    _write_index(index)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build hourly fused TEMPO + ground NO2 COGs.")
+    parser.add_argument("--hours", type=int, default=24, help="How many past hours to consider.")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild hours that already have a COG.")
+    args = parser.parse_args()
+    written = run(args.hours, args.workers, args.rebuild)
+    print(f"✅ {written} fused hour(s) written to {FUSED_DIR}")
@@ -0,0 +1,266 @@
+# /backend/geocoder.py
+"""
+Reverse and forward geocoding with a local gazetteer and a persistent cache.
+
+Lookups go, in order, through:
+
+1. a per-process LRU (microseconds; keyed like the persistent cache),
+2. the offline gazetteer: a GeoNames cities dump (cities500/1000/5000/15000.txt)
+   with a cKDTree over its places, answering reverse lookups within
+   GAZETTEER_MAX_KM and forward lookups of a known place name,
+3. the `geocode_cache` table, shared by every worker and kept across restarts,
+4. MapTiler, whose answer is then written to the cache.
+
+Reverse keys are coordinates quantized to REVERSE_STEP_DEG, so clicks a few
+metres apart share an entry. Forward keys are the query normalized
+(Unicode NFKC, case-folded, punctuation and repeated whitespace removed).
+
+GEOCODER_MODE=online puts the cache and MapTiler before the gazetteer (street-
+level names when a key is configured); the gazetteer then only answers when
+MapTiler is unavailable. The gazetteer is loaded lazily as the "gazetteer"
+subsystem and is simply skipped if GAZETTEER_PATH does not exist.
+"""
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import quote
+import numpy as np
+import requests
+from sqlalchemy import text
+
+# --- CONFIGURATION ---
+GEOCODER_MODE = os.getenv("GEOCODER_MODE", "offline")        # offline: gazetteer first; online: MapTiler first
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join("data", "cities15000.txt"))
+ADMIN1_PATH = os.getenv("GAZETTEER_ADMIN1_PATH", os.path.join("data", "admin1CodesASCII.txt"))
+GAZETTEER_MAX_KM = 25.0
+REVERSE_STEP_DEG = 0.001                                         # ~100 m
+CACHE_TTL_DAYS = 30
+MEMORY_CACHE_SIZE = 10_000
+MAPTILER_TIMEOUT_S = 10
+
+CREATE_GEOCODE_CACHE_SQL = """
+    CREATE TABLE IF NOT EXISTS geocode_cache (
+        kind VARCHAR(10) NOT NULL CHECK (kind IN ('reverse', 'forward')),
+        key TEXT NOT NULL,
+        result JSONB NOT NULL,
+        provider VARCHAR(20) NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (kind, key)
+    );
+"""
+
+# GeoNames "geoname" table columns used here (the dump is tab-separated, no header)
+GEONAMES_COLUMNS = {0: "geonameid", 1: "name", 2: "asciiname", 4: "latitude", 5: "longitude",
+                    8: "country_code", 10: "admin1_code", 14: "population"}
+
+
+# --- Keys ---
+
+def reverse_key(lat: float, lon: float) -> str:
+    return f"{round(lat / REVERSE_STEP_DEG) * REVERSE_STEP_DEG:.3f},{round(lon / REVERSE_STEP_DEG) * REVERSE_STEP_DEG:.3f}"
+
+def normalize_query(query: str) -> str:
+    """'  New  Delhi, India! ' -> 'new delhi india'."""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = re.sub(r"[^\w\s]", " ", query)
+    return " ".join(query.split())
+
+
+class _LRU:
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                return self.items[key]
+        return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+_memory = _LRU(MEMORY_CACHE_SIZE)
+
+
+# --- Gazetteer ---
+
+class Gazetteer:
+    """GeoNames places in a cKDTree (reverse) and a normalized-name index (forward)."""
+
+    def __init__(self, path: str = GAZETTEER_PATH, admin1_path: str = ADMIN1_PATH):
+        import pandas as pd
+        from scipy.spatial import cKDTree
+        from grid_utils import to_xyz
+
+        places = pd.read_csv(path, sep="\t", header=None, usecols=list(GEONAMES_COLUMNS), quoting=3,
+                             dtype={8: str, 10: str}, keep_default_na=False, low_memory=False)
+        places.columns = [GEONAMES_COLUMNS[c] for c in places.columns]
+        admin1 = {}
+        if admin1_path and os.path.exists(admin1_path):
+            codes = pd.read_csv(admin1_path, sep="\t", header=None, usecols=[0, 1], quoting=3,
+                                dtype=str, keep_default_na=False)
+            admin1 = dict(zip(codes[0], codes[1]))
+
+        self.latitude = places["latitude"].to_numpy(dtype=float)
+        self.longitude = places["longitude"].to_numpy(dtype=float)
+        self.labels = [
+            ", ".join(part for part in (name, admin1.get(f"{cc}.{a1}"), cc) if part)
+            for name, cc, a1 in zip(places["name"], places["country_code"], places["admin1_code"])
+        ]
+        self.tree = cKDTree(to_xyz(self.latitude, self.longitude))
+        self._to_xyz = to_xyz
+
+        # Forward index: normalized name -> most populous place with that name
+        population = places["population"].to_numpy(dtype=float)
+        self.by_name = {}
+        for i in np.argsort(population, kind="stable"):
+            for name in (places["name"].iat[i], places["asciiname"].iat[i]):
+                self.by_name[normalize_query(name)] = i
+            self.by_name[normalize_query(self.labels[i])] = i
+
+    def __len__(self):
+        return len(self.labels)
+
+    def reverse(self, lat, lon, max_km: float = GAZETTEER_MAX_KM):
+        """Label of the nearest place to each point (None beyond max_km); vectorized over arrays."""
+        distances, indices = self.tree.query(self._to_xyz(np.atleast_1d(lat), np.atleast_1d(lon)),
+                                             distance_upper_bound=max_km)
+        return [self.labels[i] if np.isfinite(d) else None for d, i in zip(distances, indices)]
+
+    def forward(self, query: str):
+        i = self.by_name.get(normalize_query(query))
+        if i is None:
+            return None
+        return {"lat": float(self.latitude[i]), "lon": float(self.longitude[i]), "name": self.labels[i]}
+
+
+def _gazetteer():
+    """The loaded gazetteer, or None if there is no dump to load."""
+    if not os.path.exists(GAZETTEER_PATH):
+        return None
+    import subsystems
+    try:
+        return subsystems.get("gazetteer")
+    except Exception as e:
+        print(f"❌ Gazetteer unavailable: {e}")
+        return None
+
+
+# --- Persistent Cache ---
+
+_cache_get_sql = text(f"""
+    SELECT result FROM geocode_cache
+    WHERE kind = :kind AND key = :key AND created_at > NOW() - INTERVAL '{CACHE_TTL_DAYS} days';
+""")
+_cache_put_sql = text("""
+    INSERT INTO geocode_cache (kind, key, result, provider, created_at)
+    VALUES (:kind, :key, CAST(:result AS JSONB), :provider, NOW())
+    ON CONFLICT (kind, key) DO UPDATE SET
+        result = EXCLUDED.result, provider = EXCLUDED.provider, created_at = EXCLUDED.created_at;
+""")
+
+def _cache_get(db, kind, key):
+    try:
+        return db.execute(_cache_get_sql, {"kind": kind, "key": key}).scalar()
+    except Exception as e:
+        db.rollback()
+        print(f"Geocode cache read failed: {e}")
+        return None
+
+def _cache_put(db, kind, key, result, provider):
+    try:
+        db.execute(_cache_put_sql, {"kind": kind, "key": key, "result": json.dumps(result), "provider": provider})
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Geocode cache write failed: {e}")
+
+
+# --- MapTiler ---
+
+def _maptiler(path: str):
+    api_key = os.getenv("MAPTILER_API_KEY")
+    if not api_key:
+        return None
+    base_url = os.getenv("MAPTILER_API_URL", "https://api.maptiler.com")
+    response = requests.get(f"{base_url}/geocoding/{path}.json?key={api_key}", timeout=MAPTILER_TIMEOUT_S)
+    response.raise_for_status()
+    return response.json().get("features") or []
+
+
+# --- Lookups ---
+
+def _lookup(db, kind, key, offline, online):
+    """Runs the lookup chain; `offline`/`online` are callables returning a result dict or None."""
+    memory_key = (kind, key)
+    cached = _memory.get(memory_key)
+    if cached is not None:
+        return cached
+
+    def from_cache_or_online():
+        result = _cache_get(db, kind, key)
+        if result is not None:
+            return result
+        try:
+            result = online()
+        except Exception as e:
+            print(f"MapTiler {kind} geocoding failed: {e}")
+            return None
+        if result is not None:
+            _cache_put(db, kind, key, result, "maptiler")
+        return result
+
+    steps = (offline, from_cache_or_online) if GEOCODER_MODE == "offline" else (from_cache_or_online, offline)
+    for step in steps:
+        result = step()
+        if result is not None:
+            _memory.put(memory_key, result)
+            return result
+    return None
+
+def reverse_geocode(db, lat: float, lon: float):
+    """{"name", "source"} for a point, or None if nothing knows it."""
+    key = reverse_key(lat, lon)
+
+    def offline():
+        gazetteer = _gazetteer()
+        name = gazetteer.reverse(lat, lon)[0] if gazetteer else None
+        return {"name": name, "source": "gazetteer"} if name else None
+
+    def online():
+        features = _maptiler(f"{lon},{lat}")
+        if features is None:
+            return None
+        return {"name": features[0]["place_name"] if features else "Unknown Location", "source": "maptiler"}
+
+    return _lookup(db, "reverse", key, offline, online)
+
+def forward_geocode(db, query: str):
+    """{"lat", "lon", "name", "source"} for a place name, or None."""
+    key = normalize_query(query)
+    if not key:
+        return None
+
+    def offline():
+        gazetteer = _gazetteer()
+        place = gazetteer.forward(key) if gazetteer else None
+        return {**place, "source": "gazetteer"} if place else None
+
+    def online():
+        features = _maptiler(quote(query))
+        if not features:
+            return None
+        lon, lat = features[0]["center"]   # [longitude, latitude]
+        return {"lat": lat, "lon": lon, "name": features[0].get("place_name"), "source": "maptiler"}
+
+    return _lookup(db, "forward", key, offline, online)
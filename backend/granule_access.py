@@ -0,0 +1,271 @@
+# /backend/granule_access.py
+"""
+Lazy, windowed access to satellite granules (TEMPO NetCDF4, AIRS HDF-EOS5).
+
+Opening a granule reads only its metadata. Variables are read in
+fixed-size blocks of scanlines (chunks) and only the chunks that overlap
+the requested window are decoded — masked values become NaN and, for
+NetCDF, scale/offset are applied. Decoded chunks live in one LRU cache per
+process, bounded in bytes, so tiles, ingest and regridding that touch the
+same region of a granule share the work and no caller needs the whole
+granule in memory.
+
+    with open_granule(path) as granule:
+        no2 = granule.variable('product', 'vertical_column_troposphere')
+        block = no2[1000:1200, :]                  # reads 1-2 chunks
+        for rows, block in no2.iter_row_blocks(256):
+            ...
+
+Variables also behave enough like arrays (shape, dtype, ndim, slicing)
+to be wrapped with dask.array.from_array when dask is installed; see
+`as_dask`.
+"""
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# --- CONFIGURATION ---
+CHUNK_ROWS = int(os.getenv("GRANULE_CHUNK_ROWS", "256"))                   # scanlines per chunk
+CACHE_BYTES = int(os.getenv("GRANULE_CACHE_MB", "256")) * 1024 * 1024       # per process
+
+
+class ChunkCache:
+    """Thread-safe LRU of decoded chunks, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int = CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value: np.ndarray):
+        if value.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = value
+            self._bytes += value.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {"entries": len(self._items), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+
+chunk_cache = ChunkCache()
+
+
+class LazyVariable:
+    """A granule variable read chunk by chunk along its first (scanline) axis."""
+
+    def __init__(self, granule, group, name, source):
+        self.granule = granule
+        self.group = group
+        self.name = name
+        self._source = source
+        self.shape = tuple(source.shape)
+        self.ndim = len(self.shape)
+        self.dtype = np.dtype(float)
+        self.attrs = self.granule._attributes(source)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _chunk(self, index: int) -> np.ndarray:
+        key = (self.granule.cache_key, self.group, self.name, index)
+        chunk = chunk_cache.get(key)
+        if chunk is None:
+            start = index * CHUNK_ROWS
+            stop = min(start + CHUNK_ROWS, self.shape[0])
+            with self.granule.lock:
+                chunk = self.granule._decode(self._source, slice(start, stop))
+            chunk_cache.put(key, chunk)
+        return chunk
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        rows = key[0]
+        rest = key[1:]
+        if isinstance(rows, (int, np.integer)):
+            rows = int(rows) % self.shape[0]
+            return self._chunk(rows // CHUNK_ROWS)[(rows % CHUNK_ROWS,) + rest]
+        if not isinstance(rows, slice):
+            raise TypeError("LazyVariable supports integer or slice indexing on the first axis")
+
+        start, stop, step = rows.indices(self.shape[0])
+        if start >= stop:
+            return np.empty((0,) + self.shape[1:])[(slice(None),) + rest]
+        parts = []
+        for index in range(start // CHUNK_ROWS, (stop - 1) // CHUNK_ROWS + 1):
+            chunk_start = index * CHUNK_ROWS
+            lo, hi = max(start, chunk_start), min(stop, chunk_start + CHUNK_ROWS)
+            parts.append(self._chunk(index)[lo - chunk_start:hi - chunk_start])
+        data = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        return data[(slice(None, None, step),) + rest]
+
+    def read(self, window=None) -> np.ndarray:
+        """window: (row_slice, col_slice) or None for the whole variable."""
+        if window is None:
+            return self[:]
+        return self[tuple(window)]
+
+    def iter_row_blocks(self, rows_per_block: int = CHUNK_ROWS):
+        """Yields (row_slice, block) pairs covering the variable."""
+        for start in range(0, self.shape[0], rows_per_block):
+            rows = slice(start, min(start + rows_per_block, self.shape[0]))
+            yield rows, self[rows]
+
+
+class Granule:
+    """Base class; use open_granule() to get the right backend for a file."""
+
+    def __init__(self, path):
+        self.path = path
+        stat = os.stat(path)
+        # mtime/size in the key so a rewritten file never serves stale chunks
+        self.cache_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        self.lock = threading.Lock()
+        self._variables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def variable(self, group, name) -> LazyVariable:
+        key = (group, name)
+        if key not in self._variables:
+            self._variables[key] = LazyVariable(self, group, name, self._source(group, name))
+        return self._variables[key]
+
+    def has(self, group, name) -> bool:
+        try:
+            self._source(group, name)
+            return True
+        except KeyError:
+            return False
+
+    def window_for_bbox(self, lat, lon, bbox, rows_per_block: int = CHUNK_ROWS):
+        """
+        (row_slice, col_slice) covering every pixel inside
+        bbox=(lat_min, lon_min, lat_max, lon_max), found by streaming the
+        geolocation variables block by block; None if nothing falls inside.
+        """
+        lat_min, lon_min, lat_max, lon_max = bbox
+        row_hits, col_hits = [], []
+        for rows, lat_block in lat.iter_row_blocks(rows_per_block):
+            lon_block = lon[rows]
+            inside = (lat_block >= lat_min) & (lat_block <= lat_max) & (lon_block >= lon_min) & (lon_block <= lon_max)
+            if inside.any():
+                r, c = np.nonzero(inside)
+                row_hits += [rows.start + r.min(), rows.start + r.max()]
+                col_hits += [c.min(), c.max()]
+        if not row_hits:
+            return None
+        return slice(int(min(row_hits)), int(max(row_hits)) + 1), slice(int(min(col_hits)), int(max(col_hits)) + 1)
+
+
+class NetCDFGranule(Granule):
+    """TEMPO-style NetCDF4 with groups; masked values -> NaN, scale/offset applied."""
+
+    def __init__(self, path):
+        import netCDF4
+        super().__init__(path)
+        self._netCDF4 = netCDF4
+        self._ds = netCDF4.Dataset(path, "r")
+        self._ds.set_auto_maskandscale(True)
+
+    def _source(self, group, name):
+        node = self._ds
+        for part in (group or "").strip("/").split("/"):
+            if part:
+                if part not in node.groups:
+                    raise KeyError(group)
+                node = node.groups[part]
+        if name not in node.variables:
+            raise KeyError(name)
+        return node.variables[name]
+
+    def _attributes(self, source):
+        return {attr: source.getncattr(attr) for attr in source.ncattrs()}
+
+    def _decode(self, source, rows):
+        data = source[rows]
+        return np.ma.filled(np.ma.asarray(data).astype(float), np.nan)
+
+    def read_times(self, group, name) -> np.ndarray:
+        """A CF time variable as datetime64[us] (small, so read whole and uncached)."""
+        source = self._source(group, name)
+        with self.lock:
+            values = np.ma.filled(np.ma.asarray(source[:]).astype(float), np.nan)
+        dates = self._netCDF4.num2date(values, source.units, getattr(source, "calendar", "standard"),
+                                       only_use_cftime_datetimes=False, only_use_python_datetimes=True)
+        return np.array(dates, dtype="datetime64[us]")
+
+    def close(self):
+        self._ds.close()
+
+
+class HDF5Granule(Granule):
+    """AIRS-style HDF-EOS5; `group` is the HDF5 path. Fill values -> NaN, no scaling."""
+
+    def __init__(self, path):
+        import h5py
+        super().__init__(path)
+        self._file = h5py.File(path, "r")
+
+    def _source(self, group, name):
+        path = f"{group.rstrip('/')}/{name}" if group else name
+        if path not in self._file:
+            raise KeyError(path)
+        return self._file[path]
+
+    def _attributes(self, source):
+        return {key: (value[0] if np.ndim(value) == 1 and len(value) == 1 else value)
+                for key, value in source.attrs.items()}
+
+    def _decode(self, source, rows):
+        data = source[rows].astype(float)
+        fill = source.attrs.get("_FillValue")
+        if fill is not None:
+            data[data == np.ravel(fill)[0]] = np.nan
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def open_granule(path) -> Granule:
+    """Opens a granule lazily, choosing the NetCDF or HDF5 backend by extension."""
+    if os.path.splitext(path)[1].lower() in (".hdf", ".h5", ".he5", ".hdf5"):
+        return HDF5Granule(path)
+    return NetCDFGranule(path)
+
+
+def as_dask(variable: LazyVariable, rows_per_chunk: int = CHUNK_ROWS):
+    """Wraps a variable as a dask array (requires dask) for out-of-core pipelines."""
+    import dask.array as da
+    return da.from_array(variable, chunks=(rows_per_chunk,) + variable.shape[1:], asarray=True)
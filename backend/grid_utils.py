@@ -0,0 +1,99 @@
+# /backend/grid_utils.py
+"""
+Vectorized reductions for satellite swaths.
+
+Swath variables are 2D (scanline x pixel) arrays. Downsampling by a
+factor f groups them into f x f blocks and reduces each block to one
+value — averaging the valid pixels instead of keeping every f-th one, so
+plumes narrower than a block are not aliased away. Edges that do not fill
+a whole block are padded with NaN and reduced over the pixels they have.
+
+`to_xyz` is the one lat/lon -> Earth-centred coordinates conversion that
+the KD-tree lookups (interpolation, alerts, gazetteer) share.
+"""
+import warnings
+import numpy as np
+
+REDUCE_METHODS = ('mean', 'median', 'stride')
+EARTH_RADIUS_KM = 6371.0088      # mean radius
+
+
+def _blocks(array, factor, fill=np.nan):
+    """(H, W) -> (H/f, f, W/f, f) view-friendly array, NaN-padded up to a multiple of f."""
+    array = np.asarray(array, dtype=float)
+    h, w = array.shape
+    pad_h, pad_w = -h % factor, -w % factor
+    if pad_h or pad_w:
+        array = np.pad(array, ((0, pad_h), (0, pad_w)), constant_values=fill)
+    return array.reshape((h + pad_h) // factor, factor, (w + pad_w) // factor, factor)
+
+
+def block_reduce(array, factor: int, valid=None, method: str = 'mean'):
+    """
+    Reduces a 2D array by `factor` in both dimensions.
+
+    valid: optional boolean mask; invalid pixels are ignored. A block with
+    no valid pixels becomes NaN. method is 'mean', 'median' or 'stride'
+    (the top-left pixel of each block, i.e. the old range(0, n, f) sampling).
+    """
+    array = np.asarray(array, dtype=float)
+    if valid is not None:
+        array = np.where(valid, array, np.nan)
+    if factor <= 1:
+        return array
+    if method == 'stride':
+        return array[::factor, ::factor]
+    if method not in REDUCE_METHODS:
+        raise ValueError(f"Unknown reduction method '{method}'; expected one of {REDUCE_METHODS}")
+
+    blocks = _blocks(array, factor)
+    with warnings.catch_warnings():
+        # All-NaN blocks are expected and come back as NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if method == 'median':
+            return np.nanmedian(blocks, axis=(1, 3))
+        return np.nanmean(blocks, axis=(1, 3))
+
+
+def block_count(valid, factor: int):
+    """Number of valid pixels that went into each reduced block."""
+    valid = np.asarray(valid, dtype=bool)
+    if factor <= 1:
+        return valid.astype(np.int32)
+    return _blocks(valid.astype(float), factor, fill=0).sum(axis=(1, 3)).astype(np.int32)
+
+
+def reduce_rows(values, factor: int):
+    """Per-scanline values (e.g. scan times) -> the first value of each block of rows."""
+    return np.asarray(values)[::max(factor, 1)]
+
+
+# --- Multi-Resolution Levels ---
+# tempo_grid_data stores each granule at these block sizes (1 = native pixels).
+TEMPO_RESOLUTION_LEVELS = (1, 4, 16, 64)
+# Lowest web-map zoom at which each level is served; coarser levels cover
+# wider views so a response stays at a few thousand cells.
+LEVEL_MIN_ZOOM = {1: 9, 4: 7, 16: 5, 64: 0}
+
+def level_for_zoom(zoom) -> int:
+    """The finest stored resolution level appropriate for a map zoom (None -> coarsest)."""
+    if zoom is None:
+        return max(TEMPO_RESOLUTION_LEVELS)
+    for level in sorted(TEMPO_RESOLUTION_LEVELS):
+        if zoom >= LEVEL_MIN_ZOOM[level]:
+            return level
+    return max(TEMPO_RESOLUTION_LEVELS)
+
+
+# --- Geometry ---
+
+def to_xyz(lat, lon, radius: float = EARTH_RADIUS_KM) -> np.ndarray:
+    """
+    lat/lon degrees -> (n, 3) Earth-centred coordinates, in km by default
+    (radius=1.0 gives unit vectors). Euclidean distance between them is the
+    chord, which is monotonic in great-circle distance, so KD-trees can use it.
+    """
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return radius * np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
@@ -1,14 +1,19 @@
-import xarray as xr
 import os
 import numpy as np
-from sqlalchemy import text, inspect
+from sqlalchemy import text
 from database import engine, SessionLocal
-from tqdm import tqdm
+import schema_registry
+import bulk_writer
+import grid_utils
+import granule_access
 
 # --- CONFIGURATION ---
 FILE_NAME = "TEMPO_NO2_L2_V03_20250916T214329Z_S012G07.nc"
 FILE_PATH = os.path.join("data", FILE_NAME)
-DOWNSAMPLE_FACTOR = 10
+# 1 keeps every pixel; >1 reduces factor x factor blocks with DOWNSAMPLE_METHOD
+# ('mean', 'median', or 'stride' for the old every-Nth-pixel sampling).
+DOWNSAMPLE_FACTOR = int(os.getenv("TEMPO_DOWNSAMPLE_FACTOR", "10"))
+DOWNSAMPLE_METHOD = os.getenv("TEMPO_DOWNSAMPLE_METHOD", "mean")
 
 # This map defines the database column name and the corresponding path and variable name in the NASA file.
 # This makes the script easy to adapt for new pollutants.
@@ -21,6 +26,63 @@ VARIABLE_MAP = {
     'wind_speed': ['support_data', 'wind_speed']
 }
 
+def extract_columns(latitude, longitude, time_data, extracted, factor=DOWNSAMPLE_FACTOR, method=DOWNSAMPLE_METHOD):
+    """
+    Builds the output columns for every valid pixel (or block) of one block
+    of scanlines at once.
+
+    A pixel is valid when its quality flag is 0 and none of the discovered
+    variables is NaN. With factor > 1 each factor x factor block is reduced
+    over its valid pixels (see grid_utils.block_reduce); blocks without any
+    valid pixel are dropped. Returns {column: 1D array}.
+    """
+    valid = np.isfinite(latitude) & np.isfinite(longitude)
+    for data_array in extracted.values():
+        valid &= ~np.isnan(data_array)
+    if 'quality_flag' in extracted:
+        valid &= extracted['quality_flag'] == 0
+
+    if factor > 1:
+        # Only valid pixels go into a block, so a reduced block is valid if
+        # any of its pixels was; its quality flag is therefore 0.
+        latitude = grid_utils.block_reduce(latitude, factor, valid, method)
+        longitude = grid_utils.block_reduce(longitude, factor, valid, method)
+        extracted = {col: grid_utils.block_reduce(data_array, factor, valid, method)
+                     for col, data_array in extracted.items()}
+        time_data = grid_utils.reduce_rows(time_data, factor)
+        valid = grid_utils.block_count(valid, factor) > 0
+        if method == 'stride':
+            valid = ~np.isnan(latitude)
+
+    rows, cols = np.nonzero(valid)
+    columns = {
+        "time": time_data[rows],
+        "latitude": latitude[rows, cols],
+        "longitude": longitude[rows, cols],
+    }
+    for col, data_array in extracted.items():
+        values = data_array[rows, cols]
+        columns[col] = values.astype(np.int64) if "flag" in col else values
+    return columns
+
+def iter_column_batches(granule, found_variables, factor=DOWNSAMPLE_FACTOR, method=DOWNSAMPLE_METHOD):
+    """
+    Streams the granule in blocks of scanlines (a multiple of `factor`, so
+    reduction blocks never straddle two batches) and yields the columns of
+    each. Only one batch of every variable is in memory at a time.
+    """
+    latitude = granule.variable('geolocation', 'latitude')
+    longitude = granule.variable('geolocation', 'longitude')
+    time_data = granule.read_times('geolocation', 'time')
+    variables = {db_col: granule.variable(group, nasa_var) for db_col, (group, nasa_var) in found_variables.items()}
+
+    step = max(factor, 1)
+    rows_per_batch = -(-granule_access.CHUNK_ROWS // step) * step
+    for start in range(0, latitude.shape[0], rows_per_batch):
+        rows = slice(start, min(start + rows_per_batch, latitude.shape[0]))
+        yield extract_columns(latitude[rows], longitude[rows], time_data[rows],
+                              {col: var[rows] for col, var in variables.items()}, factor, method)
+
 def intelligent_ingestor():
     if not os.path.exists(FILE_PATH):
         print(f"Error: Data file not found at {FILE_PATH}")
@@ -28,26 +90,21 @@ def intelligent_ingestor():
 
     print(f"--- Starting Intelligent Ingestion for {FILE_NAME} ---")
     
-    datasets = {}
+    granule = None
     db = None
     try:
         # --- STAGE 1: INSPECT FILE AND DATABASE ---
         print("\n[Stage 1/3] Inspecting file and database schema...")
         
-        datasets = {
-            'geolocation': xr.open_dataset(FILE_PATH, group='geolocation'),
-            'product': xr.open_dataset(FILE_PATH, group='product'),
-            'support_data': xr.open_dataset(FILE_PATH, group='support_data')
-        }
+        granule = granule_access.open_granule(FILE_PATH)
 
         found_variables = {}
         for db_col, (group, nasa_var) in VARIABLE_MAP.items():
-            if nasa_var in datasets[group]:
+            if granule.has(group, nasa_var):
                 found_variables[db_col] = (group, nasa_var)
         print(f"Found variables in file: {list(found_variables.keys())}")
         
-        inspector = inspect(engine)
-        db_columns = [col['name'] for col in inspector.get_columns('air_quality_data')]
+        db_columns = schema_registry.get_columns('air_quality_data')
         
         # --- STAGE 2: DYNAMICALLY UPDATE SCHEMA ---
         print("\n[Stage 2/3] Synchronizing database schema...")
@@ -64,79 +121,40 @@ def intelligent_ingestor():
                         # Use INTEGER for flags, DOUBLE PRECISION for data
                         data_type = "INTEGER" if "flag" in col else "DOUBLE PRECISION"
                         connection.execute(text(f"ALTER TABLE air_quality_data ADD COLUMN IF NOT EXISTS {col} {data_type};"))
+            schema_registry.refresh_schema()
             print("Schema update complete.")
         else:
             print("Database schema is already up to date.")
 
         # --- STAGE 3: INGEST DATA ---
-        print("\n[Stage 3/3] Preparing and ingesting data...")
-        
-        latitude = datasets['geolocation']['latitude'].values
-        longitude = datasets['geolocation']['longitude'].values
-        time_data = datasets['geolocation']['time'].values
-        
-        extracted_data = {db_col: datasets[group][nasa_var].values for db_col, (group, nasa_var) in found_variables.items()}
-
-        records_to_insert = []
-        for lat_idx in tqdm(range(0, latitude.shape[0], DOWNSAMPLE_FACTOR), desc="Processing Scanlines"):
-            time_for_scanline = np.datetime_as_string(time_data[lat_idx])
-            for lon_idx in range(0, latitude.shape[1], DOWNSAMPLE_FACTOR):
-                
-                # --- THIS IS THE FIX ---
-                # First, get the raw quality flag value which could be a float or NaN
-                if 'quality_flag' in extracted_data:
-                    q_flag_raw = extracted_data['quality_flag'][lat_idx, lon_idx]
-                    # Check for NaN before converting to integer
-                    if np.isnan(q_flag_raw) or int(q_flag_raw) != 0:
-                        continue
-                # --- END OF FIX ---
-
-                record = {
-                    "time": time_for_scanline,
-                    "lat": float(latitude[lat_idx, lon_idx]),
-                    "lon": float(longitude[lat_idx, lon_idx]),
-                    "source": "NASA-TEMPO"
-                }
-                
-                valid_record = True
-                for col_name, data_array in extracted_data.items():
-                    value = float(data_array[lat_idx, lon_idx])
-                    if np.isnan(value):
-                        valid_record = False
-                        break
-                    # Use integer conversion for flags
-                    record[col_name] = int(value) if "flag" in col_name else value
-
-                if valid_record:
-                    records_to_insert.append(record)
-        
-        if not records_to_insert:
+        print("\n[Stage 3/3] Streaming and ingesting data...")
+        column_types = {
+            "time": "TIMESTAMPTZ", "latitude": "DOUBLE PRECISION", "longitude": "DOUBLE PRECISION", "source": "TEXT",
+            **{col: ("INTEGER" if "flag" in col else "DOUBLE PRECISION") for col in found_variables},
+        }
+
+        db = SessionLocal()
+        n_rows = 0
+        for columns in iter_column_batches(granule, found_variables, DOWNSAMPLE_FACTOR, DOWNSAMPLE_METHOD):
+            if len(columns["time"]) == 0:
+                continue
+            columns["source"] = ["NASA-TEMPO"] * len(columns["time"])
+            n_rows += bulk_writer.upsert_columns(db, "air_quality_data", columns, column_types,
+                                                 conflict_columns=["time", "latitude", "longitude"])
+            schema_registry.record_ingested_columns(db, columns["time"], columns)
+
+        if n_rows == 0:
             print("No valid, high-quality records found to insert.")
             return
 
-        print(f"\nList prepared with {len(records_to_insert)} records. Executing bulk insert...")
-
-        db_cols_str = ", ".join(found_variables.keys())
-        values_str = ", ".join([f":{k}" for k in found_variables.keys()])
-        update_str = ", ".join([f"{k} = EXCLUDED.{k}" for k in found_variables.keys()])
-
-        insert_query = text(f"""
-            INSERT INTO air_quality_data (time, latitude, longitude, source, {db_cols_str})
-            VALUES (:time, :lat, :lon, :source, {values_str})
-            ON CONFLICT (time, latitude, longitude) DO UPDATE SET {update_str};
-        """)
-        
-        db = SessionLocal()
-        db.execute(insert_query, records_to_insert)
         db.commit()
-        
-        print(f"✅ Successfully ingested {len(records_to_insert)} records.")
+        print(f"✅ Successfully ingested {n_rows} records ({DOWNSAMPLE_METHOD} over {DOWNSAMPLE_FACTOR}x{DOWNSAMPLE_FACTOR} blocks).")
 
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
-        for ds in datasets.values():
-            ds.close()
+        if granule is not None:
+            granule.close()
         if 'db' in locals() and db and db.is_active:
             db.close()
 
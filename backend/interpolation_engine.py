@@ -0,0 +1,303 @@
+# /backend/interpolation_engine.py
+"""
+Pollutant estimates at arbitrary points, interpolated from nearby observations.
+
+A field is one variable's latest observations: the newest reading of every
+ground station (`air_quality_data`, satellite sources excluded) or the
+latest TEMPO scan (`tempo_grid_data`, variable 'no2_column'). Its points sit
+in a cKDTree on 3-D Earth-centred coordinates, so a k-nearest query returns
+chord distances in km with no lat/lon distortion. Fields are cached for
+SNAPSHOT_TTL_S.
+
+Every method takes arrays of query points and is vectorized over them:
+
+- 'idw': inverse-distance weighting of the K_NEIGHBOURS nearest points.
+  Uncertainty is the weighted standard deviation of those neighbours.
+- 'kriging': ordinary kriging on the same neighbours. It uses an
+  exponential variogram fitted once per field and cached with it.
+  Uncertainty is the kriging standard deviation.
+
+Points further than MAX_DISTANCE_KM from every observation get NaN rather
+than an extrapolated value. `render_surface` evaluates a whole Web-Mercator
+raster (e.g. one map tile) in a single call.
+
+    field = interpolation_engine.get_field(db, 'computed_aqi')
+    result = field.estimate([28.6], [77.2], method='kriging')
+"""
+import math
+import threading
+import time
+import numpy as np
+from sqlalchemy import text
+from grid_utils import to_xyz
+
+# --- CONFIGURATION ---
+GROUND_VARIABLES = ['computed_aqi', 'pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
+SATELLITE_VARIABLES = {'no2_column': 'no2_tropospheric'}   # field name -> tempo_grid_data column
+SNAPSHOT_WINDOW_HOURS = 3        # a station's latest reading counts if it is this close to the newest one
+SNAPSHOT_TTL_S = 300
+TEMPO_LEVEL = 4                  # resolution level the satellite field is read at
+K_NEIGHBOURS = 8
+IDW_POWER = 2.0
+MAX_DISTANCE_KM = 100.0
+VARIOGRAM_SAMPLE = 1500          # points used to fit a variogram (pairs grow quadratically)
+VARIOGRAM_BINS = 15
+KRIGING_BATCH = 20_000           # query points per batched solve
+WEB_MERCATOR_RADIUS_M = 6378137.0
+METHODS = ('idw', 'kriging')
+
+
+def exponential_variogram(h, nugget, sill, range_km):
+    """Semivariance at lag h (km); reaches ~95% of the sill at range_km."""
+    return nugget + (sill - nugget) * (1.0 - np.exp(-3.0 * np.asarray(h) / range_km))
+
+
+class SpatialField:
+    """One variable's observations with a spatial index over them."""
+
+    def __init__(self, variable: str, lat, lon, values, observed_at=None):
+        from scipy.spatial import cKDTree
+        lat, lon, values = (np.asarray(a, dtype=float) for a in (lat, lon, values))
+        keep = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(values)
+        self.variable = variable
+        self.lat, self.lon, self.values = lat[keep], lon[keep], values[keep]
+        self.observed_at = observed_at
+        self.xyz = to_xyz(self.lat, self.lon)
+        self.tree = cKDTree(self.xyz) if len(self.values) else None
+        self._variogram = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.values)
+
+    def neighbours(self, lat, lon, k: int = K_NEIGHBOURS):
+        """(distances_km, indices) of the k nearest points, each shaped (m, k)."""
+        k = min(k, len(self))
+        distances, indices = self.tree.query(to_xyz(lat, lon), k=k)
+        return distances.reshape(-1, k), indices.reshape(-1, k)
+
+    # --- IDW ---
+
+    def idw(self, lat, lon, k: int = K_NEIGHBOURS, power: float = IDW_POWER) -> dict:
+        distances, indices = self.neighbours(lat, lon, k)
+        values = self.values[indices]
+        with np.errstate(divide='ignore'):
+            weights = 1.0 / distances ** power
+        # A query on top of an observation takes its value exactly
+        exact = distances < 1e-6
+        weights = np.where(exact.any(axis=1, keepdims=True), exact.astype(float), weights)
+        weights /= weights.sum(axis=1, keepdims=True)
+
+        estimate = (weights * values).sum(axis=1)
+        spread = np.sqrt((weights * (values - estimate[:, None]) ** 2).sum(axis=1))
+        return self._result(estimate, spread, distances, 'idw')
+
+    # --- Kriging ---
+
+    def variogram(self) -> tuple:
+        """(nugget, sill, range_km) of the fitted exponential variogram, fitted once and cached."""
+        if self._variogram is None:
+            with self._lock:
+                if self._variogram is None:
+                    self._variogram = self._fit_variogram()
+        return self._variogram
+
+    def _fit_variogram(self) -> tuple:
+        from scipy.optimize import curve_fit
+        from scipy.spatial.distance import pdist
+
+        variance = float(np.var(self.values)) or 1.0
+        fallback = (0.0, variance, MAX_DISTANCE_KM)
+        if len(self) < 10:
+            return fallback
+        sample = np.random.default_rng(0).choice(len(self), min(len(self), VARIOGRAM_SAMPLE), replace=False)
+        lags = pdist(self.xyz[sample])
+        semivariances = 0.5 * pdist(self.values[sample, None], 'sqeuclidean')
+
+        # Binned empirical variogram up to twice the interpolation distance
+        edges = np.linspace(0.0, 2 * MAX_DISTANCE_KM, VARIOGRAM_BINS + 1)
+        bins = np.digitize(lags, edges) - 1
+        in_range = (bins >= 0) & (bins < VARIOGRAM_BINS)
+        counts = np.bincount(bins[in_range], minlength=VARIOGRAM_BINS)
+        sums = np.bincount(bins[in_range], weights=semivariances[in_range], minlength=VARIOGRAM_BINS)
+        populated = counts > 0
+        if populated.sum() < 3:
+            return fallback
+        centres = ((edges[:-1] + edges[1:]) / 2)[populated]
+        gamma = sums[populated] / counts[populated]
+        try:
+            (nugget, sill, range_km), _ = curve_fit(
+                exponential_variogram, centres, gamma, p0=[gamma[0], gamma.max(), MAX_DISTANCE_KM],
+                bounds=([0.0, 1e-9, 1.0], [np.inf, np.inf, 20 * MAX_DISTANCE_KM]),
+                sigma=1.0 / np.sqrt(counts[populated]), maxfev=5000)
+        except (RuntimeError, ValueError):
+            return fallback
+        return float(min(nugget, sill)), float(sill), float(range_km)
+
+    def krige(self, lat, lon, k: int = K_NEIGHBOURS) -> dict:
+        """Ordinary kriging on the k nearest points; one batched linear solve per KRIGING_BATCH queries."""
+        nugget, sill, range_km = self.variogram()
+        distances, indices = self.neighbours(lat, lon, k)
+        m, k = indices.shape
+        estimate, std = np.empty(m), np.empty(m)
+
+        for start in range(0, m, KRIGING_BATCH):
+            d0, idx = distances[start:start + KRIGING_BATCH], indices[start:start + KRIGING_BATCH]
+            points = self.xyz[idx]                                               # (b, k, 3)
+            pair_distances = np.linalg.norm(points[:, :, None] - points[:, None], axis=-1)
+            system = np.ones((len(idx), k + 1, k + 1))
+            system[:, :k, :k] = exponential_variogram(pair_distances, nugget, sill, range_km)
+            system[:, :k, :k][:, np.arange(k), np.arange(k)] = 0.0
+            system[:, k, k] = 0.0
+            rhs = np.ones((len(idx), k + 1))
+            rhs[:, :k] = np.where(d0 < 1e-6, 0.0, exponential_variogram(d0, nugget, sill, range_km))
+            try:
+                solution = np.linalg.solve(system, rhs[..., None])[..., 0]
+            except np.linalg.LinAlgError:
+                # Degenerate neighbourhoods (e.g. collinear points with no nugget): IDW for this batch
+                fallback = self.idw(lat[start:start + KRIGING_BATCH], lon[start:start + KRIGING_BATCH], k)
+                estimate[start:start + len(idx)] = fallback['estimate']
+                std[start:start + len(idx)] = fallback['uncertainty']
+                continue
+            weights = solution[:, :k]
+            estimate[start:start + len(idx)] = (weights * self.values[idx]).sum(axis=1)
+            variance = (solution * rhs).sum(axis=1)
+            std[start:start + len(idx)] = np.sqrt(np.clip(variance, 0.0, None))
+        return self._result(estimate, std, distances, 'kriging')
+
+    # --- Common ---
+
+    def _result(self, estimate, uncertainty, distances, method) -> dict:
+        nearest = distances[:, 0]
+        out_of_range = ~(nearest <= MAX_DISTANCE_KM)
+        estimate, uncertainty = estimate.copy(), uncertainty.copy()
+        estimate[out_of_range] = np.nan
+        uncertainty[out_of_range] = np.nan
+        return {"estimate": estimate, "uncertainty": uncertainty, "nearest_km": nearest,
+                "neighbours": (distances <= MAX_DISTANCE_KM).sum(axis=1), "method": method}
+
+    def estimate(self, lat, lon, method: str = 'idw', k: int = K_NEIGHBOURS) -> dict:
+        """Estimates at every (lat, lon); arrays in, dict of arrays out (NaN where out of range)."""
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        if method not in METHODS:
+            raise ValueError(f"Unknown method '{method}'; expected one of {METHODS}")
+        if not len(self):
+            nan = np.full(lat.shape, np.nan)
+            return {"estimate": nan, "uncertainty": nan.copy(), "nearest_km": np.full(lat.shape, np.inf),
+                    "neighbours": np.zeros(lat.shape, dtype=int), "method": method}
+        # Kriging needs at least three points to be better than a guess
+        if method == 'kriging' and len(self) >= 3:
+            return self.krige(lat, lon, k)
+        return self.idw(lat, lon, k)
+
+
+# --- Snapshots ---
+
+_ground_snapshot_sql = text(f"""
+    SELECT DISTINCT ON (latitude, longitude)
+           latitude, longitude, time, {', '.join(GROUND_VARIABLES)}
+    FROM air_quality_data
+    WHERE source NOT LIKE 'NASA-%'   -- satellite pixels are a separate field
+      AND time > (SELECT MAX(time) FROM air_quality_data WHERE source NOT LIKE 'NASA-%')
+                 - make_interval(hours => :hours)
+    ORDER BY latitude, longitude, time DESC;
+""")
+
+def _satellite_snapshot_sql(column):
+    return text(f"""
+        SELECT latitude, longitude, time, {column} AS value
+        FROM tempo_grid_data
+        WHERE resolution_level = :level AND {column} IS NOT NULL
+          AND time > (SELECT MAX(time) FROM tempo_grid_data WHERE resolution_level = :level) - INTERVAL '1 hour';
+    """)
+
+_fields = {}       # variable -> (loaded_at, SpatialField)
+_fields_lock = threading.Lock()
+
+def _load_fields(db, variable):
+    """Reads the snapshot `variable` belongs to; returns {variable: SpatialField} for every field in it."""
+    if variable in SATELLITE_VARIABLES:
+        rows = db.execute(_satellite_snapshot_sql(SATELLITE_VARIABLES[variable]), {"level": TEMPO_LEVEL}).all()
+        lat, lon, times, values = (list(col) for col in zip(*rows)) if rows else ([], [], [], [])
+        return {variable: SpatialField(variable, lat, lon, np.array(values, dtype=float),
+                                       max(times) if times else None)}
+
+    rows = db.execute(_ground_snapshot_sql, {"hours": SNAPSHOT_WINDOW_HOURS}).all()
+    columns = list(zip(*rows)) if rows else [[] for _ in range(3 + len(GROUND_VARIABLES))]
+    lat, lon, times = columns[0], columns[1], columns[2]
+    observed_at = max(times) if times else None
+    return {name: SpatialField(name, lat, lon, np.array(columns[3 + i], dtype=float), observed_at)
+            for i, name in enumerate(GROUND_VARIABLES)}
+
+def get_field(db, variable: str = 'computed_aqi') -> SpatialField:
+    """The cached field for `variable`, re-read from the database at most once per SNAPSHOT_TTL_S."""
+    if variable not in GROUND_VARIABLES and variable not in SATELLITE_VARIABLES:
+        raise ValueError(f"Unknown variable '{variable}'")
+    cached = _fields.get(variable)
+    if cached and time.monotonic() - cached[0] < SNAPSHOT_TTL_S:
+        return cached[1]
+    with _fields_lock:
+        cached = _fields.get(variable)
+        if cached and time.monotonic() - cached[0] < SNAPSHOT_TTL_S:
+            return cached[1]
+        loaded_at = time.monotonic()
+        for name, field in _load_fields(db, variable).items():
+            _fields[name] = (loaded_at, field)
+    return _fields[variable][1]
+
+def invalidate():
+    """Drops every cached field (e.g. after an ingest in the same process)."""
+    with _fields_lock:
+        _fields.clear()
+
+
+def estimate_point(db, lat: float, lon: float, variables=None, method: str = 'idw') -> dict:
+    """{variable: {estimate, uncertainty, nearest_km, neighbours}} at one point (None where out of range)."""
+    result = {}
+    for variable in variables or GROUND_VARIABLES:
+        field = get_field(db, variable)
+        values = field.estimate([lat], [lon], method)
+        if not np.isfinite(values["estimate"][0]):
+            result[variable] = None
+            continue
+        result[variable] = {"estimate": round(float(values["estimate"][0]), 2),
+                            "uncertainty": round(float(values["uncertainty"][0]), 2),
+                            "nearest_km": round(float(values["nearest_km"][0]), 2),
+                            "neighbours": int(values["neighbours"][0]),
+                            "method": values["method"]}
+    return result
+
+
+# --- Surfaces ---
+
+def mercator_to_lonlat(x, y):
+    """EPSG:3857 metres -> (lon, lat) degrees."""
+    lon = np.degrees(np.asarray(x, dtype=float) / WEB_MERCATOR_RADIUS_M)
+    lat = np.degrees(2.0 * np.arctan(np.exp(np.asarray(y, dtype=float) / WEB_MERCATOR_RADIUS_M)) - math.pi / 2)
+    return lon, lat
+
+def render_surface(field: SpatialField, bounds, width: int = 256, height: int = 256, method: str = 'idw',
+                   with_uncertainty: bool = False):
+    """
+    Evaluates the field at the pixel centres of a north-up EPSG:3857 raster
+    covering bounds (minx, miny, maxx, maxy). Returns a (height, width)
+    float32 array (NaN where out of range), or (estimate, uncertainty).
+    """
+    minx, miny, maxx, maxy = bounds
+    xs = minx + (np.arange(width) + 0.5) * (maxx - minx) / width
+    ys = maxy - (np.arange(height) + 0.5) * (maxy - miny) / height
+    lon, lat = mercator_to_lonlat(*np.meshgrid(xs, ys))
+
+    # Skip the solve when no observation is near the raster at all
+    half_diagonal = float(np.linalg.norm(to_xyz(lat[0, 0], lon[0, 0]) - to_xyz(lat[-1, -1], lon[-1, -1]))) / 2
+    centre = to_xyz(lat[height // 2, width // 2], lon[height // 2, width // 2])
+    if not len(field) or not field.tree.query_ball_point(centre[0], half_diagonal + MAX_DISTANCE_KM):
+        empty = np.full((height, width), np.nan, dtype=np.float32)
+        return (empty, empty.copy()) if with_uncertainty else empty
+
+    values = field.estimate(lat.ravel(), lon.ravel(), method)
+    estimate = values["estimate"].reshape(height, width).astype(np.float32)
+    if with_uncertainty:
+        return estimate, values["uncertainty"].reshape(height, width).astype(np.float32)
+    return estimate
@@ -0,0 +1,277 @@
+# /backend/llm_client.py
+"""
+Async LLM client used by the AI guide.
+
+- A semaphore bounds how many LLM calls are in flight at once, and every
+  call has a timeout, so a slow model can't tie up the server.
+- Answers are cached for a TTL under a "semantic" key (normalised question,
+  persona, health conditions and AQI band) so the same question asked in
+  the same conditions is only paid for once.
+- Identical questions that arrive while the first is still running share
+  its result instead of each calling the model (request coalescing).
+- `stream()` yields tokens as they arrive, for the SSE chat endpoint.
+
+Set LLM_FAKE=1 to use `FakeModel`, a local stand-in that needs no API key.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+# --- CONFIGURATION ---
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gemini-pro")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "20"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", "900"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+
+# US EPA AQI category upper bounds; answers are shared within a band.
+AQI_BANDS = [50, 100, 150, 200, 300]
+AQI_BAND_LABELS = ["Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy",
+                   "Very Unhealthy", "Hazardous"]
+
+
+class LLMTimeoutError(Exception):
+    pass
+
+
+# --- Cache Keys ---
+
+def normalize_question(question: str) -> str:
+    """Lower-cases, drops punctuation and collapses whitespace."""
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+def aqi_band(aqi) -> Optional[int]:
+    """Index of the AQI category the value falls into (None if unknown)."""
+    if aqi is None:
+        return None
+    for i, upper in enumerate(AQI_BANDS):
+        if aqi <= upper:
+            return i
+    return len(AQI_BANDS)
+
+def aqi_band_description(aqi) -> Optional[str]:
+    """'Unhealthy (US AQI 151-200)': the band as a prompt may state it, never the exact value."""
+    band = aqi_band(aqi)
+    if band is None:
+        return None
+    lower = AQI_BANDS[band - 1] + 1 if band else 0
+    upper = f"-{AQI_BANDS[band]}" if band < len(AQI_BANDS) else "+"
+    return f"{AQI_BAND_LABELS[band]} (US AQI {lower}{upper})"
+
+def parse_health_conditions(health_conditions) -> list:
+    """`users.health_conditions` may arrive as a JSON string or as a list."""
+    if not health_conditions:
+        return []
+    if isinstance(health_conditions, str):
+        try:
+            health_conditions = json.loads(health_conditions)
+        except ValueError:
+            return [health_conditions]
+    return list(health_conditions)
+
+def make_cache_key(question: str, persona, health_conditions, aqi) -> tuple:
+    conditions = tuple(sorted(c.lower() for c in parse_health_conditions(health_conditions)))
+    return (normalize_question(question), (persona or "").lower(), conditions, aqi_band(aqi))
+
+
+# --- Models ---
+
+class GeminiModel:
+    """
+    Thin async wrapper around google.generativeai, configured on first use.
+
+    With GEMINI_API_ENDPOINT set the client talks REST, which the library
+    only supports synchronously, so calls then run in a worker thread.
+    """
+
+    def __init__(self, model_name: str = LLM_MODEL_NAME):
+        self.model_name = model_name
+        self._model = None
+        self.rest = bool(os.getenv("GEMINI_API_ENDPOINT"))
+
+    def _get_model(self):
+        if self._model is None:
+            import google.generativeai as genai
+            if self.rest:
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"), transport="rest",
+                                client_options={"api_endpoint": os.getenv("GEMINI_API_ENDPOINT")})
+            else:
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    async def generate(self, prompt: str) -> str:
+        if self.rest:
+            response = await asyncio.to_thread(self._get_model().generate_content, prompt)
+        else:
+            response = await self._get_model().generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        if self.rest:
+            response = await asyncio.to_thread(self._get_model().generate_content, prompt, stream=True)
+            chunks = iter(response)
+            while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                if chunk.text:
+                    yield chunk.text
+            return
+        response = await self._get_model().generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeModel:
+    """Deterministic local model for tests and benchmarks."""
+
+    def __init__(self, latency_s: float = 0.05, reply: str = None):
+        self.latency_s = latency_s
+        self.reply = reply
+        self.calls = 0
+
+    def _answer(self, prompt: str) -> str:
+        if self.reply is not None:
+            return self.reply
+        return f"(fake answer #{self.calls}) Based on the current air quality, take sensible precautions."
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency_s)
+        return self._answer(prompt)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        self.calls += 1
+        words = self._answer(prompt).split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency_s / len(words))
+            yield word if i == 0 else " " + word
+
+
+# --- Client ---
+
+class LLMClient:
+    def __init__(self, model=None, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 timeout_s: float = LLM_TIMEOUT_S, cache_ttl_s: float = LLM_CACHE_TTL_S,
+                 cache_size: int = LLM_CACHE_SIZE):
+        self.model = model or GeminiModel()
+        self.max_concurrency = max_concurrency
+        self.timeout_s = timeout_s
+        self.cache_ttl_s = cache_ttl_s
+        self.cache_size = cache_size
+        self._cache = OrderedDict()   # key -> (expires_at, text)
+        self._inflight = {}           # key -> asyncio.Task
+        self._semaphore = None
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "timeouts": 0}
+
+    @property
+    def semaphore(self):
+        # Created lazily so it binds to the running event loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _cache_get(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return text
+
+    def _cache_put(self, key, text):
+        self._cache[key] = (time.monotonic() + self.cache_ttl_s, text)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _call_model(self, prompt: str) -> str:
+        async with self.semaphore:
+            try:
+                return await asyncio.wait_for(self.model.generate(prompt), timeout=self.timeout_s)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                raise LLMTimeoutError(f"LLM did not answer within {self.timeout_s}s")
+
+    async def generate(self, prompt: str, cache_key=None) -> str:
+        """Returns the full answer, from cache or a shared in-flight call when possible."""
+        if cache_key is None:
+            return await self._call_model(prompt)
+
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+
+        task = self._inflight.get(cache_key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(task)
+
+        self.stats["misses"] += 1
+        task = asyncio.ensure_future(self._call_model(prompt))
+        self._inflight[cache_key] = task
+        try:
+            text = await asyncio.shield(task)
+            self._cache_put(cache_key, text)
+            return text
+        finally:
+            self._inflight.pop(cache_key, None)
+
+    async def stream(self, prompt: str, cache_key=None) -> AsyncIterator[str]:
+        """
+        Yields the answer token by token. Cached answers are replayed at once,
+        and a `generate` call already in flight for the same key is joined and
+        its answer yielded whole. A freshly streamed answer is cached when it
+        completes; streams do not register as in flight themselves, so two
+        concurrent streams for one key both call the model.
+        """
+        if cache_key is not None:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                self.stats["hits"] += 1
+                yield cached
+                return
+            task = self._inflight.get(cache_key)
+            if task is not None:
+                self.stats["coalesced"] += 1
+                yield await asyncio.shield(task)
+                return
+            self.stats["misses"] += 1
+
+        parts = []
+        async with self.semaphore:
+            deadline = time.monotonic() + self.timeout_s
+            iterator = self.model.stream(prompt).__aiter__()
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    token = await asyncio.wait_for(iterator.__anext__(), timeout=max(remaining, 0.001))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.stats["timeouts"] += 1
+                    raise LLMTimeoutError(f"LLM stream did not finish within {self.timeout_s}s")
+                parts.append(token)
+                yield token
+
+        if cache_key is not None:
+            self._cache_put(cache_key, "".join(parts))
+
+
+_client = None
+
+def get_llm_client() -> LLMClient:
+    """Process-wide client, so the semaphore and cache are shared by all requests."""
+    global _client
+    if _client is None:
+        model = FakeModel() if os.getenv("LLM_FAKE") == "1" else GeminiModel()
+        _client = LLMClient(model)
+    return _client
@@ -1,42 +1,72 @@
-from fastapi import FastAPI, Depends, Form, UploadFile, File, Response
+from fastapi import FastAPI, Depends, Form, UploadFile, File, Response, Query, Request, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import text, inspect
+from sqlalchemy import text
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, TYPE_CHECKING
 import json
 import os
 import requests
-import shutil
 import io
+import asyncio
+from datetime import datetime, timedelta, timezone
+from contextlib import asynccontextmanager
 import numpy as np
-import matplotlib.pyplot as plt
 import mercantile
-import rasterio
-from rasterio.vrt import WarpedVRT
-from rasterio.enums import Resampling
-import xarray as xr
 from dotenv import load_dotenv
 from urllib.parse import quote
 
+if TYPE_CHECKING:
+    # Only get_async_db loads the async stack (and its greenlet dependency)
+    from sqlalchemy.ext.asyncio import AsyncSession
+
 # Load all environment variables from .env
 load_dotenv()
 
 from forecasting_engine import generate_forecast
-from database import get_db, engine
-from lib.mockData import mockLocationForecast
+from database import get_db, get_async_db, get_pool_stats
+import schema_registry
+import grid_utils
+import timeseries
+import frame_bundles
+import subsystems
+import interpolation_engine
+import fusion_pipeline
+import geocoder
+import report_media
+import reports_query
+import aqi_calculator
+import weather_grid
+from exposure_engine import GRID_STEP_DEG as FORECAST_GRID_STEP_DEG
+from rules_engine import get_rules
 from personalization_engine import generate_alert
-from ai_guide import get_gemini_response
+from ai_guide import get_gemini_response, stream_gemini_response
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Heavy subsystems (rasterio, matplotlib, the LLM client) warm in a
+    # background thread so the server accepts requests straight away;
+    # anything not warm yet loads on first use.
+    if subsystems.STARTUP_WARM:
+        asyncio.get_running_loop().run_in_executor(None, subsystems.warm, subsystems.STARTUP_WARM)
+    yield
+    report_media.shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # --- Environment API Keys ---
 WAQI_API_KEY = os.getenv("WAQI_API_KEY")
 MAPTILER_API_KEY = os.getenv("MAPTILER_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 API_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
+
+# --- External Service Base URLs (overridable for local stand-ins, e.g. the benchmark suite) ---
+WAQI_API_URL = os.getenv("WAQI_API_URL", "https://api.waqi.info")
+MAPTILER_API_URL = os.getenv("MAPTILER_API_URL", "https://api.maptiler.com")
+OPEN_METEO_WEATHER_URL = os.getenv("OPEN_METEO_WEATHER_URL", "https://api.open-meteo.com")
 # --- Serve Static Files for Uploaded Images ---
 os.makedirs("uploads", exist_ok=True)
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
@@ -81,50 +111,43 @@ class ForecastDataPoint(BaseModel):
     predicted_aqi: float
 
 # --- API Endpoints ---
-NETCDF_FILE = r"backend\data\TEMPO_NO2_L2_V03_20250916T214329Z_S012G07.nc"
-
-if os.path.exists(NETCDF_FILE):
-    ds = xr.open_dataset(NETCDF_FILE)
-    variable = "NO2_column_number_density"
-    da = ds[variable].isel(time=0) if "time" in ds.dims else ds[variable]
-
-    tif_path = "tempo.tif"
-    if not os.path.exists(tif_path):
-        da.rio.to_raster(tif_path)
-else:
-    tif_path = None
-    da = None
-    variable = None
+# The TEMPO GeoTIFF is prepared offline (script/prepare_tempo_raster.py) and
+# only opened on request; see subsystems.TEMPO_TIF_PATH.
 
 @app.get("/api/v1/tempo/metadata")
 def get_tempo_metadata():
-    if not da:
-        return {"error": "TEMPO NetCDF file not found"}
+    try:
+        meta = subsystems.get("tempo_raster")
+    except Exception:
+        return {"error": "TEMPO GeoTIFF not generated"}
     return {
-        "variable": variable,
-        "shape": da.shape,
-        "bounds": da.rio.bounds(),
-        "crs": str(da.rio.crs)
+        "variable": meta["variable"],
+        "shape": meta["shape"],
+        "bounds": meta["bounds"],
+        "crs": meta["crs"]
     }
 
 @app.get("/api/v1/tempo/tiles/{z}/{x}/{y}.png")
 def get_tempo_tile(z: int, x: int, y: int):
-    if not tif_path:
+    try:
+        meta = subsystems.get("tempo_raster")
+    except Exception:
         return {"error": "TEMPO GeoTIFF not generated"}
-    with rasterio.open(tif_path) as src:
-        with WarpedVRT(src, crs="EPSG:3857", resampling=Resampling.bilinear) as vrt:
+    raster = subsystems.get("raster")
+    with raster.rasterio.open(meta["path"]) as src:
+        with raster.WarpedVRT(src, crs="EPSG:3857", resampling=raster.Resampling.bilinear) as vrt:
             tile_bounds = mercantile.xy_bounds(x, y, z)
             window = vrt.window(*tile_bounds)
-            data = vrt.read(1, window=window, out_shape=(256, 256), resampling=Resampling.bilinear)
+            data = vrt.read(1, window=window, out_shape=(256, 256), resampling=raster.Resampling.bilinear)
 
             arr = np.where(data == src.nodata, np.nan, data)
             vmin, vmax = np.nanpercentile(arr, (5, 95))
-            norm = plt.Normalize(vmin=vmin, vmax=vmax)
-            cmap = plt.cm.inferno
+            norm = raster.colors.Normalize(vmin=vmin, vmax=vmax)
+            cmap = raster.colormaps["inferno"]
             rgba = cmap(norm(arr))
 
             img_bytes = io.BytesIO()
-            plt.imsave(img_bytes, rgba, format="png")
+            raster.image.imsave(img_bytes, rgba, format="png")
             img_bytes.seek(0)
             return Response(content=img_bytes.getvalue(), media_type="image/png")
 
@@ -169,17 +192,112 @@ def register_user(profile: UserProfile, db: Session = Depends(get_db)):
         db.rollback()
         return {"error": str(e)}
 
+@app.get("/api/v1/health/db")
+def get_database_health():
+    """
+    Reports connection-pool utilisation so saturation can be monitored.
+    """
+    return get_pool_stats()
+
+@app.get("/api/v1/health/ready")
+def get_readiness(response: Response):
+    """
+    Reports which heavy subsystems are loaded. Answers 503 until everything
+    in STARTUP_WARM is warm; the API itself serves requests before that.
+    """
+    ready = subsystems.is_ready()
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "warm_on_startup": subsystems.STARTUP_WARM, "subsystems": subsystems.status()}
+
+@app.get("/api/v1/health/ingestion")
+def get_ingestion_health(db: Session = Depends(get_db)):
+    """
+    Latest run of each ingestion source recorded by the ingestion daemon,
+    with the time since its last successful run.
+    """
+    query = text("""
+        SELECT DISTINCT ON (source)
+            source, started_at, finished_at, status, rows_written, error,
+            EXTRACT(EPOCH FROM NOW() - (
+                SELECT MAX(finished_at) FROM ingestion_runs ok
+                WHERE ok.source = r.source AND ok.status = 'ok'
+            )) AS lag_seconds
+        FROM ingestion_runs r
+        ORDER BY source, started_at DESC;
+    """)
+    return list(db.execute(query).mappings().all())
+
 @app.get("/api/v1/pollutants/available")
 def get_available_pollutants(db: Session = Depends(get_db)):
-    inspector = inspect(engine)
-    columns = [col['name'] for col in inspector.get_columns('air_quality_data')]
-    available = []
-    for pollutant in ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']:
-        if pollutant in columns:
-            query = text(f"SELECT EXISTS (SELECT 1 FROM air_quality_data WHERE {pollutant} IS NOT NULL)")
-            if db.execute(query).scalar():
-                available.append(pollutant.upper())
-    return available
+    """
+    Lists pollutants that have data, from the cached availability registry.
+    """
+    return schema_registry.get_available_pollutants(db)
+
+@app.get("/api/v1/pollutants/availability")
+def get_pollutant_availability(db: Session = Depends(get_db)):
+    """
+    Returns first/last seen times and rows ingested for each pollutant.
+    rows_ingested is cumulative: a reading ingested twice is counted twice.
+    """
+    return schema_registry.get_availability(db)
+
+@app.get("/api/v1/analytics/trend")
+def get_pollutant_trend(
+    pollutant: str = 'computed_aqi',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    source: Optional[str] = None,
+    bbox: Optional[str] = None
+):
+    """
+    Daily mean/max/count of a pollutant over any date range, read from the
+    columnar analytics store rather than Postgres. bbox is
+    "lat_min,lon_min,lat_max,lon_max"; start/end are ISO dates.
+    """
+    if pollutant not in ['computed_aqi', 'aqi', 'pm25', 'pm10', 'o3', 'no2', 'so2', 'co']:
+        return {"error": f"Unknown pollutant '{pollutant}'."}
+    try:
+        store = subsystems.get("analytics")
+        box = tuple(float(v) for v in bbox.split(",")) if bbox else None
+        return store.daily_trend(pollutant, start, end, [source] if source else None, box)
+    except Exception as e:
+        print(f"Error reading analytics trend: {e}")
+        return {"error": "Could not read the analytics store."}
+
+@app.get("/api/v1/history")
+def get_history(
+    lat: float,
+    lon: float,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    pollutant: str = 'computed_aqi',
+    points: int = timeseries.DEFAULT_POINTS,
+    method: str = 'lttb',
+    resolution: str = 'auto',
+    db: Session = Depends(get_db)
+):
+    """
+    Time series of a pollutant at the measured location nearest (lat, lon)
+    over [start, end) (default: the last 7 days), downsampled to at most
+    `points` values. Long ranges are read from the hourly/daily rollups.
+    method is 'lttb' or 'bucket'; resolution is 'auto', 'raw', 'hourly' or 'daily'.
+    """
+    if pollutant not in timeseries.POLLUTANTS:
+        return {"error": f"Unknown pollutant '{pollutant}'."}
+    if method not in ('lttb', 'bucket') or resolution not in ('auto', 'raw', 'hourly', 'daily'):
+        return {"error": "method must be 'lttb' or 'bucket'; resolution 'auto', 'raw', 'hourly' or 'daily'."}
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=7)
+    start, end = (t if t.tzinfo else t.replace(tzinfo=timezone.utc) for t in (start, end))
+    if start >= end:
+        return {"error": "start must be before end."}
+    try:
+        return timeseries.get_history(db, lat, lon, start, end, pollutant, points, method, resolution)
+    except Exception as e:
+        print(f"Error fetching history: {e}")
+        return {"error": "Could not retrieve history."}
 
 @app.get("/api/v1/grid/current")
 def get_current_grid_data(
@@ -187,7 +305,7 @@ def get_current_grid_data(
     pollutant: str = 'auto',
     time_offset: int = 0
 ):
-    pollutant_to_query = "COALESCE(pm25, pm10, o3, no2, so2, co)"
+    pollutant_to_query = "computed_aqi"
     if pollutant != 'auto':
         safe_pollutant = "".join(filter(str.isalnum, pollutant)).lower()
         if safe_pollutant in ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']:
@@ -211,6 +329,33 @@ def get_current_grid_data(
     result = db.execute(query, {"time_offset": time_offset}).mappings().all()
     return list(result)
 
+@app.get("/api/v1/grid/frames")
+def get_grid_frames(request: Request, pollutant: str = 'auto', hours: int = frame_bundles.DEFAULT_HOURS,
+                    db: Session = Depends(get_db)):
+    """
+    Every hourly frame of the time scrubber in one download: a cell table plus
+    a quantized, delta-encoded, compressed frames x cells matrix (see
+    frame_bundles.py). Bundles are prebuilt after ingestion; the ETag lets
+    clients skip the download when nothing changed.
+    """
+    if pollutant not in frame_bundles.POLLUTANTS:
+        return {"error": f"Unknown pollutant '{pollutant}'."}
+    hours = max(1, min(hours, frame_bundles.MAX_HOURS))
+    try:
+        bundle, built_at = frame_bundles.get_bundle(db, pollutant, hours)
+    except Exception as e:
+        db.rollback()
+        print(f"Error fetching frame bundle: {e}")
+        return {"error": "Could not retrieve frame bundle."}
+    if bundle is None:
+        return {"error": "No data in the requested window."}
+
+    etag = f'"{pollutant}-{hours}-{int(built_at.timestamp())}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=json.dumps(bundle), media_type="application/json", headers=headers)
+
 
 @app.get("/api/v1/users/{user_id}/personalized_alert")
 def get_personalized_alert(user_id: int, lat: float, lon: float, db: Session = Depends(get_db)):
@@ -224,9 +369,9 @@ def get_personalized_alert(user_id: int, lat: float, lon: float, db: Session = D
         WITH recent_data AS (
             SELECT * FROM air_quality_data
             WHERE time > (SELECT MAX(time) FROM air_quality_data) - INTERVAL '12 hours'
-            AND COALESCE(pm25, pm10, o3, no2, so2, co) IS NOT NULL
+            AND computed_aqi IS NOT NULL
         )
-        SELECT COALESCE(pm25, pm10, o3, no2, so2, co) as aqi
+        SELECT computed_aqi as aqi, dominant_pollutant
         FROM recent_data
         ORDER BY ST_Distance(ST_MakePoint(longitude, latitude), ST_MakePoint(:lon, :lat))
         LIMIT 1;
@@ -239,48 +384,206 @@ def get_personalized_alert(user_id: int, lat: float, lon: float, db: Session = D
     alert = generate_alert(dict(user_profile), dict(air_quality))
     return alert
 
-@app.post("/api/v1/ai_guide/chat")
-def chat_with_ai_guide(request: ChatRequest, db: Session = Depends(get_db)):
-    user_query = text("SELECT name, health_conditions, persona FROM users WHERE id = :user_id")
-    user_profile = db.execute(user_query, {"user_id": request.userId}).mappings().first()
-
-    aq_query = text("""
-        WITH recent_data AS (
-            SELECT * FROM air_quality_data
-            WHERE time > (SELECT MAX(time) FROM air_quality_data) - INTERVAL '12 hours'
-            AND COALESCE(pm25, pm10, o3, no2, so2, co) IS NOT NULL
-        )
-        SELECT COALESCE(pm25, pm10, o3, no2, so2, co) as aqi
-        FROM recent_data
-        ORDER BY ST_Distance(ST_MakePoint(longitude, latitude), ST_MakePoint(:lon, :lat))
-        LIMIT 1;
+@app.get("/api/v1/users/{user_id}/alerts")
+def get_user_alerts(user_id: int, limit: int = 20, db: Session = Depends(get_db)):
+    """
+    Returns the most recent alerts written for this user by the batch alert engine.
+    """
+    query = text("""
+        SELECT created_at, risk_level, previous_risk_level, recommendation, aqi
+        FROM alerts WHERE user_id = :user_id
+        ORDER BY created_at DESC
+        LIMIT :limit;
     """)
-    air_quality = db.execute(aq_query, {"lat": request.lat, "lon": request.lon}).mappings().first()
+    return list(db.execute(query, {"user_id": user_id, "limit": min(limit, 100)}).mappings().all())
 
+@app.get("/api/v1/users/{user_id}/exposure")
+def get_user_exposure(user_id: int, db: Session = Depends(get_db)):
+    """
+    Returns the expected and peak AQI for each of the user's scheduled
+    outdoor windows over the next 72 hours, as computed by the exposure engine.
+    """
+    query = text("""
+        SELECT window_start, window_end, expected_aqi, peak_aqi, risk_level, forecast_issued_at
+        FROM exposure_forecasts
+        WHERE user_id = :user_id AND window_end > NOW()
+        ORDER BY window_start;
+    """)
+    return list(db.execute(query, {"user_id": user_id}).mappings().all())
+
+_chat_air_quality_query = text("""
+    WITH recent_data AS (
+        SELECT * FROM air_quality_data
+        WHERE time > (SELECT MAX(time) FROM air_quality_data) - INTERVAL '12 hours'
+        AND computed_aqi IS NOT NULL
+    )
+    SELECT computed_aqi as aqi, dominant_pollutant
+    FROM recent_data
+    ORDER BY ST_Distance(ST_MakePoint(longitude, latitude), ST_MakePoint(:lon, :lat))
+    LIMIT 1;
+""")
+
+async def _load_chat_context(request: ChatRequest, db: "AsyncSession"):
+    user_query = text("SELECT name, health_conditions, persona FROM users WHERE id = :user_id")
+    user_profile = (await db.execute(user_query, {"user_id": request.userId})).mappings().first()
+    air_quality = (await db.execute(_chat_air_quality_query, {"lat": request.lat, "lon": request.lon})).mappings().first()
     if not user_profile or not air_quality:
+        return None, None
+    return dict(user_profile), dict(air_quality)
+
+@app.post("/api/v1/ai_guide/chat")
+async def chat_with_ai_guide(request: ChatRequest, db: "AsyncSession" = Depends(get_async_db)):
+    user_profile, air_quality = await _load_chat_context(request, db)
+    if not user_profile:
         return {"error": "Could not retrieve context for the AI."}
 
-    ai_response = get_gemini_response(dict(user_profile), dict(air_quality), request.question)
+    ai_response = await get_gemini_response(user_profile, air_quality, request.question)
     return {"response": ai_response}
 
+@app.post("/api/v1/ai_guide/chat/stream")
+async def stream_chat_with_ai_guide(request: ChatRequest, db: "AsyncSession" = Depends(get_async_db)):
+    """
+    Streams the AI guide's answer as Server-Sent Events: one `data:` event
+    per token, then a final `event: done`.
+    """
+    user_profile, air_quality = await _load_chat_context(request, db)
+
+    async def event_stream():
+        if not user_profile:
+            yield f"event: error\ndata: {json.dumps({'error': 'Could not retrieve context for the AI.'})}\n\n"
+            return
+        async for token in stream_gemini_response(user_profile, air_quality, request.question):
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Display names and chart colours for the composition pie.
+POLLUTANT_LABELS = {'pm25': ('PM2.5', '#ef4444'), 'pm10': ('PM10', '#f59e0b'), 'no2': ('NO2', '#fb923c'),
+                    'o3': ('O3', '#60a5fa'), 'so2': ('SO2', '#a78bfa'), 'co': ('CO', '#34d399')}
+COMPOSITION_TOP = 3   # the rest is shown as "Other"
+
+_nearest_station_query = text("""
+    SELECT dominant_pollutant, source, time, pm25, pm10, o3, no2, so2, co
+    FROM air_quality_data
+    WHERE computed_aqi IS NOT NULL AND source NOT LIKE 'NASA-%'
+      AND latitude BETWEEN :lat - 1 AND :lat + 1 AND longitude BETWEEN :lon - 1 AND :lon + 1
+    ORDER BY (latitude - :lat) ^ 2 + (longitude - :lon) ^ 2, time DESC
+    LIMIT 1;
+""")
+
+def _pollutant_composition(station) -> list:
+    """Share of each pollutant's sub-index at a station, as the pie chart expects."""
+    if not station:
+        return []
+    values = {p: np.array([np.nan if station[p] is None else station[p]], dtype=float) for p in aqi_calculator.POLLUTANTS}
+    profile = aqi_calculator.profile_for_source(station["source"]) or {}
+    if profile.get('mode') == 'sub_index':
+        indices = values
+    else:
+        indices = aqi_calculator.sub_indices(values)
+    shares = sorted(((p, float(v[0])) for p, v in indices.items() if np.isfinite(v[0]) and v[0] > 0),
+                    key=lambda item: item[1], reverse=True)
+    total = sum(v for _, v in shares)
+    if not total:
+        return []
+    composition = [{"name": POLLUTANT_LABELS[p][0], "value": round(100 * v / total), "fill": POLLUTANT_LABELS[p][1]}
+                   for p, v in shares[:COMPOSITION_TOP]]
+    other = sum(v for _, v in shares[COMPOSITION_TOP:])
+    if other:
+        composition.append({"name": "Other", "value": round(100 * other / total), "fill": "#9ca3af"})
+    return composition
+
 @app.get("/api/v1/point/details")
-def get_point_details(lat: float, lon: float):
-    return mockLocationForecast
+def get_point_details(lat: float, lon: float, method: str = 'idw', db: Session = Depends(get_db)):
+    """
+    Current conditions and the next hours' forecast at any point. The AQI is
+    interpolated from nearby stations (see interpolation_engine), weather
+    and forecast come from the gridded tables at the nearest grid point.
+    """
+    if method not in interpolation_engine.METHODS:
+        return {"error": f"method must be one of {list(interpolation_engine.METHODS)}"}
+    try:
+        estimate = interpolation_engine.estimate_point(db, lat, lon, ['computed_aqi'], method)['computed_aqi']
+        station = db.execute(_nearest_station_query, {"lat": lat, "lon": lon}).mappings().first()
+
+        now = datetime.now(timezone.utc)
+        weather_lat, weather_lon = (float(v) for v in weather_grid.snap([lat, lon]))
+        weather = db.execute(text("""
+            SELECT temperature_2m, relative_humidity_2m, wind_speed_10m FROM weather_forecasts
+            WHERE latitude = :lat AND longitude = :lon AND time = date_trunc('hour', CAST(:now AS TIMESTAMPTZ), 'UTC');
+        """), {"lat": weather_lat, "lon": weather_lon, "now": now}).mappings().first()
+
+        forecast_lat, forecast_lon = (float(v) for v in weather_grid.snap([lat, lon], FORECAST_GRID_STEP_DEG))
+        forecast = db.execute(text("""
+            SELECT time, us_aqi, utc_offset_seconds FROM aqi_forecasts
+            WHERE latitude = :lat AND longitude = :lon AND time > :now AND us_aqi IS NOT NULL
+            ORDER BY time LIMIT 6;
+        """), {"lat": forecast_lat, "lon": forecast_lon, "now": now}).mappings().all()
+
+        local = timezone(timedelta(seconds=forecast[0]["utc_offset_seconds"])) if forecast else timezone.utc
+        local_now = now.astimezone(local)
+        current_aqi = round(estimate["estimate"]) if estimate else None
+        risk, advice = get_rules().classify([np.nan if current_aqi is None else current_aqi], [0])
+        dominant = station["dominant_pollutant"] if station else None
+
+        return {
+            "placeName": f"Lat: {lat:.2f}, Lon: {lon:.2f}",
+            "date": f"{local_now:%B} {local_now.day}, {local_now.year}",
+            "time": f"{local_now:%I:%M %p}".lstrip("0"),   # not %-I: that is glibc-only
+            "currentAQI": current_aqi,
+            "uncertainty": estimate["uncertainty"] if estimate else None,
+            "method": method,
+            "nearestStationKm": estimate["nearest_km"] if estimate else None,
+            "primaryPollutant": POLLUTANT_LABELS.get(dominant, (dominant,))[0],
+            "healthAdvisory": f"{risk[0]}: {advice[0]}",
+            "weather": {
+                "temp": weather["temperature_2m"] if weather else None,
+                "humidity": weather["relative_humidity_2m"] if weather else None,
+                "wind": weather["wind_speed_10m"] if weather else None,
+            },
+            "pollutantForecast": [
+                {"time": f"{row['time'].astimezone(local):%I %p}".lstrip("0"), "AQI": round(row["us_aqi"])}
+                for row in forecast
+            ],
+            "pollutantComposition": _pollutant_composition(station),
+        }
+    except Exception as e:
+        print(f"Error building point details: {e}")
+        return {"error": "Could not retrieve details for this point."}
+
+@app.get("/api/v1/surface/{variable}/tiles/{z}/{x}/{y}.png")
+def get_surface_tile(variable: str, z: int, x: int, y: int, method: str = 'idw', db: Session = Depends(get_db)):
+    """A tile of the continuous surface interpolated from the latest observations of `variable`."""
+    if method not in interpolation_engine.METHODS:
+        return {"error": f"method must be one of {list(interpolation_engine.METHODS)}"}
+    try:
+        field = interpolation_engine.get_field(db, variable)
+    except ValueError as e:
+        return {"error": str(e)}
+    arr = interpolation_engine.render_surface(field, mercantile.xy_bounds(x, y, z), method=method)
+
+    raster = subsystems.get("raster")
+    if variable == 'computed_aqi':
+        vmin, vmax = 0, 300
+    else:
+        # Stretch over the observations, not the tile, so adjacent tiles match
+        vmin, vmax = np.percentile(field.values, (2, 98)) if len(field) else (0, 1)
+    rgba = raster.colormaps["inferno"](raster.colors.Normalize(vmin=vmin, vmax=vmax, clip=True)(arr))
+    rgba[..., 3][np.isnan(arr)] = 0.0
+    img_bytes = io.BytesIO()
+    raster.image.imsave(img_bytes, rgba, format="png")
+    return Response(content=img_bytes.getvalue(), media_type="image/png",
+                    headers={"Cache-Control": f"public, max-age={interpolation_engine.SNAPSHOT_TTL_S}"})
 
 @app.get("/api/v1/location/name")
-def get_location_name(lat: float, lon: float):
-    if not MAPTILER_API_KEY:
+def get_location_name(lat: float, lon: float, db: Session = Depends(get_db)):
+    """Place name for a point: offline gazetteer and geocode cache first, MapTiler as the fallback."""
+    result = geocoder.reverse_geocode(db, lat, lon)
+    if result is None:
         return {"name": "Location lookup unavailable"}
-    
-    url = f"https://api.maptiler.com/geocoding/{lon},{lat}.json?key={MAPTILER_API_KEY}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        place_name = data['features'][0]['place_name'] if data.get('features') else "Unknown Location"
-        return {"name": place_name}
-    except Exception:
-        return {"name": "Location lookup failed"}
+    return result
 
 @app.post("/api/v1/users/{user_id}/generate_podcast")
 def generate_podcast_for_user(user_id: int):
@@ -304,7 +607,7 @@ def get_live_station_data():
         return {"error": "WAQI API key not configured."}
     
     bounds = "8.0,68.0,37.0,97.0" # Bounding box for India
-    url = f"https://api.waqi.info/map/bounds/?latlng={bounds}&token={WAQI_API_KEY}"
+    url = f"{WAQI_API_URL}/map/bounds/?latlng={bounds}&token={WAQI_API_KEY}"
     
     try:
         response = requests.get(url, timeout=10)
@@ -341,7 +644,7 @@ def get_station_details(station_id: int):
     if not WAQI_API_KEY:
         return {"error": "WAQI API key not configured."}
     
-    url = f"https://api.waqi.info/feed/@{station_id}/?token={WAQI_API_KEY}"
+    url = f"{WAQI_API_URL}/feed/@{station_id}/?token={WAQI_API_KEY}"
     
     try:
         response = requests.get(url, timeout=10)
@@ -400,52 +703,20 @@ def get_simulation_forecast(
 
 # --- (Ensure all your other endpoints like /register, /grid/current, /forecast/point etc. are also in this file) ---
 
-@app.post("/api/v1/reports/submit")
-async def submit_report(
-    lat: float = Form(...),
-    lon: float = Form(...),
-    description: str = Form(...),
-    user_id: int = Form(...),
-    db: Session = Depends(get_db)
-):
-    """
-    Receives a new citizen science report and saves it to the database.
-    """
-    # In a full production app, you would handle an image file here
-    # and upload it to an S3 bucket to get a real URL.
-    image_url_placeholder = "https://placehold.co/600x400/27272a/FFFFFF?text=Report+Image"
-
-    query = text("""
-        INSERT INTO citizen_reports (user_id, latitude, longitude, description, image_url, status)
-        VALUES (:user_id, :lat, :lon, :description, :image_url, 'verified')
-        RETURNING id;
-    """)
-    
-    try:
-        result = db.execute(query, {
-            "user_id": user_id,
-            "lat": lat,
-            "lon": lon,
-            "description": description,
-            "image_url": image_url_placeholder
-        })
-        report_id = result.scalar()
-        db.commit()
-        return {"message": "Report submitted successfully", "report_id": report_id}
-    except Exception as e:
-        db.rollback()
-        # Return a more informative error
-        return {"error": f"Database error: {e}"}
-
 @app.get("/api/v1/reports/verified")
-def get_verified_reports(db: Session = Depends(get_db)):
+def get_verified_reports(bbox: Optional[str] = None, zoom: Optional[float] = None, since: Optional[datetime] = None,
+                         until: Optional[datetime] = None, limit: int = reports_query.DEFAULT_LIMIT,
+                         cursor: Optional[str] = None, db: Session = Depends(get_db)):
     """
-    Returns all verified citizen science reports to be displayed on the map.
+    Verified citizen science reports in the map viewport (bbox =
+    minLon,minLat,maxLon,maxLat) and optional time window. Below
+    CLUSTER_MAX_ZOOM they come back clustered; otherwise newest first, one
+    page at a time (pass `next_cursor` back as `cursor`).
     """
-    query = text("SELECT id, latitude as lat, longitude as lon, description, created_at FROM citizen_reports WHERE status = 'verified' ORDER BY created_at DESC")
     try:
-        reports = db.execute(query).mappings().all()
-        return list(reports)
+        return reports_query.query_reports(db, reports_query.parse_bbox(bbox), zoom, since, until, limit, cursor)
+    except ValueError as e:
+        return {"error": str(e)}
     except Exception as e:
         return {"error": f"Database error: {e}"}
 
@@ -454,6 +725,7 @@ def get_verified_reports(db: Session = Depends(get_db)):
 
 @app.post("/api/v1/reports/submit")
 async def submit_report(
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     lat: float = Form(...), 
     lon: float = Form(...), 
@@ -462,44 +734,42 @@ async def submit_report(
     file: Optional[UploadFile] = File(None)
 ):
     """
-    Receives a new citizen science report, saves the image,
-    and stores the report in the database.
+    Receives a new citizen science report, streams its image to disk and
+    stores the report in the database. Returns as soon as the row exists;
+    the thumbnail and WebP variants are made in the background (see
+    report_media.py).
     """
-    image_url = None
+    digest = original_path = None
     if file and file.filename:
-        file_location = f"uploads/{file.filename}"
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(file.file, file_object)
-        image_url = f"http://127.0.0.1:8000/{file_location}"
+        try:
+            digest, original_path = await report_media.save_upload(file)
+        except report_media.UploadRejected as e:
+            return {"error": str(e)}
 
     query = text("""
-        INSERT INTO citizen_reports (user_id, latitude, longitude, description, image_url, status)
-        VALUES (:user_id, :lat, :lon, :description, :image_url, 'verified')
+        INSERT INTO citizen_reports (user_id, latitude, longitude, description, image_url, image_hash, media_status, status)
+        VALUES (:user_id, :lat, :lon, :description, NULL, :image_hash, :media_status, 'verified')
         RETURNING id;
     """)
     
-    try:
+    def insert():
         result = db.execute(query, {
-            "user_id": user_id, "lat": lat, "lon": lon,
-            "description": description, "image_url": image_url
+            "user_id": user_id, "lat": lat, "lon": lon, "description": description,
+            "image_hash": digest, "media_status": "processing" if digest else "none"
         })
         report_id = result.scalar()
         db.commit()
-        return {"message": "Report submitted successfully", "report_id": report_id}
+        return report_id
+
+    try:
+        report_id = await asyncio.to_thread(insert)
     except Exception as e:
         db.rollback()
         return {"error": str(e)}
-
-@app.get("/api/v1/reports/verified")
-def get_verified_reports(db: Session = Depends(get_db)):
-    """
-    Returns all verified citizen science reports to be displayed on the map.
-    """
-    query = text("SELECT id, latitude as lat, longitude as lon, description, created_at, image_url FROM citizen_reports WHERE status = 'verified' ORDER BY created_at DESC")
-    reports = db.execute(query).mappings().all()
-    return list(reports)
-
-
+    if digest:
+        background_tasks.add_task(report_media.process_in_background, report_id, original_path, digest)
+    return {"message": "Report submitted successfully", "report_id": report_id,
+            "media_status": "processing" if digest else "none"}
 
 @app.get("/api/v1/auth/google")
 def auth_google():
@@ -517,31 +787,37 @@ def generate_podcast_for_user(user_id: int):
         "message": "Podcast generation feature not yet implemented."
     }
 @app.post("/api/v1/context/location")
-def get_unified_location_context(location: Location, db: Session = Depends(get_db)):
+def get_unified_location_context(location: Location, method: str = 'idw', db: Session = Depends(get_db)):
     """
-    Accepts a location and returns a unified object containing the latest
-    air quality from the database and live weather from an external API.
+    Accepts a location and returns a unified object containing the air
+    quality interpolated there from nearby stations and live weather from
+    an external API.
     """
-    # 1. Fetch latest air quality data from our database for the given location
+    # 1. Interpolate the latest air quality at the point from nearby stations
     air_quality_data = None
     try:
-        air_quality_query = text("""
-            SELECT aqi, pm25, pm10, o3, no2, so2, co, source, time
-            FROM air_quality_data
-            WHERE COALESCE(aqi, pm25, pm10, o3, no2, so2, co) IS NOT NULL
-            ORDER BY ST_Distance(ST_MakePoint(longitude, latitude), ST_MakePoint(:lon, :lat))
-            LIMIT 1;
-        """)
-        result = db.execute(air_quality_query, {"lat": location.lat, "lon": location.lon}).mappings().first()
-        if result:
-            air_quality_data = dict(result)
+        estimates = interpolation_engine.estimate_point(db, location.lat, location.lon, method=method)
+        aqi = estimates.get('computed_aqi')
+        if aqi:
+            station = db.execute(_nearest_station_query, {"lat": location.lat, "lon": location.lon}).mappings().first()
+            air_quality_data = {
+                "aqi": aqi["estimate"],
+                "dominant_pollutant": station["dominant_pollutant"] if station else None,
+                **{p: estimates[p]["estimate"] if estimates.get(p) else None for p in aqi_calculator.POLLUTANTS},
+                "source": station["source"] if station else None,
+                "time": interpolation_engine.get_field(db, 'computed_aqi').observed_at,
+                "uncertainty": aqi["uncertainty"],
+                "method": aqi["method"],
+                "nearest_km": aqi["nearest_km"],
+                "neighbours": aqi["neighbours"],
+            }
     except Exception as e:
         print(f"Database Error fetching AQ data: {e}")
 
 
     # 2. Fetch live, real-time weather from Open-Meteo API
     weather_data = {}
-    weather_url = f"https://api.open-meteo.com/v1/forecast?latitude={location.lat}&longitude={location.lon}&current=temperature_2m,relative_humidity_2m,precipitation,wind_speed_10m"
+    weather_url = f"{OPEN_METEO_WEATHER_URL}/v1/forecast?latitude={location.lat}&longitude={location.lon}&current=temperature_2m,relative_humidity_2m,precipitation,wind_speed_10m"
     try:
         response = requests.get(weather_url, timeout=5)
         response.raise_for_status()
@@ -577,7 +853,7 @@ def get_global_station_data():
     
     with requests.Session() as session:
         for station_id in STATION_IDS:
-            url = f"https://api.waqi.info/feed/@{station_id}/?token={WAQI_API_KEY}"
+            url = f"{WAQI_API_URL}/feed/@{station_id}/?token={WAQI_API_KEY}"
             try:
                 response = session.get(url, timeout=10)
                 response.raise_for_status()
@@ -605,24 +881,26 @@ def get_global_station_data():
     
     return global_stations
 
+# The latest TEMPO scan at one resolution level. Rows carry their scanline's
+# time, so "latest" is every row within one scan of the newest timestamp.
+_latest_tempo_grid_query = text("""
+    SELECT
+        latitude as lat,
+        longitude as lon,
+        no2_tropospheric as aqi -- Use 'aqi' as the alias for consistency with the frontend
+    FROM tempo_grid_data
+    WHERE resolution_level = :level
+      AND time > (SELECT MAX(time) FROM tempo_grid_data WHERE resolution_level = :level) - INTERVAL '1 hour';
+""")
+
 @app.get("/api/v1/tempo/no2_grid")
-def get_tempo_no2_grid(db: Session = Depends(get_db)):
+def get_tempo_no2_grid(zoom: Optional[int] = None, db: Session = Depends(get_db)):
     """
-    Fetches the most recent, high-resolution NO2 grid from the dedicated TEMPO table.
+    Fetches the most recent NO2 grid from the dedicated TEMPO table, at the
+    resolution level that suits the map zoom (coarsest when zoom is omitted).
     """
-    # This query finds the most recent timestamp in the tempo_grid_data table
-    # and selects all records that match that timestamp.
-    query = text("""
-        SELECT 
-            latitude as lat,
-            longitude as lon,
-            no2_tropospheric as aqi -- Use 'aqi' as the alias for consistency with the frontend
-        FROM tempo_grid_data
-        WHERE time = (SELECT MAX(time) FROM tempo_grid_data);
-    """)
-    
     try:
-        result = db.execute(query).mappings().all()
+        result = db.execute(_latest_tempo_grid_query, {"level": grid_utils.level_for_zoom(zoom)}).mappings().all()
         return list(result)
     except Exception as e:
         print(f"Error fetching TEMPO grid data: {e}")
@@ -632,31 +910,15 @@ def get_tempo_no2_grid(db: Session = Depends(get_db)):
 # ...
 
 @app.get("/api/v1/location/geocode")
-def geocode_address(address: str):
+def geocode_address(address: str, db: Session = Depends(get_db)):
     """
-    Performs forward geocoding to get coordinates from a place name using MapTiler.
+    Performs forward geocoding to get coordinates from a place name, from the
+    gazetteer or geocode cache when possible and MapTiler otherwise.
     """
-    if not MAPTILER_API_KEY:
-        return {"error": "Geocoding service unavailable."}
-    
-    # URL encode the address to handle spaces and special characters
-    encoded_address = quote(address)
-    
-    url = f"https://api.maptiler.com/geocoding/{encoded_address}.json?key={MAPTILER_API_KEY}"
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get('features'):
-            # The coordinates are in [longitude, latitude] format
-            coordinates = data['features'][0]['center']
-            return {"lon": coordinates[0], "lat": coordinates[1]}
-        else:
-            return {"error": "Location not found."}
-    except Exception as e:
-        print(f"Geocoding Error: {e}")
-        return {"error": "Geocoding lookup failed."}
+    result = geocoder.forward_geocode(db, address)
+    if result is None:
+        return {"error": "Location not found."}
+    return result
 @app.post("/api/v1/users/{user_id}/generate_podcast")
 def generate_podcast_for_user(user_id: int):
     """
@@ -674,43 +936,47 @@ def generate_podcast_for_user(user_id: int):
         "message": "Your personalized audio briefing is being generated."
     }
 @app.get("/api/v1/maps/combined_view")
-def get_combined_map_view(db: Session = Depends(get_db)):
+def get_combined_map_view(hour: Optional[str] = None):
     """
-    Fetches the most recent TEMPO data and the most recent ground-station data
-    and combines them into a single response for a global heatmap.
+    The fused TEMPO + ground-station NO2 surface (see fusion_pipeline.py) as
+    one tiled raster layer: the tile URL for the requested hour (the newest
+    by default), its colour range and calibration, and the hours available.
     """
-    # 1. Get the latest high-resolution TEMPO grid data
-    tempo_query = text("""
-        SELECT 
-            latitude as lat,
-            longitude as lon,
-            no2_tropospheric as aqi
-        FROM tempo_grid_data
-        WHERE time = (SELECT MAX(time) FROM tempo_grid_data);
-    """)
-    
-    # 2. Get the latest ground-station data (from WAQI, OpenAQ, etc.)
-    ground_query = text("""
-        SELECT DISTINCT ON (source)
-            latitude as lat,
-            longitude as lon,
-            COALESCE(aqi, pm25, pm10, o3, no2, so2, co) as aqi
-        FROM air_quality_data
-        WHERE COALESCE(aqi, pm25, pm10, o3, no2, so2, co) IS NOT NULL
-        ORDER BY source, time DESC;
-    """)
-    
-    try:
-        tempo_result = db.execute(tempo_query).mappings().all()
-        ground_result = db.execute(ground_query).mappings().all()
-        
-        # 3. Combine both lists and return
-        combined_data = list(tempo_result) + list(ground_result)
-        return combined_data
-        
-    except Exception as e:
-        print(f"Error fetching combined map data: {e}")
-        return {"error": "Could not retrieve combined data."}
+    index = fusion_pipeline.read_index()
+    if not index["hours"]:
+        return {"error": "No fused surface generated yet; run fusion_pipeline.py."}
+    entry = index["hours"].get(hour) if hour else fusion_pipeline.latest_hour(index)
+    if entry is None:
+        return {"error": f"No fused surface for hour {hour}."}
+    return {
+        "variable": index["variable"],
+        "hour": entry["hour"],
+        "tiles": f"/api/v1/maps/fused/tiles/{{z}}/{{x}}/{{y}}.png?hour={quote(entry['hour'])}",
+        "vmin": entry["vmin"],
+        "vmax": entry["vmax"],
+        "calibration": entry["calibration"],
+        "stations": entry["stations"],
+        "hours": sorted(index["hours"]),
+    }
+
+@app.get("/api/v1/maps/fused/tiles/{z}/{x}/{y}.png")
+def get_fused_tile(z: int, x: int, y: int, hour: Optional[str] = None):
+    entry = fusion_pipeline.read_index()["hours"].get(hour) if hour else fusion_pipeline.latest_hour()
+    if entry is None or not os.path.exists(entry["path"]):
+        return Response(status_code=404)
+    raster = subsystems.get("raster")
+    with raster.rasterio.open(entry["path"]) as src:
+        # The COG is already Web Mercator, so a tile is one (overview-backed) windowed read
+        window = src.window(*mercantile.xy_bounds(x, y, z))
+        data = src.read(1, window=window, out_shape=(256, 256), boundless=True, fill_value=np.nan,
+                        resampling=raster.Resampling.bilinear)
+    norm = raster.colors.Normalize(vmin=entry["vmin"], vmax=entry["vmax"], clip=True)
+    rgba = raster.colormaps["inferno"](norm(data))
+    rgba[..., 3][np.isnan(data)] = 0.0
+    img_bytes = io.BytesIO()
+    raster.image.imsave(img_bytes, rgba, format="png")
+    return Response(content=img_bytes.getvalue(), media_type="image/png",
+                    headers={"Cache-Control": "public, max-age=300"})
 
 @app.get("/api/v1/forecast/point")
 def get_point_forecast(lat: float, lon: float):
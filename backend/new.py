@@ -9,6 +9,7 @@ from scipy.interpolate import griddata
 from rio_cogeo.cogeo import cog_translate
 from rio_cogeo.profiles import cog_profiles
 from rasterio.enums import Resampling
+import granule_access
 
 # --- All the original processing functions ---
 
@@ -105,6 +106,7 @@ if __name__ == "__main__":
     var = None
     time_index = 0
     resolution_deg = 0.01
+    bbox = None   # (lat_min, lon_min, lat_max, lon_max) to regrid only part of the granule
     out_dir = "tempo_output"
 
     if not os.path.exists(nc_path):
@@ -114,28 +116,35 @@ if __name__ == "__main__":
     print(f"Processing file: {nc_path}")
     os.makedirs(out_dir, exist_ok=True)
     
-    # Open the dataset, handling the group structure of TEMPO files
-    try:
-        ds = xr.open_dataset(nc_path, group='product')
-        ds_geo = xr.open_dataset(nc_path, group='geolocation')
-    except (OSError, KeyError):
-        # Fallback if the group structure is different
+    # Open the granule lazily and read only the window we regrid; files
+    # without the TEMPO group structure fall back to xarray.
+    granule = granule_access.open_granule(nc_path)
+    if granule.has('product', var or 'vertical_column_troposphere'):
+        varname = var or 'vertical_column_troposphere'
+        print("Using variable:", varname)
+        lat_var = granule.variable('geolocation', 'latitude')
+        lon_var = granule.variable('geolocation', 'longitude')
+        window = granule.window_for_bbox(lat_var, lon_var, bbox) if bbox else None
+        if bbox and window is None:
+            print(f"Error: no pixels inside {bbox}")
+            exit()
+        da = granule.variable('product', varname).read(window)
+        lat2d, lon2d = lat_var.read(window), lon_var.read(window)
+    else:
+        granule.close()
+        granule = None
         ds = xr.open_dataset(nc_path)
-        ds_geo = ds
-
-    varname = var or find_no2_variable(ds)
-    print("Using variable:", varname)
+        varname = var or find_no2_variable(ds)
+        print("Using variable:", varname)
+        da = extract_2d_array(ds, varname, time_index=time_index)
+        lat2d, lon2d = ds['latitude'].values, ds['longitude'].values
 
-    da = extract_2d_array(ds, varname, time_index=time_index)
-    
-    lat_coord = ds_geo['latitude']
-    lon_coord = ds_geo['longitude']
-    print("Found lat/lon coords:", lat_coord.name, lon_coord.name)
-    
     out_4326 = os.path.join(out_dir, "tempo_no2_4326.tif")
 
     # The TEMPO data uses a 2D swath grid, so we call the correct handler
-    handle_swath_grid(da, lat_coord.values, lon_coord.values, out_4326, resolution_deg=resolution_deg)
+    handle_swath_grid(da, lat2d, lon2d, out_4326, resolution_deg=resolution_deg)
+    if granule is not None:
+        granule.close()
 
     out_3857 = os.path.join(out_dir, "tempo_no2_3857.tif")
     reproject_to_3857(out_4326, out_3857)
@@ -1,9 +1,11 @@
 # /backend/personalization_engine.py
+import numpy as np
+from rules_engine import get_rules
 
 def generate_alert(user_profile: dict, air_quality: dict) -> dict:
     """
     Generates a personalized health alert based on user profile and air quality.
-    
+
     Args:
         user_profile (dict): A dictionary containing user data (e.g., name, health_conditions).
         air_quality (dict): A dictionary containing the latest AQI data.
@@ -18,30 +20,28 @@ def generate_alert(user_profile: dict, air_quality: dict) -> dict:
         }
 
     aqi = air_quality.get('aqi')
-    health_conditions = user_profile.get('health_conditions', [])
-    is_sensitive = any(condition in ['Asthma', 'Allergies', 'Heart Condition', 'Pregnancy'] for condition in health_conditions)
-
     if aqi is None:
         return {"risk_level": "Unknown", "recommendation": "No AQI data available for this location."}
 
-    # --- This is our simple rules engine ---
-    if aqi <= 50:
-        return {"risk_level": "Good", "recommendation": "Air quality is good. It's a great day for outdoor activities!"}
-    
-    elif aqi <= 100:
-        if is_sensitive:
-            return {"risk_level": "Moderate", "recommendation": "Air quality is moderate. Sensitive individuals should consider reducing prolonged outdoor exertion."}
-        else:
-            return {"risk_level": "Moderate", "recommendation": "Air quality is acceptable. Unusually sensitive people should consider reducing outdoor exertion."}
-            
-    elif aqi <= 150:
-        if is_sensitive:
-            return {"risk_level": "High", "recommendation": "Unhealthy for sensitive groups. Limit your time outdoors and avoid strenuous activities."}
-        else:
-            return {"risk_level": "Moderate", "recommendation": "Members of sensitive groups may experience health effects. The general public is not likely to be affected."}
-
-    else: # aqi > 150
-        if is_sensitive:
-            return {"risk_level": "Very High", "recommendation": "Health alert: everyone may experience more serious health effects. You should avoid all outdoor exertion."}
-        else:
-            return {"risk_level": "High", "recommendation": "Health alert: the risk of health effects is increased for everyone. Avoid prolonged outdoor exertion."}
\ No newline at end of file
+    # --- The rules themselves live in the alert_rules table (see rules_engine.py) ---
+    rules = get_rules()
+    mask = rules.condition_mask(user_profile.get('health_conditions'))
+    risk_levels, recommendations = rules.classify([aqi], [mask])
+    return {"risk_level": risk_levels[0], "recommendation": recommendations[0]}
+
+
+# --- Batch Versions ---
+# Used by the alert and exposure engines to score every user in one pass.
+
+def is_sensitive(health_conditions) -> bool:
+    """`users.health_conditions` comes back from the DB as a JSON string or a list."""
+    rules = get_rules()
+    return bool(rules.is_sensitive(rules.condition_mask(health_conditions)))
+
+def classify_batch(aqi: np.ndarray, condition_masks: np.ndarray):
+    """
+    Vectorized generate_alert over arrays of AQI values and health-condition
+    bitmasks (see rules_engine.CompiledRules.condition_masks). Returns
+    (risk_levels, recommendations); entries with a NaN AQI are "Unknown".
+    """
+    return get_rules().classify(aqi, condition_masks)
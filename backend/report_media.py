@@ -0,0 +1,179 @@
+# /backend/report_media.py
+"""
+Citizen report images: non-blocking uploads, content-addressed storage and
+resized WebP variants.
+
+`save_upload` streams an UploadFile to disk in UPLOAD_CHUNK_BYTES chunks.
+Each write goes to a thread, so the event loop never blocks on disk. The
+file is hashed on the way and stored as originals/<sha256>.<ext>, so the
+same photo uploaded twice is stored once. User-supplied names never reach
+the filesystem.
+
+`process_in_background` hands the original to a process pool. The pool
+writes a THUMBNAIL_PX thumbnail and a DISPLAY_PX display copy, both WebP,
+then records their URLs on the report. The request that uploaded the image
+has returned long before. Variants already on disk (a duplicate upload)
+are reused without decoding anything.
+
+    uploads/originals/<sha>.jpg   as uploaded (not linked from the map)
+    uploads/display/<sha>.webp    report detail view
+    uploads/thumbs/<sha>.webp     map markers / lists
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import text
+
+# --- CONFIGURATION ---
+MEDIA_DIR = "uploads"                       # mounted at /uploads by main.py
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://127.0.0.1:8000")
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+THUMBNAIL_PX = 256                          # longest side
+DISPLAY_PX = 1280
+WEBP_QUALITY = 80
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+
+# Leading bytes of the image formats we accept -> stored extension
+IMAGE_SIGNATURES = [(b"\xff\xd8\xff", "jpg"), (b"\x89PNG\r\n\x1a\n", "png"), (b"GIF8", "gif"), (b"RIFF", "webp")]
+VARIANTS = {"thumbs": THUMBNAIL_PX, "display": DISPLAY_PX}
+
+ADD_REPORT_MEDIA_COLUMNS_SQL = [
+    "ALTER TABLE citizen_reports ADD COLUMN IF NOT EXISTS image_hash CHAR(64);",
+    "ALTER TABLE citizen_reports ADD COLUMN IF NOT EXISTS thumbnail_url VARCHAR(255);",
+    # none (no image) -> processing -> ready | failed
+    "ALTER TABLE citizen_reports ADD COLUMN IF NOT EXISTS media_status VARCHAR(20) NOT NULL DEFAULT 'none';",
+]
+
+
+class UploadRejected(ValueError):
+    """The upload is not an accepted image or is too large."""
+
+
+def _path(kind: str, digest: str, ext: str = "webp") -> str:
+    return os.path.join(MEDIA_DIR, kind, f"{digest}.{ext}")
+
+def public_url(path: str) -> str:
+    return f"{PUBLIC_BASE_URL}/{path.replace(os.sep, '/')}"
+
+def _sniff_extension(head: bytes):
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            if ext == "webp" and head[8:12] != b"WEBP":
+                continue
+            return ext
+    return None
+
+
+async def save_upload(upload) -> tuple:
+    """
+    Streams a FastAPI UploadFile to originals/<sha256>.<ext>.
+    Returns (digest, path); raises UploadRejected for non-images and oversized files.
+    """
+    originals = os.path.join(MEDIA_DIR, "originals")
+    os.makedirs(originals, exist_ok=True)
+    tmp_path = os.path.join(originals, f".{uuid.uuid4().hex}.part")
+    digest, size, ext = hashlib.sha256(), 0, None
+    try:
+        with open(tmp_path, "wb") as out:
+            while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+                if ext is None:
+                    ext = _sniff_extension(chunk[:16])
+                    if ext is None:
+                        raise UploadRejected("Only JPEG, PNG, GIF and WebP images are accepted.")
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadRejected(f"Images are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+        if ext is None:
+            raise UploadRejected("The uploaded file is empty.")
+        digest = digest.hexdigest()
+        path = _path("originals", digest, ext)
+        if os.path.exists(path):
+            os.remove(tmp_path)          # identical image already stored
+        else:
+            os.replace(tmp_path, path)
+        return digest, path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def variants_ready(digest: str) -> bool:
+    return all(os.path.exists(_path(kind, digest)) for kind in VARIANTS)
+
+def make_variants(original_path: str, digest: str) -> dict:
+    """Worker: writes the WebP variants of one image. Returns {kind: path}."""
+    from PIL import Image, ImageOps
+
+    paths = {}
+    with Image.open(original_path) as image:
+        image = ImageOps.exif_transpose(image)      # phone photos carry their rotation in EXIF
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        for kind, max_px in VARIANTS.items():
+            path = _path(kind, digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            variant = image.copy()
+            variant.thumbnail((max_px, max_px), Image.Resampling.LANCZOS)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            variant.save(tmp_path, format="WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(tmp_path, path)
+            paths[kind] = path
+    return paths
+
+
+_pool = None
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: workers must not inherit the server's sockets and database connections
+        _pool = ProcessPoolExecutor(max_workers=MEDIA_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+_mark_ready_sql = text("""
+    UPDATE citizen_reports SET image_url = :image_url, thumbnail_url = :thumbnail_url, media_status = 'ready'
+    WHERE id = :report_id;
+""")
+
+def _record(report_id: int, paths: dict = None):
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        if paths:
+            db.execute(_mark_ready_sql, {"report_id": report_id, "image_url": public_url(paths["display"]),
+                                         "thumbnail_url": public_url(paths["thumbs"])})
+        else:
+            db.execute(text("UPDATE citizen_reports SET media_status = 'failed' WHERE id = :report_id;"),
+                       {"report_id": report_id})
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Could not record media for report {report_id}: {e}")
+    finally:
+        db.close()
+
+def process_in_background(report_id: int, original_path: str, digest: str):
+    """Queues the variants of a report's image; the report row is updated when they exist."""
+    if variants_ready(digest):
+        _record(report_id, {kind: _path(kind, digest) for kind in VARIANTS})
+        return
+
+    def done(future):
+        try:
+            _record(report_id, future.result())
+        except Exception as e:
+            print(f"❌ Image processing failed for report {report_id}: {e}")
+            _record(report_id)
+
+    _get_pool().submit(make_variants, original_path, digest).add_done_callback(done)
+
+def shutdown():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,106 @@
+# /backend/reports_query.py
+"""
+Viewport queries over verified citizen reports.
+
+`citizen_reports.geom` is a stored generated Point column (kept in step
+with latitude/longitude by Postgres itself). Two partial indexes cover
+only the verified rows the map reads:
+
+- GiST on geom for the bounding-box test (`geom && envelope`), and
+- B-tree on (created_at DESC, id DESC) for the time window and keyset
+  pagination.
+
+At zoom >= CLUSTER_MAX_ZOOM the query returns individual reports, newest
+first, in pages of `limit`. `next_cursor` is an opaque token encoding the
+last (created_at, id), so each further page is an index range scan rather
+than an OFFSET. Below that zoom, reports are grouped in SQL into grid
+cells about CLUSTER_CELL_PX screen pixels wide. The response then has
+one row per occupied cell, however many reports there are.
+"""
+import base64
+from datetime import datetime
+from sqlalchemy import text
+
+# --- CONFIGURATION ---
+CLUSTER_MAX_ZOOM = 10          # below this zoom the map gets clusters
+CLUSTER_CELL_PX = 64
+TILE_PX = 256
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+WORLD_BBOX = (-180.0, -90.0, 180.0, 90.0)
+
+CREATE_REPORTS_INDEXES_SQL = [
+    """ALTER TABLE citizen_reports ADD COLUMN IF NOT EXISTS geom GEOMETRY(Point, 4326)
+       GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)) STORED;""",
+    """CREATE INDEX IF NOT EXISTS idx_citizen_reports_verified_geom
+       ON citizen_reports USING GIST (geom) WHERE status = 'verified';""",
+    """CREATE INDEX IF NOT EXISTS idx_citizen_reports_verified_created
+       ON citizen_reports (created_at DESC, id DESC) WHERE status = 'verified';""",
+]
+
+
+def parse_bbox(bbox: str = None) -> tuple:
+    """'minLon,minLat,maxLon,maxLat' -> floats (the whole world when omitted)."""
+    if not bbox:
+        return WORLD_BBOX
+    values = tuple(float(v) for v in bbox.split(","))
+    if len(values) != 4:
+        raise ValueError("bbox must be minLon,minLat,maxLon,maxLat")
+    return values
+
+def encode_cursor(created_at: datetime, report_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{report_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    created_at, report_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(created_at), int(report_id)
+
+def cluster_cell_deg(zoom: float) -> float:
+    """Cell width in degrees that is CLUSTER_CELL_PX wide on screen at this zoom."""
+    return 360.0 / (2 ** zoom) * CLUSTER_CELL_PX / TILE_PX
+
+
+_FILTERS = """
+    status = 'verified'
+    AND geom && ST_MakeEnvelope(:min_lon, :min_lat, :max_lon, :max_lat, 4326)
+    AND (CAST(:since AS TIMESTAMPTZ) IS NULL OR created_at >= :since)
+    AND (CAST(:until AS TIMESTAMPTZ) IS NULL OR created_at < :until)
+"""
+
+_page_sql = text(f"""
+    SELECT id, latitude AS lat, longitude AS lon, description, created_at, thumbnail_url
+    FROM citizen_reports
+    WHERE {_FILTERS}
+      AND (CAST(:cursor_time AS TIMESTAMPTZ) IS NULL OR (created_at, id) < (:cursor_time, :cursor_id))
+    ORDER BY created_at DESC, id DESC
+    LIMIT :limit;
+""")
+
+_clusters_sql = text(f"""
+    SELECT COUNT(*) AS count, AVG(latitude) AS lat, AVG(longitude) AS lon,
+           MAX(created_at) AS latest, MAX(id) AS sample_id
+    FROM citizen_reports
+    WHERE {_FILTERS}
+    GROUP BY floor(longitude / :cell), floor(latitude / :cell);
+""")
+
+
+def query_reports(db, bbox=WORLD_BBOX, zoom: float = None, since: datetime = None, until: datetime = None,
+                  limit: int = DEFAULT_LIMIT, cursor: str = None) -> dict:
+    """Verified reports (or clusters of them at low zoom) in bbox and [since, until)."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    params = {"min_lon": min_lon, "min_lat": min_lat, "max_lon": max_lon, "max_lat": max_lat,
+              "since": since, "until": until}
+
+    if zoom is not None and zoom < CLUSTER_MAX_ZOOM:
+        params["cell"] = cluster_cell_deg(zoom)
+        rows = db.execute(_clusters_sql, params).mappings().all()
+        return {"type": "clusters", "zoom": zoom, "items": [dict(row) for row in rows], "next_cursor": None}
+
+    limit = max(1, min(limit, MAX_LIMIT))
+    cursor_time, cursor_id = decode_cursor(cursor) if cursor else (None, None)
+    rows = db.execute(_page_sql, {**params, "cursor_time": cursor_time, "cursor_id": cursor_id,
+                                  "limit": limit + 1}).mappings().all()
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"]) if len(rows) > limit else None
+    return {"type": "reports", "zoom": zoom, "items": items, "next_cursor": next_cursor}
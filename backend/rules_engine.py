@@ -0,0 +1,167 @@
+# /backend/rules_engine.py
+"""
+Data-driven alert rules.
+
+The AQI breakpoints, risk levels and recommendations live in the
+`alert_rules` table and the health conditions that make someone
+"sensitive" live in `health_condition_rules`, so both can be edited
+without a code change. They are compiled into:
+
+- a sorted array of AQI upper bounds plus (band x audience) lookup tables,
+  so a whole batch is classified with one np.searchsorted, and
+- one bit per known health condition, so sensitivity is a bitwise AND.
+
+Compiled rules are cached per process for RULES_CACHE_TTL_S. If the
+tables are missing or empty, DEFAULT_RULES / DEFAULT_CONDITIONS are used.
+"""
+import json
+import threading
+import time
+import numpy as np
+from sqlalchemy import text
+
+# --- CONFIGURATION ---
+RULES_CACHE_TTL_S = 300
+
+# (upper AQI bound, audience, risk level, recommendation); None = no upper bound.
+DEFAULT_RULES = [
+    (50, 'general', "Good", "Air quality is good. It's a great day for outdoor activities!"),
+    (50, 'sensitive', "Good", "Air quality is good. It's a great day for outdoor activities!"),
+    (100, 'general', "Moderate", "Air quality is acceptable. Unusually sensitive people should consider reducing outdoor exertion."),
+    (100, 'sensitive', "Moderate", "Air quality is moderate. Sensitive individuals should consider reducing prolonged outdoor exertion."),
+    (150, 'general', "Moderate", "Members of sensitive groups may experience health effects. The general public is not likely to be affected."),
+    (150, 'sensitive', "High", "Unhealthy for sensitive groups. Limit your time outdoors and avoid strenuous activities."),
+    (None, 'general', "High", "Health alert: the risk of health effects is increased for everyone. Avoid prolonged outdoor exertion."),
+    (None, 'sensitive', "Very High", "Health alert: everyone may experience more serious health effects. You should avoid all outdoor exertion."),
+]
+# (condition name, counts as sensitive)
+DEFAULT_CONDITIONS = [
+    ('Asthma', True),
+    ('Allergies', True),
+    ('Heart Condition', True),
+    ('Pregnancy', True),
+]
+
+UNKNOWN_RISK = "Unknown"
+UNKNOWN_RECOMMENDATION = "No AQI data available for this location."
+AUDIENCES = ('general', 'sensitive')
+
+CREATE_RULES_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS alert_rules (
+        max_aqi DOUBLE PRECISION NOT NULL,       -- 'Infinity' for the open-ended top band
+        audience VARCHAR(20) NOT NULL CHECK (audience IN ('general', 'sensitive')),
+        risk_level VARCHAR(20) NOT NULL,
+        recommendation TEXT NOT NULL,
+        PRIMARY KEY (max_aqi, audience)
+    );
+
+    CREATE TABLE IF NOT EXISTS health_condition_rules (
+        condition VARCHAR(100) PRIMARY KEY,
+        is_sensitive BOOLEAN NOT NULL DEFAULT TRUE
+    );
+"""
+
+
+class CompiledRules:
+    def __init__(self, rules, conditions):
+        bounds = sorted({float('inf') if r[0] is None else float(r[0]) for r in rules})
+        self.breakpoints = np.array(bounds[:-1])   # the last band is open-ended
+        self.risk_table = np.full((len(bounds), len(AUDIENCES)), UNKNOWN_RISK, dtype=object)
+        self.message_table = np.full((len(bounds), len(AUDIENCES)), UNKNOWN_RECOMMENDATION, dtype=object)
+        for max_aqi, audience, risk_level, recommendation in rules:
+            band = bounds.index(float('inf') if max_aqi is None else float(max_aqi))
+            self.risk_table[band, AUDIENCES.index(audience)] = risk_level
+            self.message_table[band, AUDIENCES.index(audience)] = recommendation
+
+        self.condition_bits = {name: 1 << i for i, (name, _) in enumerate(conditions)}
+        self.sensitive_mask = 0
+        for name, sensitive in conditions:
+            if sensitive:
+                self.sensitive_mask |= self.condition_bits[name]
+
+    def condition_mask(self, health_conditions) -> int:
+        """Bitmask of a user's known conditions; accepts a list or the JSON text stored in the DB."""
+        if isinstance(health_conditions, str):
+            try:
+                health_conditions = json.loads(health_conditions)
+            except ValueError:
+                health_conditions = [health_conditions]
+        mask = 0
+        for condition in health_conditions or []:
+            mask |= self.condition_bits.get(condition, 0)
+        return mask
+
+    def condition_masks(self, health_conditions_list) -> np.ndarray:
+        return np.fromiter((self.condition_mask(c) for c in health_conditions_list),
+                           dtype=np.int64, count=len(health_conditions_list))
+
+    def is_sensitive(self, masks):
+        return (np.asarray(masks, dtype=np.int64) & self.sensitive_mask) != 0
+
+    def classify(self, aqi, masks):
+        """
+        Classifies a batch: returns (risk_levels, recommendations) object arrays.
+        NaN AQI values come back as "Unknown".
+        """
+        aqi = np.asarray(aqi, dtype=float)
+        band = np.searchsorted(self.breakpoints, aqi, side='left')
+        band = np.minimum(band, len(self.risk_table) - 1)
+        audience = self.is_sensitive(masks).astype(int)
+        risk_levels = self.risk_table[band, audience]
+        recommendations = self.message_table[band, audience]
+        unknown = np.isnan(aqi)
+        risk_levels[unknown] = UNKNOWN_RISK
+        recommendations[unknown] = UNKNOWN_RECOMMENDATION
+        return risk_levels, recommendations
+
+
+_lock = threading.Lock()
+_compiled = None   # (loaded_at, CompiledRules)
+
+def load_rules_from_db(db):
+    rules = [
+        (None if np.isinf(r[0]) else r[0], r[1], r[2], r[3])
+        for r in db.execute(text("SELECT max_aqi, audience, risk_level, recommendation FROM alert_rules;")).all()
+    ]
+    conditions = [tuple(r) for r in db.execute(text(
+        "SELECT condition, is_sensitive FROM health_condition_rules ORDER BY condition;"
+    )).all()]
+    return rules, conditions
+
+def get_rules(refresh: bool = False) -> CompiledRules:
+    """Returns the compiled rules, reloading them from the DB at most once per TTL."""
+    global _compiled
+    cached = _compiled
+    if cached and not refresh and time.monotonic() - cached[0] < RULES_CACHE_TTL_S:
+        return cached[1]
+
+    with _lock:
+        rules, conditions = DEFAULT_RULES, DEFAULT_CONDITIONS
+        try:
+            from database import SessionLocal
+            db = SessionLocal()
+            try:
+                db_rules, db_conditions = load_rules_from_db(db)
+            finally:
+                db.close()
+            rules = db_rules or rules
+            conditions = db_conditions or conditions
+        except Exception as e:
+            print(f"Could not load alert rules from the database, using defaults: {e}")
+        _compiled = (time.monotonic(), CompiledRules(rules, conditions))
+        return _compiled[1]
+
+def seed_default_rules(db):
+    """Inserts the default rules and conditions without overwriting edited ones."""
+    db.execute(text("""
+        INSERT INTO alert_rules (max_aqi, audience, risk_level, recommendation)
+        VALUES (:max_aqi, :audience, :risk_level, :recommendation)
+        ON CONFLICT (max_aqi, audience) DO NOTHING;
+    """), [{"max_aqi": float('inf') if m is None else m, "audience": a, "risk_level": r, "recommendation": rec}
+           for m, a, r, rec in DEFAULT_RULES])
+    db.execute(text("""
+        INSERT INTO health_condition_rules (condition, is_sensitive)
+        VALUES (:condition, :is_sensitive)
+        ON CONFLICT (condition) DO NOTHING;
+    """), [{"condition": c, "is_sensitive": s} for c, s in DEFAULT_CONDITIONS])
+    db.commit()
@@ -0,0 +1,170 @@
+# /backend/schema_registry.py
+"""
+Process-wide cache of table columns and per-pollutant data availability.
+
+Column lists are reflected once and kept until a migration calls
+`refresh_schema()`. Pollutant availability lives in the small
+`pollutant_availability` table, which ingestors keep up to date through
+`record_ingested_rows()`, so readers never scan `air_quality_data`.
+"""
+import threading
+import time
+import numpy as np
+from sqlalchemy import text, inspect
+from database import engine
+
+# --- CONFIGURATION ---
+POLLUTANT_COLUMNS = ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
+SCHEMA_CACHE_TTL_S = 600       # safety net for migrations run from another process
+AVAILABILITY_CACHE_TTL_S = 30  # how stale /pollutants/available may be
+
+# rows_ingested is cumulative: the table's row count at the last rebuild plus
+# every row written since, so a re-ingested reading is counted again.
+CREATE_AVAILABILITY_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS pollutant_availability (
+        pollutant TEXT PRIMARY KEY,
+        first_seen TIMESTAMPTZ,
+        last_seen TIMESTAMPTZ,
+        rows_ingested BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ DEFAULT NOW()
+    );
+"""
+
+_lock = threading.Lock()
+_columns = {}          # table name -> (loaded_at, [column names])
+_availability = None   # (loaded_at, {pollutant: {...}})
+
+
+# --- Column Metadata ---
+
+def get_columns(table_name: str) -> list:
+    """Returns the column names of `table_name`, reflecting at most once per TTL."""
+    cached = _columns.get(table_name)
+    if cached and time.monotonic() - cached[0] < SCHEMA_CACHE_TTL_S:
+        return cached[1]
+    with _lock:
+        names = [col['name'] for col in inspect(engine).get_columns(table_name)]
+        _columns[table_name] = (time.monotonic(), names)
+    return names
+
+def refresh_schema():
+    """Drops all cached metadata. Call after any ALTER/CREATE TABLE."""
+    global _availability
+    with _lock:
+        _columns.clear()
+        _availability = None
+
+
+# --- Pollutant Availability ---
+
+_record_availability_sql = text("""
+    INSERT INTO pollutant_availability (pollutant, first_seen, last_seen, rows_ingested, updated_at)
+    SELECT :pollutant, MIN(t), MAX(t), COUNT(*), NOW()
+    FROM unnest(CAST(:times AS TIMESTAMPTZ[])) AS t
+    ON CONFLICT (pollutant) DO UPDATE SET
+        first_seen = LEAST(pollutant_availability.first_seen, EXCLUDED.first_seen),
+        last_seen = GREATEST(pollutant_availability.last_seen, EXCLUDED.last_seen),
+        rows_ingested = pollutant_availability.rows_ingested + EXCLUDED.rows_ingested,
+        updated_at = NOW();
+""")
+
+_record_availability_columns_sql = text("""
+    INSERT INTO pollutant_availability (pollutant, first_seen, last_seen, rows_ingested, updated_at)
+    VALUES (:pollutant, :first_seen, :last_seen, :rows_ingested, NOW())
+    ON CONFLICT (pollutant) DO UPDATE SET
+        first_seen = LEAST(pollutant_availability.first_seen, EXCLUDED.first_seen),
+        last_seen = GREATEST(pollutant_availability.last_seen, EXCLUDED.last_seen),
+        rows_ingested = pollutant_availability.rows_ingested + EXCLUDED.rows_ingested,
+        updated_at = NOW();
+""")
+
+def record_ingested_rows(db, records: list):
+    """
+    Folds a batch of just-written `air_quality_data` records into the
+    availability table. Runs on the ingestor's session so it commits (or
+    rolls back) together with the data. `rows_ingested` counts rows written,
+    so re-ingesting the same reading counts it again.
+    """
+    times_by_pollutant = {}
+    for record in records:
+        for pollutant in POLLUTANT_COLUMNS:
+            if record.get(pollutant) is not None:
+                times_by_pollutant.setdefault(pollutant, []).append(str(record['time']))
+
+    for pollutant, times in times_by_pollutant.items():
+        db.execute(_record_availability_sql, {"pollutant": pollutant, "times": times})
+
+def _utc(value):
+    """NumPy datetimes carry no zone and are UTC throughout this codebase."""
+    import pandas as pd  # ingest-only; kept out of the API's import path
+    ts = pd.Timestamp(value)
+    return (ts.tz_localize('UTC') if ts.tzinfo is None else ts).to_pydatetime()
+
+def record_ingested_columns(db, times, columns: dict):
+    """
+    Columnar counterpart of record_ingested_rows for batches built as arrays:
+    `times` is one array and `columns` maps column name -> values of the same
+    length. Aggregates in NumPy and sends one small upsert per pollutant.
+    """
+    import pandas as pd
+    times = np.asarray(times)
+    for pollutant in POLLUTANT_COLUMNS:
+        if pollutant not in columns:
+            continue
+        present = ~pd.isna(np.asarray(columns[pollutant]))
+        count = int(present.sum())
+        if count == 0:
+            continue
+        seen = times[present]
+        db.execute(_record_availability_columns_sql, {
+            "pollutant": pollutant, "first_seen": _utc(seen.min()),
+            "last_seen": _utc(seen.max()), "rows_ingested": count,
+        })
+
+def rebuild_availability(db):
+    """Recomputes the availability table from scratch with one full scan per pollutant."""
+    columns = get_columns('air_quality_data')
+    db.execute(text("DELETE FROM pollutant_availability;"))
+    for pollutant in POLLUTANT_COLUMNS:
+        if pollutant not in columns:
+            continue
+        db.execute(text(f"""
+            INSERT INTO pollutant_availability (pollutant, first_seen, last_seen, rows_ingested, updated_at)
+            SELECT :pollutant, MIN(time), MAX(time), COUNT(*), NOW()
+            FROM air_quality_data WHERE {pollutant} IS NOT NULL
+            HAVING COUNT(*) > 0;
+        """), {"pollutant": pollutant})
+    db.commit()
+    refresh_schema()
+
+def get_availability(db) -> dict:
+    """
+    Returns {pollutant: {first_seen, last_seen, rows_ingested}} for every
+    pollutant with data, served from memory for AVAILABILITY_CACHE_TTL_S.
+    rows_ingested is cumulative (see CREATE_AVAILABILITY_TABLE_SQL), not
+    the number of distinct rows currently stored.
+    """
+    global _availability
+    cached = _availability
+    if cached and time.monotonic() - cached[0] < AVAILABILITY_CACHE_TTL_S:
+        return cached[1]
+
+    rows = db.execute(text("""
+        SELECT pollutant, first_seen, last_seen, rows_ingested
+        FROM pollutant_availability WHERE rows_ingested > 0;
+    """)).mappings().all()
+    availability = {
+        row['pollutant']: {
+            "first_seen": row['first_seen'],
+            "last_seen": row['last_seen'],
+            "rows_ingested": row['rows_ingested'],
+        }
+        for row in rows
+    }
+    _availability = (time.monotonic(), availability)
+    return availability
+
+def get_available_pollutants(db) -> list:
+    """Upper-cased pollutant names that have at least one reading, in display order."""
+    availability = get_availability(db)
+    return [p.upper() for p in POLLUTANT_COLUMNS if p in availability]
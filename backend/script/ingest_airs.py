@@ -1,10 +1,10 @@
 # /backend/scripts/ingest_airs.py
-import h5py
 import numpy as np
 import os
 from sqlalchemy import text
 from database import SessionLocal
-from tqdm import tqdm
+import schema_registry
+import granule_access
 
 # --- IMPORTANT ---
 # Change this to the exact name of the file you downloaded
@@ -15,79 +15,63 @@ FILE_PATH = os.path.join("data", FILE_NAME)
 # In a real-time system, this would be extracted dynamically
 TIMESTAMP = "2025-09-28T07:35:21Z"
 
+SWATH = "/HDFEOS/SWATHS/L2_Standard_atmospheric&surface_product"
+DATA_FIELDS = f"{SWATH}/Data Fields"
+GEO_FIELDS = f"{SWATH}/Geolocation Fields"
+
 def process_airs_file():
     if not os.path.exists(FILE_PATH):
         print(f"Error: Data file not found at {FILE_PATH}")
-        return
+        return None
 
     print(f"Opening AIRS HDF file: {FILE_PATH}")
     db = SessionLocal()
 
     try:
-        # Open the HDF file for reading
-        with h5py.File(FILE_PATH, 'r') as f:
-            # Navigate the internal file structure to get to the data
-            # This path is standard for AIRS L2 files
-            data_fields = f['/HDFEOS/SWATHS/L2_Standard_atmospheric&surface_product/Data Fields/']
-            geo_fields = f['/HDFEOS/SWATHS/L2_Standard_atmospheric&surface_product/Geolocation Fields/']
-
-            # Extract the data arrays we need (Latitude, Longitude, and Total CO)
-            co_data_raw = data_fields['TotCO_A'][:]
-            latitude = geo_fields['Latitude'][:]
-            longitude = geo_fields['Longitude'][:]
-
-            # Get the metadata needed to convert the raw values to real units
-            # HDF files store this as "attributes" on the dataset
-            attrs = data_fields['TotCO_A'].attrs
-            fill_value = attrs['_FillValue'][0]
-            scale_factor = attrs['scale_factor'][0]
-            add_offset = attrs['add_offset'][0]
-
-        print("Preparing records for bulk insert...")
-        records_to_insert = []
-
-        # Loop through the 2D data grid
-        for lat_idx in tqdm(range(latitude.shape[0]), desc="Processing AIRS Data"):
-            for lon_idx in range(latitude.shape[1]):
-                co_raw = co_data_raw[lat_idx, lon_idx]
-
-                # Skip invalid data points using the fill value from the metadata
-                if co_raw == fill_value:
-                    continue
-
+        # Navigate the internal file structure to get to the data
+        # This path is standard for AIRS L2 files
+        with granule_access.open_granule(FILE_PATH) as granule:
+            co_data = granule.variable(DATA_FIELDS, 'TotCO_A')
+            latitude = granule.variable(GEO_FIELDS, 'Latitude')
+            longitude = granule.variable(GEO_FIELDS, 'Longitude')
+
+            # Get the metadata needed to convert the raw values to real units.
+            # Fill values already come back as NaN from the granule layer.
+            scale_factor = co_data.attrs['scale_factor']
+            add_offset = co_data.attrs['add_offset']
+
+            print("Preparing records for bulk insert...")
+            records_to_insert = []
+            for rows, co_raw in co_data.iter_row_blocks():
+                lat = latitude[rows]
+                lon = longitude[rows]
+                # Skip fill values and invalid coordinates
+                valid = ~np.isnan(co_raw) & ~np.isnan(lat) & ~np.isnan(lon)
                 # Apply the formula to get the real scientific value
-                co_value = (co_raw - add_offset) * scale_factor
-                lat = float(latitude[lat_idx, lon_idx])
-                lon = float(longitude[lat_idx, lon_idx])
-
-                # Skip if coordinates are also invalid
-                if np.isnan(lat) or np.isnan(lon):
-                    continue
-
-                records_to_insert.append({
-                    "time": TIMESTAMP,
-                    "lat": lat,
-                    "lon": lon,
-                    "source": "NASA-AIRS",
-                    "value": co_value
-                })
+                co_values = (co_raw[valid] - add_offset) * scale_factor
+                records_to_insert.extend(
+                    {"time": TIMESTAMP, "lat": la, "lon": lo, "source": "NASA-AIRS", "co": co}
+                    for la, lo, co in zip(lat[valid].tolist(), lon[valid].tolist(), co_values.tolist())
+                )
 
         if not records_to_insert:
             print("No valid records found in the file to insert.")
-            return
+            return 0
 
         print(f"\nList prepared with {len(records_to_insert)} records. Executing bulk insert...")
 
         insert_query = text("""
             INSERT INTO air_quality_data (time, latitude, longitude, source, co)
-            VALUES (:time, :lat, :lon, :source, :value)
-            ON CONFLICT (time, latitude, longitude) DO UPDATE SET co = :value;
+            VALUES (:time, :lat, :lon, :source, :co)
+            ON CONFLICT (time, latitude, longitude) DO UPDATE SET co = EXCLUDED.co;
         """)
         
         db.execute(insert_query, records_to_insert)
+        schema_registry.record_ingested_rows(db, records_to_insert)
         db.commit()
         
         print(f"✅ Successfully processed and inserted/updated {len(records_to_insert)} CO records from the AIRS file.")
+        return len(records_to_insert)
 
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -2,6 +2,9 @@ import requests
 import os
 from sqlalchemy import text
 from database import SessionLocal
+import schema_registry
+import aqi_calculator
+import analytics_store
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 
@@ -34,11 +37,11 @@ def fetch_and_store_india_data():
 
         if data.get('status') != 'ok':
             print(f"API returned an error: {data.get('message', 'Unknown error')}")
-            return
+            return None
 
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data: {e}")
-        return
+        return None
 
     db = SessionLocal()
     
@@ -54,7 +57,7 @@ def fetch_and_store_india_data():
 
         if lat is None or lon is None:
             print("Skipping station due to missing coordinates.")
-            return
+            return 0
 
         # Create a single record dictionary to hold all pollutant data
         record_to_insert = {
@@ -73,6 +76,9 @@ def fetch_and_store_india_data():
                 except (ValueError, TypeError):
                     continue
 
+        # WAQI "iaqi" values are per-pollutant sub-indices, not concentrations
+        aqi_calculator.annotate_records([record_to_insert], mode='sub_index')
+
         # Dynamically build the SQL query based on the pollutants we found
         columns = record_to_insert.keys() - {'lat', 'lon'}
         db_cols_str = ", ".join(columns)
@@ -86,9 +92,12 @@ def fetch_and_store_india_data():
         """)
         
         db.execute(insert_query, record_to_insert)
+        schema_registry.record_ingested_rows(db, [record_to_insert])
         db.commit()
+        analytics_store.append_station_records([record_to_insert])
         
         print(f"✅ Successfully inserted/updated data for {station_data.get('city', {}).get('name')}.")
+        return 1
 
     except Exception as e:
         print(f"An error occurred during database insertion: {e}")
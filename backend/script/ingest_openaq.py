@@ -1,7 +1,13 @@
 import requests
 import os
-from sqlalchemy import text
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from database import SessionLocal
+import schema_registry
+import aqi_calculator
+import bulk_writer
+import analytics_store
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,77 +15,143 @@ load_dotenv()
 # --- CORRECTED URL ---
 # This URL uses a lat/lon/radius search over Central Europe, a very data-rich area,
 # which is a more stable way to query the API.
-OPENAQ_API_URL = "https://api.openaq.org/v2/measurements?limit=1000&page=1&offset=0&sort=desc&radius=1000000&lat=50.1109&lon=8.6821&order_by=datetime"
+OPENAQ_API_URL = os.getenv("OPENAQ_API_URL", "https://api.openaq.org") + "/v2/measurements"
+OPENAQ_QUERY = {
+    "sort": "desc", "radius": 1000000, "lat": 50.1109, "lon": 8.6821, "order_by": "datetime",
+}
 
 API_KEY = os.getenv("OPENAQ_API_KEY")
 
-def fetch_and_store_openaq_data():
+# --- CONFIGURATION ---
+PAGE_SIZE = 1000
+MAX_PAGES = 100                 # 100k measurements per run
+MAX_CONCURRENT_REQUESTS = 4
+ACCEPTED_PARAMS = ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
+
+COLUMN_TYPES = {
+    "time": "TIMESTAMPTZ", "latitude": "DOUBLE PRECISION", "longitude": "DOUBLE PRECISION",
+    "source": "TEXT", "computed_aqi": "DOUBLE PRECISION", "dominant_pollutant": "TEXT",
+    **{p: "DOUBLE PRECISION" for p in ACCEPTED_PARAMS},
+}
+
+
+def fetch_page(page: int, date_from=None) -> list:
+    params = {**OPENAQ_QUERY, "limit": PAGE_SIZE, "page": page}
+    if date_from:
+        params["date_from"] = date_from
+    response = requests.get(OPENAQ_API_URL, params=params, headers={"X-API-Key": API_KEY}, timeout=30)
+    response.raise_for_status()
+    return response.json().get('results') or []
+
+
+def fetch_all_pages(date_from=None) -> list:
+    """
+    Fetches pages in concurrent waves of MAX_CONCURRENT_REQUESTS until a
+    short page shows the results are exhausted (or MAX_PAGES is reached).
+    """
+    results = []
+    page = 1
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as pool:
+        while page <= MAX_PAGES:
+            wave = range(page, min(page + MAX_CONCURRENT_REQUESTS, MAX_PAGES + 1))
+            pages = list(pool.map(lambda p: fetch_page(p, date_from), wave))
+            for page_results in pages:
+                results.extend(page_results)
+            if any(len(p) < PAGE_SIZE for p in pages):
+                break
+            page = wave[-1] + 1
+    return results
+
+
+def measurements_to_frame(measurements: list) -> pd.DataFrame:
+    """One row per measurement with columns time, lat, lon, parameter, value, unit."""
+    df = pd.json_normalize(measurements)
+    needed = ['parameter', 'value', 'unit', 'date.utc', 'coordinates.latitude', 'coordinates.longitude']
+    if df.empty or any(col not in df.columns for col in needed):
+        return pd.DataFrame(columns=['time', 'lat', 'lon', 'parameter', 'value', 'unit'])
+    df = df[needed].rename(columns={
+        'date.utc': 'time', 'coordinates.latitude': 'lat', 'coordinates.longitude': 'lon'
+    })
+    df = df[df['parameter'].isin(ACCEPTED_PARAMS)].dropna(subset=['time', 'lat', 'lon', 'value'])
+    df['time'] = pd.to_datetime(df['time'], utc=True)
+    df['value'] = pd.to_numeric(df['value'], errors='coerce')
+    return df.dropna(subset=['value'])
+
+
+def pivot_to_sites(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pivots measurements into one wide row per (time, lat, lon). Values are
+    stored in aqi_calculator's canonical units (µg/m³ for PM, ppb for gases,
+    ppm for CO), whatever unit each station reports, so the stored columns
+    and the AQI computed from them agree.
+    """
+    # Unit conversion is vectorized per (parameter, unit) group
+    df = df.copy()
+    df['canonical'] = np.nan
+    for (param, unit), group in df.groupby(['parameter', 'unit']):
+        try:
+            df.loc[group.index, 'canonical'] = aqi_calculator.to_canonical_units(param, group['value'].to_numpy(), unit)
+        except ValueError:
+            pass   # unknown unit: not stored, since it can't be compared with anything else
+
+    keys = ['time', 'lat', 'lon']
+    wide = df.dropna(subset=['canonical']).pivot_table(index=keys, columns='parameter', values='canonical',
+                                                       aggfunc='last')
+    wide = wide.reindex(columns=ACCEPTED_PARAMS)
+
+    aqi, dominant = aqi_calculator.compute_aqi({p: wide[p].to_numpy() for p in ACCEPTED_PARAMS})
+    wide['computed_aqi'] = aqi
+    wide['dominant_pollutant'] = dominant
+    return wide.reset_index()
+
+
+def fetch_and_store_openaq_data(date_from=None):
     """
-    Fetches the latest data from OpenAQ and stores it in the database.
+    Fetches the latest data from OpenAQ and stores it in the database, one
+    wide row per site and time written with a single bulk upsert.
     """
     print("Fetching latest air quality data from OpenAQ...")
-    
-    headers = {
-        "X-API-Key": API_KEY
-    }
-    
+
     try:
-        response = requests.get(OPENAQ_API_URL, headers=headers)
-        response.raise_for_status()
-        data = response.json()
+        measurements = fetch_all_pages(date_from)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data from OpenAQ: {e}")
-        return
+        return None
+
+    if not measurements:
+        print("API did not return any results.")
+        return 0
+
+    print(f"Found {len(measurements)} measurements. Processing...")
+    df = measurements_to_frame(measurements)
+    sites = pivot_to_sites(df)
+    skipped_count = len(measurements) - len(df)
 
     db = SessionLocal()
-    insert_count = 0
-    skipped_count = 0
-    
     try:
-        if not data.get('results'):
-             print("API did not return any results.")
-             return
-
-        print(f"Found {len(data['results'])} measurements. Processing...")
-        
-        for measurement in data['results']:
-            param = measurement.get('parameter')
-            
-            if not measurement.get('coordinates') or not param:
-                skipped_count += 1
-                continue
-
-            latitude = measurement['coordinates']['latitude']
-            longitude = measurement['coordinates']['longitude']
-            value = measurement['value']
-            last_updated = measurement['date']['utc']
-            
-            if param in ['pm25', 'no2', 'o3', 'pm10', 'so2', 'co']:
-                insert_query = text(f"""
-                    INSERT INTO air_quality_data (time, latitude, longitude, source, {param})
-                    VALUES (:time, :lat, :lon, :source, :value)
-                    ON CONFLICT (time, latitude, longitude) DO UPDATE SET {param} = :value;
-                """)
-                
-                db.execute(insert_query, {
-                    "time": last_updated,
-                    "lat": latitude,
-                    "lon": longitude,
-                    "source": "OpenAQ",
-                    "value": value
-                })
-                insert_count += 1
-            else:
-                skipped_count += 1
+        # Only non-null values overwrite, so pollutants missing from this
+        # batch keep whatever an earlier run stored for the same site/time.
+        columns = {
+            "time": sites['time'], "latitude": sites['lat'], "longitude": sites['lon'],
+            "source": ["OpenAQ"] * len(sites),
+            **{p: sites[p] for p in ACCEPTED_PARAMS},
+            "computed_aqi": sites['computed_aqi'], "dominant_pollutant": sites['dominant_pollutant'],
+        }
+        written = bulk_writer.upsert_columns(db, "air_quality_data", columns, COLUMN_TYPES,
+                                             conflict_columns=["time", "latitude", "longitude"], on_conflict='coalesce')
 
+        schema_registry.record_ingested_columns(db, sites['time'].to_numpy(), {p: sites[p] for p in ACCEPTED_PARAMS})
         db.commit()
-        print(f"Successfully processed records. Inserted/Updated: {insert_count}. Skipped: {skipped_count}.")
+        analytics_store.append_stations(columns)
+        print(f"Successfully processed records. Inserted/Updated: {written} sites from {len(df)} measurements. Skipped: {skipped_count}.")
+        return written
 
     except Exception as e:
         print(f"An error occurred during database insertion: {e}")
         db.rollback()
+        return None
     finally:
         db.close()
 
 if __name__ == "__main__":
-    fetch_and_store_openaq_data()
\ No newline at end of file
+    fetch_and_store_openaq_data()
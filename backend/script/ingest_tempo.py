@@ -1,104 +1,146 @@
-import xarray as xr
+import argparse
 import os
 import numpy as np
-from sqlalchemy import text
 from database import SessionLocal
-from tqdm import tqdm
+import bulk_writer
+import grid_utils
+import granule_access
+import analytics_store
 
 # --- CONFIGURATION ---
 # Update this to the exact name of the file you have downloaded
 FILE_NAME = "TEMPO_NO2_L2_V03_20250916T214329Z_S012G07.nc"
 FILE_PATH = os.path.join("data", FILE_NAME)
-DOWNSAMPLE_FACTOR = 10
+# Every granule is stored at each of these block sizes; resolution_level is
+# the block size, so level 1 is full detail (see grid_utils.level_for_zoom).
+RESOLUTION_LEVELS = grid_utils.TEMPO_RESOLUTION_LEVELS
+REDUCE_METHOD = os.getenv("TEMPO_REDUCE_METHOD", "mean")   # or 'median'
+FILL_VALUE_THRESHOLD = -1e10
 
-def process_tempo_file_to_grid():
+COLUMN_TYPES = {
+    "resolution_level": "SMALLINT", "time": "TIMESTAMPTZ",
+    "latitude": "DOUBLE PRECISION", "longitude": "DOUBLE PRECISION",
+    "no2_tropospheric": "DOUBLE PRECISION", "terrain_height": "DOUBLE PRECISION",
+    "surface_pressure": "DOUBLE PRECISION", "quality_flag": "INTEGER",
+}
+
+# tempo_grid_data gains a resolution_level key. Rows written before this are
+# labelled level 1; the primary key is only rebuilt if it lacks the column.
+TEMPO_RESOLUTION_SQL = [
+    "ALTER TABLE tempo_grid_data ADD COLUMN IF NOT EXISTS resolution_level SMALLINT NOT NULL DEFAULT 1;",
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_constraint c
+            JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY(c.conkey)
+            WHERE c.conname = 'tempo_grid_data_pkey' AND a.attname = 'resolution_level'
+        ) THEN
+            ALTER TABLE tempo_grid_data DROP CONSTRAINT IF EXISTS tempo_grid_data_pkey;
+            ALTER TABLE tempo_grid_data ADD CONSTRAINT tempo_grid_data_pkey
+                PRIMARY KEY (resolution_level, time, latitude, longitude);
+        END IF;
+    END $$;
+    """,
+]
+
+
+def build_levels(latitude, longitude, time_data, no2_data, quality_flag, terrain_height, surface_pressure,
+                 levels=RESOLUTION_LEVELS, method=REDUCE_METHOD):
+    """
+    Reduces a block of scanlines to every resolution level. Only pixels with quality
+    flag 0 and a real NO2 value contribute to a block, and blocks without
+    any such pixel are dropped. Returns {column: 1D array} for all levels.
+    """
+    no2_data = np.asarray(no2_data, dtype=float)
+    valid = (np.asarray(quality_flag) == 0) & np.isfinite(no2_data) & (no2_data >= FILL_VALUE_THRESHOLD)
+    valid &= np.isfinite(latitude) & np.isfinite(longitude)
+    fields = {
+        "latitude": latitude, "longitude": longitude, "no2_tropospheric": no2_data,
+        "terrain_height": terrain_height, "surface_pressure": surface_pressure,
+    }
+
+    parts = {name: [] for name in COLUMN_TYPES}
+    for level in levels:
+        reduced = {name: grid_utils.block_reduce(values, level, valid, method) for name, values in fields.items()}
+        rows, cols = np.nonzero(grid_utils.block_count(valid, level) > 0)
+        times = grid_utils.reduce_rows(time_data, level)[rows]
+
+        parts["resolution_level"].append(np.full(len(rows), level, dtype=np.int16))
+        parts["time"].append(times)
+        for name, values in reduced.items():
+            parts[name].append(values[rows, cols])
+        # Only flag-0 pixels were kept, so every stored block is flag 0.
+        parts["quality_flag"].append(np.zeros(len(rows), dtype=np.int32))
+
+    return {name: np.concatenate(arrays) for name, arrays in parts.items()}
+
+
+def process_tempo_file_to_grid(levels=RESOLUTION_LEVELS, method=REDUCE_METHOD):
     if not os.path.exists(FILE_PATH):
         print(f"Error: Data file not found at {FILE_PATH}")
-        return
-        
+        return None
+
     print(f"Opening TEMPO file for grid ingestion: {FILE_PATH}")
     db = SessionLocal()
-    
+
     try:
-        # Open the different groups within the file based on your confirmed structure
-        ds_geo = xr.open_dataset(FILE_PATH, group='geolocation')
-        ds_prod = xr.open_dataset(FILE_PATH, group='product')
-        ds_support = xr.open_dataset(FILE_PATH, group='support_data')
-
-        # Extract data using the correct variable names
-        latitude = ds_geo['latitude'].values
-        longitude = ds_geo['longitude'].values
-        time_data = ds_geo['time'].values
-        no2_data = ds_prod['vertical_column_troposphere'].values
-        quality_flag = ds_prod['main_data_quality_flag'].values
-        terrain_height = ds_support['terrain_height'].values
-        surface_pressure = ds_support['surface_pressure'].values
-        
-        print("Preparing records for bulk insert (downsampled)...")
-        records_to_insert = []
-
-        for lat_idx in tqdm(range(0, latitude.shape[0], DOWNSAMPLE_FACTOR), desc="Processing Scanlines"):
-            time_for_scanline = np.datetime_as_string(time_data[lat_idx])
-            for lon_idx in range(0, latitude.shape[1], DOWNSAMPLE_FACTOR):
-                
-                # Safely check the quality flag
-                q_flag_raw = quality_flag[lat_idx, lon_idx]
-                if np.isnan(q_flag_raw):
-                    continue
-                
-                q_flag = int(q_flag_raw)
-                if q_flag != 0:
-                    continue
-
-                no2_value = float(no2_data[lat_idx, lon_idx])
-                if np.isnan(no2_value) or no2_value < -1e10:
-                    continue
-
-                records_to_insert.append({
-                    "time": time_for_scanline,
-                    "lat": float(latitude[lat_idx, lon_idx]),
-                    "lon": float(longitude[lat_idx, lon_idx]),
-                    "no2_tropospheric": no2_value,
-                    "terrain_height": float(terrain_height[lat_idx, lon_idx]),
-                    "surface_pressure": float(surface_pressure[lat_idx, lon_idx]),
-                    "quality_flag": q_flag
-                })
-
-        if not records_to_insert:
+        granule = granule_access.open_granule(FILE_PATH)
+        variables = [
+            granule.variable('geolocation', 'latitude'), granule.variable('geolocation', 'longitude'),
+            granule.read_times('geolocation', 'time'),
+            granule.variable('product', 'vertical_column_troposphere'),
+            granule.variable('product', 'main_data_quality_flag'),
+            granule.variable('support_data', 'terrain_height'),
+            granule.variable('support_data', 'surface_pressure'),
+        ]
+
+        # Stream blocks of scanlines that are a multiple of the coarsest level,
+        # so no reduction block straddles two batches.
+        coarsest = max(levels)
+        rows_per_batch = -(-granule_access.CHUNK_ROWS // coarsest) * coarsest
+        n_scan = variables[0].shape[0]
+        print(f"Reducing granule to resolution levels {list(levels)} ({method}), {rows_per_batch} scanlines at a time...")
+
+        n_rows = 0
+        per_level = dict.fromkeys(levels, 0)
+        full_detail = []    # level-1 cells, for the analytics cube
+        for start in range(0, n_scan, rows_per_batch):
+            rows = slice(start, min(start + rows_per_batch, n_scan))
+            columns = build_levels(*(var[rows] for var in variables), levels=levels, method=method)
+            if len(columns["time"]) == 0:
+                continue
+            for level in levels:
+                per_level[level] += int(np.sum(columns["resolution_level"] == level))
+            level_1 = columns["resolution_level"] == 1
+            full_detail.append({name: columns[name][level_1] for name in ("time", "latitude", "longitude", "no2_tropospheric")})
+            n_rows += bulk_writer.upsert_columns(db, "tempo_grid_data", columns, COLUMN_TYPES,
+                                                 conflict_columns=["resolution_level", "time", "latitude", "longitude"])
+
+        if n_rows == 0:
             print("No valid, high-quality records found to insert.")
-            return
-
-        print(f"\nList prepared with {len(records_to_insert)} records. Executing bulk insert...")
-
-        # --- THIS IS THE FIX ---
-        # The full, correct SQL INSERT statement is now here.
-        insert_query = text("""
-            INSERT INTO tempo_grid_data (
-                time, latitude, longitude, no2_tropospheric, terrain_height, 
-                surface_pressure, quality_flag
-            )
-            VALUES (
-                :time, :lat, :lon, :no2_tropospheric, :terrain_height, 
-                :surface_pressure, :quality_flag
-            )
-            ON CONFLICT (time, latitude, longitude) DO UPDATE SET 
-                no2_tropospheric = EXCLUDED.no2_tropospheric,
-                quality_flag = EXCLUDED.quality_flag;
-        """)
-        
-        db.execute(insert_query, records_to_insert)
+            return 0
+
         db.commit()
-        
-        print(f"✅ Successfully ingested {len(records_to_insert)} records into 'tempo_grid_data'.")
+        analytics_store.append_tempo({name: np.concatenate([part[name] for part in full_detail])
+                                      for name in full_detail[0]})
+        for level, count in per_level.items():
+            print(f"  level {level}: {count} cells")
+        print(f"✅ Successfully ingested {n_rows} records into 'tempo_grid_data'.")
+        return n_rows
 
     except Exception as e:
         print(f"An error occurred: {e}")
         db.rollback()
+        return None
     finally:
         if 'db' in locals() and db.is_active: db.close()
-        if 'ds_geo' in locals(): ds_geo.close()
-        if 'ds_prod' in locals(): ds_prod.close()
-        if 'ds_support' in locals(): ds_support.close()
+        if 'granule' in locals(): granule.close()
 
 if __name__ == "__main__":
-    process_tempo_file_to_grid()
+    parser = argparse.ArgumentParser(description="Ingest a TEMPO NO2 granule at several resolutions.")
+    parser.add_argument("--method", choices=["mean", "median"], default=REDUCE_METHOD)
+    parser.add_argument("--levels", default=",".join(str(l) for l in RESOLUTION_LEVELS),
+                        help="comma-separated block sizes, e.g. 1,4,16,64")
+    args = parser.parse_args()
+    process_tempo_file_to_grid([int(l) for l in args.levels.split(",")], args.method)
@@ -1,85 +1,193 @@
 import requests
 import os
+import time
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import text
 from database import SessionLocal
+import aqi_calculator
+import analytics_store
 from dotenv import load_dotenv
 from datetime import datetime, timezone # <-- 1. New import for generating timestamps
 
 load_dotenv()
 
 API_KEY = os.getenv("WAQI_API_KEY")
-API_URL = f"https://api.waqi.info/map/bounds/?latlng=8.0,68.0,37.0,97.0&token={API_KEY}"
+WAQI_API_URL = os.getenv("WAQI_API_URL", "https://api.waqi.info")
 
-def fetch_and_store_waqi_data():
+# --- CONFIGURATION ---
+# (lat_min, lon_min, lat_max, lon_max); add regions to cover more countries in one run.
+REGIONS = {
+    "India": (8.0, 68.0, 37.0, 97.0),
+}
+TILE_SIZE_DEG = 10.0          # large boxes are split so each request stays small
+MAX_CONCURRENT_REQUESTS = 4   # stays well inside WAQI's per-token rate limit
+MAX_RETRIES = 3
+
+# Last station timestamp we stored, so unchanged stations are not rewritten.
+CREATE_STATION_STATE_SQL = """
+    CREATE TABLE IF NOT EXISTS waqi_station_state (
+        station_uid INTEGER PRIMARY KEY,
+        last_seen TIMESTAMPTZ NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+"""
+
+
+def split_into_tiles(bbox, tile_size=TILE_SIZE_DEG):
+    """Splits a (lat_min, lon_min, lat_max, lon_max) box into tiles of at most tile_size degrees."""
+    lat_min, lon_min, lat_max, lon_max = bbox
+    tiles = []
+    lat = lat_min
+    while lat < lat_max:
+        lon = lon_min
+        while lon < lon_max:
+            tiles.append((lat, lon, min(lat + tile_size, lat_max), min(lon + tile_size, lon_max)))
+            lon += tile_size
+        lat += tile_size
+    return tiles
+
+
+def fetch_tile(tile):
+    """Fetches the stations inside one tile, backing off when WAQI rate-limits us."""
+    url = f"{WAQI_API_URL}/map/bounds/?latlng={tile[0]},{tile[1]},{tile[2]},{tile[3]}&token={API_KEY}"
+    for attempt in range(MAX_RETRIES):
+        try:
+            response = requests.get(url, timeout=15)
+            if response.status_code == 429:
+                time.sleep(2 ** attempt)
+                continue
+            response.raise_for_status()
+            data = response.json()
+            if data.get('status') != 'ok':
+                print(f"API returned an error for tile {tile}: {data.get('message', data.get('data', 'Unknown error'))}")
+                return []
+            return data.get('data', [])
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching tile {tile}: {e}")
+            time.sleep(2 ** attempt)
+    return []
+
+
+def fetch_stations(regions=None):
+    tiles = [tile for bbox in (regions or REGIONS).values() for tile in split_into_tiles(bbox)]
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as pool:
+        results = list(pool.map(fetch_tile, tiles))
+    print(f"Fetched {len(tiles)} tiles.")
+    return [station for tile_stations in results for station in tile_stations]
+
+
+def to_records(stations):
+    """One record per station; tiles overlap on their edges, so duplicates are dropped."""
+    records = {}
+    seen_points = set()
+    for station in stations:
+        # The map endpoint reports the update time under station.time
+        timestamp = (station.get('station') or {}).get('time') or (station.get('time') or {}).get('s')
+
+        # --- 2. THE FIX ---
+        # If the station has no timestamp, use the current time as a fallback.
+        if not timestamp:
+            timestamp = datetime.now(timezone.utc).isoformat()
+
+        try:
+            aqi_value = int(station.get('aqi'))
+        except (ValueError, TypeError):
+            continue # Still skip stations with invalid AQI values
+
+        point = (timestamp, station.get('lat'), station.get('lon'))
+        if station.get('uid') in records or point in seen_points:
+            continue
+        seen_points.add(point)
+        records[station.get('uid')] = {
+            "uid": station.get('uid'),
+            "time": timestamp,
+            "lat": station.get('lat'),
+            "lon": station.get('lon'),
+            "source": "WAQI",
+            "aqi": aqi_value
+        }
+    return list(records.values())
+
+
+# Change detection and the upsert run as one statement: only stations whose
+# timestamp moved past the stored last_seen are written.
+_incremental_upsert_sql = text("""
+    WITH incoming AS (
+        SELECT * FROM unnest(
+            CAST(:uids AS INTEGER[]), CAST(:times AS TIMESTAMPTZ[]),
+            CAST(:lats AS DOUBLE PRECISION[]), CAST(:lons AS DOUBLE PRECISION[]),
+            CAST(:aqis AS INTEGER[]), CAST(:computed AS DOUBLE PRECISION[]), CAST(:dominants AS TEXT[])
+        ) AS t(uid, time, latitude, longitude, aqi, computed_aqi, dominant_pollutant)
+    ),
+    changed AS (
+        SELECT i.* FROM incoming i
+        LEFT JOIN waqi_station_state s ON s.station_uid = i.uid
+        WHERE :full_refresh OR s.last_seen IS NULL OR i.time > s.last_seen
+    ),
+    state AS (
+        INSERT INTO waqi_station_state (station_uid, last_seen)
+        SELECT uid, time FROM changed
+        ON CONFLICT (station_uid) DO UPDATE SET last_seen = EXCLUDED.last_seen, updated_at = NOW()
+    ),
+    written AS (
+        INSERT INTO air_quality_data (time, latitude, longitude, source, aqi, computed_aqi, dominant_pollutant)
+        SELECT time, latitude, longitude, 'WAQI', aqi, computed_aqi, dominant_pollutant FROM changed
+        ON CONFLICT (time, latitude, longitude) DO UPDATE SET
+            aqi = EXCLUDED.aqi, computed_aqi = EXCLUDED.computed_aqi,
+            dominant_pollutant = EXCLUDED.dominant_pollutant
+        RETURNING time, latitude, longitude, aqi, computed_aqi, dominant_pollutant
+    )
+    SELECT * FROM written;
+""")
+
+
+def fetch_and_store_waqi_data(regions=None, incremental: bool = True) -> Optional[int]:
+    """
+    Fetches every station in `regions` (default REGIONS) and upserts the
+    ones that changed since the last run. Pass incremental=False to rewrite
+    all of them. Returns the number of rows written, or None if the write failed.
+    """
     if not API_KEY:
         raise ValueError("WAQI_API_KEY not found. Please add it to your .env file.")
 
-    print(f"Fetching data from WAQI API for India...")
+    print(f"Fetching data from WAQI API for {', '.join(regions or REGIONS)}...")
+    stations = fetch_stations(regions)
+    print(f"Found {len(stations)} stations. Processing...")
 
-    try:
-        response = requests.get(API_URL)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get('status') != 'ok':
-            print(f"API returned an error: {data.get('message', 'Unknown error')}")
-            return
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data: {e}")
-        return
+    records_to_insert = to_records(stations)
+    if not records_to_insert:
+        print("No valid station data found to insert.")
+        return 0
+
+    # The map endpoint only reports the overall index, which is already a WAQI AQI.
+    aqi_calculator.annotate_records(records_to_insert, mode='sub_index')
 
     db = SessionLocal()
-    
     try:
-        stations = data.get('data', [])
-        print(f"Found {len(stations)} stations. Processing...")
-
-        records_to_insert = []
-        for station in stations:
-            # First, try to get the real timestamp from the station data
-            timestamp = station.get('time', {}).get('s')
-            
-            # --- 2. THE FIX ---
-            # If the station has no timestamp, use the current time as a fallback.
-            if not timestamp:
-                timestamp = datetime.now(timezone.utc).isoformat()
-
-            try:
-                aqi_value = int(station.get('aqi'))
-            except (ValueError, TypeError):
-                continue # Still skip stations with invalid AQI values
-
-            records_to_insert.append({
-                "time": timestamp,
-                "lat": station.get('lat'),
-                "lon": station.get('lon'),
-                "source": "WAQI",
-                "aqi": aqi_value
-            })
-        
-        if not records_to_insert:
-            print("No valid station data found to insert.")
-            return
-            
-        print(f"Preparing to insert/update {len(records_to_insert)} valid records...")
-
-        insert_query = text("""
-            INSERT INTO air_quality_data (time, latitude, longitude, source, aqi)
-            VALUES (:time, :lat, :lon, :source, :aqi)
-            ON CONFLICT (time, latitude, longitude) DO UPDATE SET aqi = :aqi;
-        """)
-        
-        db.execute(insert_query, records_to_insert)
+        rows = db.execute(_incremental_upsert_sql, {
+            "uids": [r["uid"] for r in records_to_insert],
+            "times": [r["time"] for r in records_to_insert],
+            "lats": [r["lat"] for r in records_to_insert],
+            "lons": [r["lon"] for r in records_to_insert],
+            "aqis": [r["aqi"] for r in records_to_insert],
+            "computed": [r["computed_aqi"] for r in records_to_insert],
+            "dominants": [r["dominant_pollutant"] for r in records_to_insert],
+            "full_refresh": not incremental,
+        }).mappings().all()
         db.commit()
-        
-        print(f"✅ Successfully processed and inserted/updated {len(records_to_insert)} records from WAQI.")
+        written = len(rows)
+        analytics_store.append_station_records([{**row, "source": "WAQI"} for row in rows])
+
+        print(f"✅ {written} of {len(records_to_insert)} WAQI stations changed and were inserted/updated.")
+        return written
 
     except Exception as e:
         print(f"An error occurred during database insertion: {e}")
         db.rollback()
+        return None
     finally:
         db.close()
 
 if __name__ == "__main__":
-    fetch_and_store_waqi_data()
\ No newline at end of file
+    fetch_and_store_waqi_data()
@@ -1,79 +1,64 @@
+import argparse
+import os
 import requests
-from sqlalchemy import text
 from database import SessionLocal
+import weather_grid
+import analytics_store
 
-# We'll fetch a 7-day forecast for a central point in India (New Delhi)
-# as this is where our other data is centered.
+# Single-point mode keeps the original behaviour: New Delhi, where our
+# other data is centered. Stations mode (the default) covers the grid point
+# nearest to every air-quality location; grid mode adds every point of
+# weather_grid.GRID_BBOX, which at 0.5° is ~3,500 locations per run and
+# needs a paid Open-Meteo quota at the daemon's 3-hour interval.
 LATITUDE = 28.61
 LONGITUDE = 77.20
-API_URL = f"https://api.open-meteo.com/v1/forecast?latitude={LATITUDE}&longitude={LONGITUDE}&hourly=temperature_2m,relative_humidity_2m,precipitation,wind_speed_10m"
+WEATHER_MODE = os.getenv("WEATHER_MODE", "stations")
 
-def fetch_and_store_weather_forecast():
+def fetch_and_store_weather_forecast(mode: str = WEATHER_MODE):
     """
-    Fetches hourly weather forecast data from Open-Meteo and stores it in the database.
+    Fetches hourly weather from Open-Meteo and upserts it into weather_forecasts.
+    mode is 'grid' (bbox grid + station cells), 'stations' or 'point'.
     """
-    print("Fetching weather forecast data from Open-Meteo...")
-
-    try:
-        response = requests.get(API_URL)
-        response.raise_for_status()
-        data = response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching weather data: {e}")
-        return
-
     db = SessionLocal()
-    
     try:
-        hourly_data = data.get('hourly', {})
-        times = hourly_data.get('time', [])
-        temperatures = hourly_data.get('temperature_2m', [])
-        humidities = hourly_data.get('relative_humidity_2m', [])
-        precipitations = hourly_data.get('precipitation', [])
-        wind_speeds = hourly_data.get('wind_speed_10m', [])
-
-        if not times:
-            print("API did not return any time data. Cannot process.")
-            return
+        if mode == 'point':
+            points = [(LATITUDE, LONGITUDE)]
+        else:
+            points = set(weather_grid.station_points(db))
+            if mode == 'grid':
+                points.update(weather_grid.grid_points())
+            points = sorted(points)
+        if not points:
+            print("No locations to fetch weather for.")
+            return 0
 
-        records_to_insert = []
-        for i in range(len(times)):
-            records_to_insert.append({
-                "time": times[i],
-                "lat": LATITUDE,
-                "lon": LONGITUDE,
-                "temp": temperatures[i],
-                "humidity": humidities[i],
-                "precip": precipitations[i],
-                "wind": wind_speeds[i]
-            })
+        print(f"Fetching weather forecast data from Open-Meteo for {len(points)} locations...")
+        try:
+            columns = weather_grid.fetch_weather(points)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching weather data: {e}")
+            return None
 
-        if not records_to_insert:
-            print("No forecast data found to insert.")
-            return
-
-        print(f"Preparing to insert {len(records_to_insert)} hourly forecast records...")
+        if len(columns["time"]) == 0:
+            print("API did not return any time data. Cannot process.")
+            return 0
 
-        # Clear any old forecast data from the table before inserting new data
-        print("Clearing old weather forecast data...")
-        db.execute(text("DELETE FROM weather_forecasts;"))
-        
-        insert_query = text("""
-            INSERT INTO weather_forecasts (time, latitude, longitude, temperature_2m, relative_humidity_2m, precipitation, wind_speed_10m)
-            VALUES (:time, :lat, :lon, :temp, :humidity, :precip, :wind)
-        """)
-        
-        db.execute(insert_query, records_to_insert)
+        print(f"Preparing to upsert {len(columns['time'])} hourly weather records...")
+        written = weather_grid.store_weather(db, columns)
         db.commit()
-        
-        print(f"✅ Successfully inserted {len(records_to_insert)} weather forecast records.")
+        analytics_store.append_weather(columns)
+
+        print(f"✅ Successfully upserted {written} weather forecast records.")
+        return written
 
     except Exception as e:
         print(f"An error occurred during database insertion: {e}")
         db.rollback()
+        return None
     finally:
         db.close()
 
 if __name__ == "__main__":
-    fetch_and_store_weather_forecast()
-
+    parser = argparse.ArgumentParser(description="Ingest hourly weather into weather_forecasts.")
+    parser.add_argument("--mode", choices=["grid", "stations", "point"], default=WEATHER_MODE)
+    fetch_and_store_weather_forecast(parser.parse_args().mode)
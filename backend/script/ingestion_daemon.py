@@ -0,0 +1,291 @@
+"""
+Runs every ingestion source on its own schedule in one long-lived process.
+
+Each source is a plugin: a name, a blocking `run()` callable (the existing
+ingest scripts) and its scheduling policy. Sources run concurrently in
+worker threads via asyncio.to_thread, so they all share the single
+SQLAlchemy engine/pool from database.py instead of each script opening
+its own. Sources that hit the same upstream API share a rate-limit group.
+
+A run's `run()` returns the number of rows written, 0 when there was
+nothing new, or None when it failed; failures and exceptions are retried
+with exponential backoff. Every attempt is recorded in `ingestion_runs`,
+which /api/v1/health/ingestion reads to report per-source lag.
+
+Usage (from backend/):
+    python -m script.ingestion_daemon                 # run forever
+    python -m script.ingestion_daemon --once          # one pass over every source
+    python -m script.ingestion_daemon --only waqi,openaq
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from sqlalchemy import text
+from database import SessionLocal
+
+# --- CONFIGURATION ---
+DEFAULT_MAX_RETRIES = 3
+BACKOFF_BASE_S = 5
+BACKOFF_MAX_S = 300
+
+CREATE_INGESTION_RUNS_SQL = """
+    CREATE TABLE IF NOT EXISTS ingestion_runs (
+        id BIGSERIAL PRIMARY KEY,
+        source VARCHAR(50) NOT NULL,
+        started_at TIMESTAMPTZ NOT NULL,
+        finished_at TIMESTAMPTZ NOT NULL,
+        attempt INTEGER NOT NULL,
+        rows_written INTEGER,
+        status VARCHAR(20) NOT NULL,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_ingestion_runs_source_started ON ingestion_runs (source, started_at DESC);
+"""
+
+
+class RateLimiter:
+    """Enforces a minimum spacing between run starts for sources sharing an upstream API."""
+
+    def __init__(self, min_interval_s: float):
+        self.min_interval_s = min_interval_s
+        self._lock = asyncio.Lock()
+        self._last_start = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            wait = self._last_start + self.min_interval_s - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_start = time.monotonic()
+
+
+class IngestionSource:
+    """A schedulable ingestion plugin."""
+
+    def __init__(self, name, run, interval_s, jitter_s=0, rate_group=None, max_retries=DEFAULT_MAX_RETRIES):
+        self.name = name
+        self.run = run
+        self.interval_s = interval_s
+        self.jitter_s = jitter_s
+        self.rate_group = rate_group
+        self.max_retries = max_retries
+        # Metrics
+        self.runs = 0
+        self.failures = 0
+        self.rows_total = 0
+        self.last_rows = None
+        self.last_duration_s = None
+        self.last_success_at = None
+
+    def next_delay(self):
+        return self.interval_s + random.uniform(0, self.jitter_s)
+
+    def stats(self):
+        lag = time.time() - self.last_success_at if self.last_success_at else None
+        throughput = (self.last_rows / self.last_duration_s) if self.last_rows and self.last_duration_s else 0.0
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "rows_total": self.rows_total,
+            "last_rows": self.last_rows,
+            "lag_s": round(lag, 1) if lag is not None else None,
+            "rows_per_s": round(throughput, 1),
+        }
+
+
+# --- Plugin Registry ---
+SOURCES = {}
+RATE_LIMITS = {
+    # group: minimum seconds between starts of any source in the group
+    "waqi": 30,
+    "openaq": 10,
+    "open_meteo": 5,
+}
+
+def register_source(name, interval_s, jitter_s=0, rate_group=None, max_retries=DEFAULT_MAX_RETRIES):
+    """Decorator that registers a zero-argument ingestion callable as a source."""
+    def decorator(func):
+        SOURCES[name] = IngestionSource(name, func, interval_s, jitter_s, rate_group, max_retries)
+        return func
+    return decorator
+
+
+# The existing scripts are imported lazily so a broken optional source does
+# not stop the others from being scheduled.
+
+@register_source("waqi", interval_s=15 * 60, jitter_s=60, rate_group="waqi")
+def run_waqi():
+    from script.ingest_waqi import fetch_and_store_waqi_data
+    return fetch_and_store_waqi_data()
+
+@register_source("waqi_stations", interval_s=60 * 60, jitter_s=120, rate_group="waqi")
+def run_waqi_stations():
+    from script.master_ingestor import run_master_waqi_ingestion
+    return run_master_waqi_ingestion()
+
+@register_source("waqi_delhi", interval_s=60 * 60, jitter_s=120, rate_group="waqi")
+def run_waqi_delhi():
+    from script.ingest_korea_data import fetch_and_store_india_data
+    return fetch_and_store_india_data()
+
+@register_source("openaq", interval_s=30 * 60, jitter_s=120, rate_group="openaq")
+def run_openaq():
+    from script.ingest_openaq import fetch_and_store_openaq_data
+    return fetch_and_store_openaq_data()
+
+@register_source("weather", interval_s=3 * 60 * 60, jitter_s=300, rate_group="open_meteo")
+def run_weather():
+    from script.ingest_weather import fetch_and_store_weather_forecast
+    return fetch_and_store_weather_forecast()
+
+
+@register_source("rollups", interval_s=15 * 60, jitter_s=30)
+def run_rollups():
+    import timeseries
+    db = SessionLocal()
+    try:
+        written = timeseries.refresh_rollups(db)
+        db.commit()
+        return written
+    except Exception as e:
+        print(f"Error refreshing rollups: {e}")
+        db.rollback()
+        return None
+    finally:
+        db.close()
+
+@register_source("frame_bundles", interval_s=5 * 60, jitter_s=30)
+def run_frame_bundles():
+    import frame_bundles
+    db = SessionLocal()
+    try:
+        rebuilt = frame_bundles.rebuild_stale_bundles(db)
+        db.commit()
+        return rebuilt
+    except Exception as e:
+        print(f"Error rebuilding frame bundles: {e}")
+        db.rollback()
+        return None
+    finally:
+        db.close()
+
+# Alerts score users against the latest readings, so they run at the
+# cadence of the fastest air-quality source.
+@register_source("alerts", interval_s=15 * 60, jitter_s=30)
+def run_alerts():
+    import alert_engine
+    return alert_engine.run_alert_cycle().get("alerts", 0)
+
+# Hourly, so the 72-hour exposure windows move with the clock; the AQI
+# forecasts come from Open-Meteo like the weather.
+@register_source("exposure", interval_s=60 * 60, jitter_s=120, rate_group="open_meteo")
+def run_exposure():
+    import exposure_engine
+    return exposure_engine.run_exposure_cycle().get("windows", 0)
+
+@register_source("fusion", interval_s=30 * 60, jitter_s=60)
+def run_fusion():
+    import fusion_pipeline
+    try:
+        return fusion_pipeline.run(lookback_hours=6)
+    except Exception as e:
+        print(f"Error building fused surfaces: {e}")
+        return None
+
+
+def record_run(source, started_at, attempt, rows, status, error=None):
+    db = SessionLocal()
+    try:
+        db.execute(text("""
+            INSERT INTO ingestion_runs (source, started_at, finished_at, attempt, rows_written, status, error)
+            VALUES (:source, :started_at, NOW(), :attempt, :rows, :status, :error);
+        """), {"source": source, "started_at": started_at, "attempt": attempt,
+               "rows": rows, "status": status, "error": error})
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Could not record ingestion run for {source}: {e}")
+    finally:
+        db.close()
+
+
+async def run_once(source: IngestionSource, limiters: dict) -> bool:
+    """Runs one source, retrying with exponential backoff. Returns True on success."""
+    for attempt in range(1, source.max_retries + 1):
+        if source.rate_group in limiters:
+            await limiters[source.rate_group].acquire()
+
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        error = None
+        try:
+            rows = await asyncio.to_thread(source.run)
+        except Exception as e:
+            rows, error = None, f"{type(e).__name__}: {e}"
+        duration = time.perf_counter() - started
+
+        source.runs += 1
+        if rows is not None:
+            source.rows_total += rows
+            source.last_rows = rows
+            source.last_duration_s = duration
+            source.last_success_at = time.time()
+            await asyncio.to_thread(record_run, source.name, started_at, attempt, rows, "ok")
+            print(f"✅ [{source.name}] {rows} rows in {duration:.1f}s")
+            return True
+
+        source.failures += 1
+        await asyncio.to_thread(record_run, source.name, started_at, attempt, None, "failed", error)
+        if attempt < source.max_retries:
+            backoff = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            print(f"❌ [{source.name}] attempt {attempt} failed ({error or 'run reported a failure'}); retrying in {backoff:.0f}s")
+            await asyncio.sleep(backoff)
+
+    print(f"❌ [{source.name}] giving up until the next scheduled run.")
+    return False
+
+
+async def run_source_forever(source: IngestionSource, limiters: dict):
+    # Spread the first runs out so every source does not start at once.
+    await asyncio.sleep(random.uniform(0, source.jitter_s))
+    while True:
+        started = time.monotonic()
+        await run_once(source, limiters)
+        await asyncio.sleep(max(0.0, source.next_delay() - (time.monotonic() - started)))
+
+
+async def report_stats(sources, every_s=300):
+    while True:
+        await asyncio.sleep(every_s)
+        for source in sources:
+            print(f"[stats] {source.name}: {source.stats()}")
+
+
+async def main(only=None, once=False):
+    sources = [s for name, s in SOURCES.items() if not only or name in only]
+    if not sources:
+        print("No matching ingestion sources.")
+        return
+    limiters = {group: RateLimiter(interval) for group, interval in RATE_LIMITS.items()}
+    print(f"--- Ingestion daemon starting: {', '.join(s.name for s in sources)} ---")
+
+    if once:
+        results = await asyncio.gather(*(run_once(s, limiters) for s in sources))
+        for source, ok in zip(sources, results):
+            print(f"{'✅' if ok else '❌'} {source.name}: {source.stats()}")
+        return
+
+    await asyncio.gather(report_stats(sources), *(run_source_forever(s, limiters) for s in sources))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run all ingestion sources on a schedule.")
+    parser.add_argument("--once", action="store_true", help="run every source once and exit")
+    parser.add_argument("--only", help="comma-separated source names (default: all)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(only=set(args.only.split(",")) if args.only else None, once=args.once))
+    except KeyboardInterrupt:
+        print("Ingestion daemon stopped.")
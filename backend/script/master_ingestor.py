@@ -2,6 +2,9 @@ import requests
 import os
 from sqlalchemy import text
 from database import SessionLocal
+import schema_registry
+import aqi_calculator
+import analytics_store
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 
@@ -85,10 +88,12 @@ def run_master_waqi_ingestion():
     
     if not all_records_to_insert:
         print("\nNo new records found to insert.")
-        return
+        return 0
 
     # --- Bulk insert all collected data ---
     print(f"\nTotal valid records from all stations: {len(all_records_to_insert)}. Inserting into database...")
+    # WAQI "iaqi" values are per-pollutant sub-indices, not concentrations
+    aqi_calculator.annotate_records(all_records_to_insert, mode='sub_index')
     db = SessionLocal()
     try:
         # This dynamic query will handle records with different sets of pollutants
@@ -105,8 +110,11 @@ def run_master_waqi_ingestion():
             """)
             db.execute(insert_query, record)
         
+        schema_registry.record_ingested_rows(db, all_records_to_insert)
         db.commit()
+        analytics_store.append_station_records(all_records_to_insert)
         print(f"✅ Successfully inserted/updated {len(all_records_to_insert)} records.")
+        return len(all_records_to_insert)
     except Exception as e:
         print(f"Database error: {e}")
         db.rollback()
@@ -0,0 +1,44 @@
+import argparse
+import os
+import xarray as xr
+import rioxarray  # noqa: F401 - registers the .rio accessor
+import rasterio
+
+# --- CONFIGURATION ---
+# Converts a gridded TEMPO NetCDF into the GeoTIFF served by
+# /api/v1/tempo/metadata and /api/v1/tempo/tiles. This used to run inside
+# main.py at import time; run it once per new file instead.
+FILE_NAME = "TEMPO_NO2_L2_V03_20250916T214329Z_S012G07.nc"
+FILE_PATH = os.path.join("data", FILE_NAME)
+VARIABLE = "NO2_column_number_density"
+OUTPUT_PATH = os.getenv("TEMPO_TIF_PATH", "tempo.tif")
+
+
+def prepare_tempo_raster(file_path=FILE_PATH, variable=VARIABLE, output_path=OUTPUT_PATH, overwrite=False):
+    if not os.path.exists(file_path):
+        print(f"Error: Data file not found at {file_path}")
+        return None
+    if os.path.exists(output_path) and not overwrite:
+        print(f"{output_path} already exists; pass --overwrite to rebuild it.")
+        return output_path
+
+    print(f"Converting '{variable}' from {file_path} to {output_path}...")
+    with xr.open_dataset(file_path) as ds:
+        da = ds[variable].isel(time=0) if "time" in ds.dims else ds[variable]
+        # Write to a temporary name so the API never opens a half-written file
+        tmp_path = output_path + ".tmp"
+        da.rio.to_raster(tmp_path, driver="GTiff")
+    with rasterio.open(tmp_path, "r+") as dst:
+        dst.update_tags(variable=variable)
+    os.replace(tmp_path, output_path)
+    print(f"✅ Wrote {output_path}")
+    return output_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepare the TEMPO GeoTIFF served by the API.")
+    parser.add_argument("--file", default=FILE_PATH)
+    parser.add_argument("--variable", default=VARIABLE)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+    prepare_tempo_raster(args.file, args.variable, args.output, args.overwrite)
@@ -0,0 +1,140 @@
+# /backend/subsystems.py
+"""
+Heavy parts of the API, loaded on first use instead of when main.py is imported.
+
+Each subsystem is a named loader run at most once per process. main.py
+calls `get(name)` from the endpoints that need it, and its lifespan hook
+warms the ones listed in STARTUP_WARM in a background thread. The server
+therefore accepts requests as soon as the app is imported and
+/api/v1/health/ready reports what is warm. A loader that fails is retried
+on the next get(), so e.g. a TEMPO GeoTIFF produced after startup is
+picked up without a restart.
+
+    raster = subsystems.get("raster")
+    with raster.rasterio.open(path) as src: ...
+"""
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+# --- CONFIGURATION ---
+# Written offline by `python -m script.prepare_tempo_raster`; never at import.
+TEMPO_TIF_PATH = os.getenv("TEMPO_TIF_PATH", "tempo.tif")
+# Subsystems the lifespan hook loads in the background ("" to load everything lazily).
+STARTUP_WARM = [name for name in os.getenv("STARTUP_WARM", "raster,llm").split(",") if name]
+
+
+class Subsystem:
+    """A lazily loaded resource with its load status, for the readiness endpoint."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.status = "cold"          # cold -> loading -> ready | failed
+        self.load_seconds = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.status == "ready":
+            return self.value
+        with self._lock:
+            if self.status != "ready":
+                self.status = "loading"
+                start = time.perf_counter()
+                try:
+                    self.value = self.loader()
+                except Exception as e:
+                    self.status, self.error = "failed", f"{type(e).__name__}: {e}"
+                    raise
+                finally:
+                    self.load_seconds = round(time.perf_counter() - start, 3)
+                self.status, self.error = "ready", None
+        return self.value
+
+    def describe(self) -> dict:
+        return {"status": self.status, "load_seconds": self.load_seconds, "error": self.error}
+
+
+_registry = {}
+
+def register(name):
+    """Decorator registering a loader function as the subsystem `name`."""
+    def decorator(loader):
+        _registry[name] = Subsystem(name, loader)
+        return loader
+    return decorator
+
+def get(name):
+    return _registry[name].get()
+
+def warm(names=None):
+    """Loads the named subsystems (all of them by default), logging failures instead of raising."""
+    for name in names or list(_registry):
+        if name not in _registry:
+            print(f"❌ Unknown subsystem '{name}' in STARTUP_WARM")
+            continue
+        try:
+            get(name)
+            print(f"✅ Subsystem '{name}' warm in {_registry[name].load_seconds}s")
+        except Exception as e:
+            print(f"❌ Subsystem '{name}' failed to load: {e}")
+
+def status() -> dict:
+    return {name: subsystem.describe() for name, subsystem in _registry.items()}
+
+def is_ready(names=None) -> bool:
+    return all(_registry[name].status == "ready" for name in names or STARTUP_WARM if name in _registry)
+
+
+# --- Loaders ---
+
+@register("raster")
+def _load_raster():
+    """rasterio and the matplotlib colour maps used to render PNG tiles (no pyplot/GUI backend)."""
+    import rasterio
+    from rasterio.vrt import WarpedVRT
+    from rasterio.enums import Resampling
+    from matplotlib import colormaps, colors, image
+    return SimpleNamespace(rasterio=rasterio, WarpedVRT=WarpedVRT, Resampling=Resampling,
+                           colormaps=colormaps, colors=colors, image=image)
+
+@register("tempo_raster")
+def _load_tempo_raster():
+    """Metadata of the prepared TEMPO GeoTIFF; fails (and is retried) until the file exists."""
+    if not os.path.exists(TEMPO_TIF_PATH):
+        raise FileNotFoundError(f"{TEMPO_TIF_PATH} not prepared; run `python -m script.prepare_tempo_raster`")
+    rasterio = get("raster").rasterio
+    with rasterio.open(TEMPO_TIF_PATH) as src:
+        return {
+            "path": TEMPO_TIF_PATH,
+            "variable": src.tags().get("variable"),
+            "shape": (src.height, src.width),
+            "bounds": tuple(src.bounds),
+            "crs": str(src.crs),
+            "nodata": src.nodata,
+        }
+
+@register("analytics")
+def _load_analytics():
+    """The columnar analytics store (pandas/pyarrow), for long-range reads."""
+    import analytics_store
+    import pandas, pyarrow.dataset  # noqa: F401 - imported here so the first request doesn't pay for it
+    return analytics_store
+
+@register("gazetteer")
+def _load_gazetteer():
+    """The offline reverse geocoder: GeoNames places in a KD-tree (see geocoder.py)."""
+    import geocoder
+    return geocoder.Gazetteer()
+
+@register("llm")
+def _load_llm():
+    """The shared LLM client; for Gemini this imports and configures google.generativeai."""
+    from llm_client import get_llm_client, GeminiModel
+    client = get_llm_client()
+    if isinstance(client.model, GeminiModel):
+        client.model._get_model()
+    return client
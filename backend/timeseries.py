@@ -0,0 +1,185 @@
+# /backend/timeseries.py
+"""
+Historical time series for one location, downsampled on the server.
+
+Raw rows are read for short ranges. Longer ranges read the hourly or daily
+rollup tables, which are kept up to date by `refresh_rollups()` (an
+ingestion daemon source) and keyed by (latitude, longitude, bucket), so
+one location's history is a single index range scan. The result is then
+reduced to at most `points` values:
+
+- 'lttb': Largest-Triangle-Three-Buckets on the fetched series. It keeps the
+  visual shape, including peaks, and returns real samples.
+- 'bucket': fixed-width time buckets aggregated in SQL (avg/min/max). Only
+  `points` rows ever leave the database.
+
+Either way a year-long chart is a bounded payload.
+"""
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import text
+
+# --- CONFIGURATION ---
+POLLUTANTS = ['computed_aqi', 'pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
+RAW_MAX_RANGE = timedelta(days=3)        # longer ranges read the hourly rollup
+HOURLY_MAX_RANGE = timedelta(days=90)    # longer ranges read the daily rollup
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+SEARCH_RADIUS_DEG = 0.25                 # how far from the requested point a series may be
+ROLLUP_LOOKBACK = timedelta(hours=48)    # re-aggregated on every refresh, for late-arriving rows
+
+ROLLUP_TABLES = {"hourly": ("air_quality_hourly", "hour"), "daily": ("air_quality_daily", "day")}
+
+
+def _rollup_table_sql(table):
+    pollutant_columns = ",\n            ".join(f"{p}_avg DOUBLE PRECISION" for p in POLLUTANTS)
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            latitude DOUBLE PRECISION NOT NULL, longitude DOUBLE PRECISION NOT NULL,
+            bucket TIMESTAMPTZ NOT NULL, source TEXT, samples INTEGER NOT NULL,
+            computed_aqi_min DOUBLE PRECISION, computed_aqi_max DOUBLE PRECISION,
+            {pollutant_columns},
+            PRIMARY KEY (latitude, longitude, bucket)
+        );
+    """
+
+CREATE_ROLLUP_TABLES_SQL = [
+    *(_rollup_table_sql(table) for table, _ in ROLLUP_TABLES.values()),
+    "CREATE INDEX IF NOT EXISTS idx_air_quality_location_time ON air_quality_data (latitude, longitude, time);",
+]
+
+
+def _refresh_sql(table, unit):
+    avg_columns = [f"{p}_avg" for p in POLLUTANTS]
+    columns = ["latitude", "longitude", "bucket", "source", "samples",
+               "computed_aqi_min", "computed_aqi_max", *avg_columns]
+    return text(f"""
+        INSERT INTO {table} ({', '.join(columns)})
+        SELECT latitude, longitude, date_trunc('{unit}', time, 'UTC'), MAX(source), COUNT(*),
+               MIN(computed_aqi), MAX(computed_aqi), {', '.join(f'AVG({p})' for p in POLLUTANTS)}
+        FROM air_quality_data
+        WHERE time >= date_trunc('{unit}', CAST(:since AS TIMESTAMPTZ), 'UTC')
+          AND source NOT LIKE 'NASA-%'   -- satellite pixels are served from tempo_grid_data
+        GROUP BY latitude, longitude, date_trunc('{unit}', time, 'UTC')
+        ON CONFLICT (latitude, longitude, bucket) DO UPDATE SET
+            {', '.join(f'{c} = EXCLUDED.{c}' for c in columns[3:])};
+    """)
+
+_refresh_statements = {name: _refresh_sql(table, unit) for name, (table, unit) in ROLLUP_TABLES.items()}
+
+def refresh_rollups(db, since=None) -> int:
+    """
+    Re-aggregates every hourly and daily bucket from `since` (default
+    ROLLUP_LOOKBACK ago; pass datetime.min for a full rebuild) onwards.
+    Returns the number of rollup rows written.
+    """
+    if since is None:
+        since = datetime.now(timezone.utc) - ROLLUP_LOOKBACK
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return sum(db.execute(statement, {"since": since}).rowcount for statement in _refresh_statements.values())
+
+
+# --- Downsampling ---
+
+def lttb(x, y, n_out: int) -> np.ndarray:
+    """
+    Indices of the n_out points Largest-Triangle-Three-Buckets keeps from
+    (x, y), always including the first and last. x must be increasing.
+    """
+    n = len(x)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # n_out - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i == n_out - 3:
+            next_x, next_y = x[-1], y[-1]
+        else:
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        # Twice the area of the triangle (a, candidate, next-bucket average)
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+# --- Queries ---
+
+def choose_resolution(start: datetime, end: datetime, resolution: str = 'auto') -> str:
+    if resolution != 'auto':
+        return resolution
+    span = end - start
+    if span <= RAW_MAX_RANGE:
+        return 'raw'
+    return 'hourly' if span <= HOURLY_MAX_RANGE else 'daily'
+
+def _source(resolution, pollutant):
+    """(table, time column, value column, row filter) for a resolution."""
+    if resolution == 'raw':
+        # Same exclusion the rollups are built with, so every resolution serves ground stations
+        return "air_quality_data", "time", pollutant, "source NOT LIKE 'NASA-%'"
+    return ROLLUP_TABLES[resolution][0], "bucket", f"{pollutant}_avg", "TRUE"
+
+def nearest_location(db, lat, lon, resolution, pollutant, start, end):
+    """The closest location within SEARCH_RADIUS_DEG with data in the range, or None."""
+    table, time_col, value_col, row_filter = _source(resolution, pollutant)
+    return db.execute(text(f"""
+        SELECT latitude, longitude, MAX(source) AS source
+        FROM {table}
+        WHERE latitude BETWEEN :lat - :r AND :lat + :r
+          AND longitude BETWEEN :lon - :r AND :lon + :r
+          AND {time_col} >= :start AND {time_col} < :end
+          AND {value_col} IS NOT NULL AND {row_filter}
+        GROUP BY latitude, longitude
+        ORDER BY (latitude - :lat) ^ 2 + (longitude - :lon) ^ 2
+        LIMIT 1;
+    """), {"lat": lat, "lon": lon, "r": SEARCH_RADIUS_DEG, "start": start, "end": end}).mappings().first()
+
+def get_history(db, lat: float, lon: float, start: datetime, end: datetime, pollutant: str = 'computed_aqi',
+                points: int = DEFAULT_POINTS, method: str = 'lttb', resolution: str = 'auto') -> dict:
+    """Downsampled series of `pollutant` at the location nearest (lat, lon) over [start, end)."""
+    points = max(3, min(points, MAX_POINTS))
+    resolution = choose_resolution(start, end, resolution)
+    location = nearest_location(db, lat, lon, resolution, pollutant, start, end)
+    result = {"pollutant": pollutant, "resolution": resolution, "method": method,
+              "start": start, "end": end, "location": dict(location) if location else None, "points": []}
+    if not location:
+        return result
+
+    table, time_col, value_col, row_filter = _source(resolution, pollutant)
+    params = {"lat": location["latitude"], "lon": location["longitude"], "start": start, "end": end}
+    where = (f"latitude = :lat AND longitude = :lon AND {time_col} >= :start AND {time_col} < :end "
+             f"AND {value_col} IS NOT NULL AND {row_filter}")
+
+    if method == 'bucket':
+        params["width"] = max((end - start).total_seconds() / points, 1.0)
+        rows = db.execute(text(f"""
+            SELECT to_timestamp(floor(extract(epoch FROM {time_col}) / :width) * :width) AS time,
+                   AVG({value_col}) AS value, MIN({value_col}) AS min, MAX({value_col}) AS max,
+                   COUNT(*) AS samples
+            FROM {table} WHERE {where}
+            GROUP BY 1 ORDER BY 1;
+        """), params).mappings().all()
+        result["points"] = [{**row, "value": round(row["value"], 2)} for row in rows]
+        return result
+
+    rows = db.execute(text(f"SELECT {time_col} AS time, {value_col} AS value FROM {table} WHERE {where} ORDER BY {time_col};"),
+                      params).all()
+    if not rows:
+        return result
+    times = [row[0] for row in rows]
+    values = np.array([row[1] for row in rows], dtype=float)
+    seconds = np.array([t.timestamp() for t in times])
+    keep = lttb(seconds, values, points)
+    result["points"] = [{"time": times[i], "value": round(float(values[i]), 2)} for i in keep]
+    return result
@@ -1,5 +1,20 @@
+from datetime import datetime
 from sqlalchemy import text, inspect
-from database import engine
+from database import engine, SessionLocal
+import schema_registry
+import alert_engine
+import exposure_engine
+import rules_engine
+import aqi_calculator
+import weather_grid
+import timeseries
+import frame_bundles
+import geocoder
+import report_media
+import reports_query
+from script.ingest_waqi import CREATE_STATION_STATE_SQL
+from script.ingestion_daemon import CREATE_INGESTION_RUNS_SQL
+from script.ingest_tempo import TEMPO_RESOLUTION_SQL
 
 def main():
     """
@@ -47,6 +62,7 @@ def main():
                 PRIMARY KEY (time, latitude, longitude)
             );
         """,
+        "Add resolution_level to tempo_grid_data": TEMPO_RESOLUTION_SQL,
         "Add columns to air_quality_data": [
             "ALTER TABLE air_quality_data ADD COLUMN IF NOT EXISTS pm10 DOUBLE PRECISION;",
             "ALTER TABLE air_quality_data ADD COLUMN IF NOT EXISTS so2 DOUBLE PRECISION;",
@@ -65,6 +81,19 @@ def main():
              "ALTER TABLE users ADD COLUMN IF NOT EXISTS outdoor_schedule JSONB;",
         "ALTER TABLE users ADD COLUMN IF NOT EXISTS podcast_keywords JSONB;",
         ],
+        "Add computed_aqi to air_quality_data": aqi_calculator.ADD_COMPUTED_AQI_COLUMNS_SQL,
+        "Create pollutant_availability": schema_registry.CREATE_AVAILABILITY_TABLE_SQL,
+        "Create alerts and user_alert_state": alert_engine.CREATE_ALERT_TABLES_SQL,
+        "Create aqi_forecasts and exposure_forecasts": exposure_engine.CREATE_EXPOSURE_TABLES_SQL,
+        "Create alert_rules and health_condition_rules": rules_engine.CREATE_RULES_TABLES_SQL,
+        "Index weather_forecasts by location": weather_grid.CREATE_WEATHER_INDEX_SQL,
+        "Create waqi_station_state": CREATE_STATION_STATE_SQL,
+        "Create air_quality hourly/daily rollups": timeseries.CREATE_ROLLUP_TABLES_SQL,
+        "Create frame_bundles": frame_bundles.CREATE_FRAME_BUNDLES_SQL,
+        "Create ingestion_runs": CREATE_INGESTION_RUNS_SQL,
+        "Create geocode_cache": geocoder.CREATE_GEOCODE_CACHE_SQL,
+        "Add media columns to citizen_reports": report_media.ADD_REPORT_MEDIA_COLUMNS_SQL,
+        "Index citizen_reports by location and time": reports_query.CREATE_REPORTS_INDEXES_SQL,
         "Add constraint to air_quality_data": """
             ALTER TABLE air_quality_data 
             ADD CONSTRAINT unique_measurement UNIQUE (time, latitude, longitude);
@@ -90,6 +119,32 @@ def main():
                     print(f"  ...AN ERROR OCCURRED: {e}")
                     # We don't stop, we try the next command
     
+    # Drop cached column lists and rebuild the availability registry so
+    # readers see the new schema immediately.
+    schema_registry.refresh_schema()
+    print("- Rebuilding pollutant availability registry...")
+    db = SessionLocal()
+    try:
+        schema_registry.rebuild_availability(db)
+        print("  ...OK")
+        print("- Seeding default alert rules...")
+        rules_engine.seed_default_rules(db)
+        rules_engine.get_rules(refresh=True)
+        print("  ...OK")
+        print("- Backfilling computed_aqi for existing rows...")
+        updated = aqi_calculator.recompute_rows(db, "computed_aqi IS NULL AND source NOT LIKE 'NASA-%'")
+        db.commit()
+        print(f"  ...OK ({updated} rows)")
+        print("- Rebuilding hourly/daily rollups...")
+        written = timeseries.refresh_rollups(db, since=datetime.min)
+        db.commit()
+        print(f"  ...OK ({written} rows)")
+    except Exception as e:
+        db.rollback()
+        print(f"  ...AN ERROR OCCURRED: {e}")
+    finally:
+        db.close()
+
     print("\n✅ Schema update process complete.")
 
 
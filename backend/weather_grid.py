@@ -0,0 +1,166 @@
+# /backend/weather_grid.py
+"""
+Hourly weather on a regular lat/lon grid.
+
+Points are multiples of GRID_STEP_DEG (a power of two, so every grid
+coordinate is exact in floating point). Any location's weather is then the
+row at its snapped coordinates — an equality join on the
+(latitude, longitude, time) index rather than a nearest-neighbour search:
+
+    JOIN weather_forecasts wf
+      ON wf.latitude = ROUND(aq.latitude / 0.5) * 0.5
+     AND wf.longitude = ROUND(aq.longitude / 0.5) * 0.5
+     AND wf.time = date_trunc('hour', aq.time, 'UTC')
+
+(`snap_join_sql` builds that clause.) Rows are upserted, never deleted, so
+each hour is first written as a forecast and later overwritten by the
+past_days reanalysis, which keeps a consistent history for training.
+
+Open-Meteo counts every location in a request against its per-minute and
+daily quotas, so batches are paced to LOCATIONS_PER_MINUTE and a batch that
+gets HTTP 429 backs off and retries on its own. A batch that still fails is
+logged and skipped; the others are stored. The full grid over the default
+bbox is several thousand locations, so the daemon fetches only the station
+cells unless WEATHER_MODE says otherwise.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from sqlalchemy import text
+import bulk_writer
+
+# --- CONFIGURATION ---
+API_URL = os.getenv("OPEN_METEO_WEATHER_URL", "https://api.open-meteo.com") + "/v1/forecast"
+GRID_STEP_DEG = float(os.getenv("WEATHER_GRID_STEP_DEG", "0.5"))   # keep it a power of two
+# lat_min, lon_min, lat_max, lon_max (India, as the WAQI ingestor)
+GRID_BBOX = tuple(float(v) for v in os.getenv("WEATHER_GRID_BBOX", "8,68,37,97").split(","))
+LOCATIONS_PER_REQUEST = 100           # Open-Meteo accepts comma-separated coordinate lists
+MAX_CONCURRENT_REQUESTS = 4
+LOCATIONS_PER_MINUTE = int(os.getenv("OPEN_METEO_LOCATIONS_PER_MINUTE", "500"))   # free tier allows 600
+MAX_RETRIES = 4
+FORECAST_DAYS = 7
+PAST_DAYS = 1                         # re-fetch yesterday so forecasts are replaced by analysis
+VARIABLES = ['temperature_2m', 'relative_humidity_2m', 'precipitation', 'wind_speed_10m']
+
+COLUMN_TYPES = {
+    "time": "TIMESTAMPTZ", "latitude": "DOUBLE PRECISION", "longitude": "DOUBLE PRECISION",
+    **{v: "DOUBLE PRECISION" for v in VARIABLES},
+}
+
+CREATE_WEATHER_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_weather_forecasts_location_time
+    ON weather_forecasts (latitude, longitude, time);
+"""
+
+
+def snap(values, step: float = GRID_STEP_DEG):
+    """Coordinates -> the nearest grid coordinate."""
+    return np.round(np.asarray(values, dtype=float) / step) * step
+
+def snap_join_sql(weather_alias: str = "wf", data_alias: str = "aq", step: float = GRID_STEP_DEG) -> str:
+    """ON-clause joining hourly weather to rows of another table at their nearest grid point."""
+    return (f"{weather_alias}.latitude = ROUND({data_alias}.latitude / {step}) * {step} "
+            f"AND {weather_alias}.longitude = ROUND({data_alias}.longitude / {step}) * {step} "
+            f"AND {weather_alias}.time = date_trunc('hour', {data_alias}.time, 'UTC')")
+
+def grid_points(bbox=GRID_BBOX, step: float = GRID_STEP_DEG):
+    """All grid points inside bbox as a list of (lat, lon)."""
+    lat_min, lon_min, lat_max, lon_max = bbox
+    lats = snap(np.arange(lat_min, lat_max + step / 2, step), step)
+    lons = snap(np.arange(lon_min, lon_max + step / 2, step), step)
+    grid_lat, grid_lon = np.meshgrid(lats, lons, indexing='ij')
+    return list(zip(grid_lat.ravel().tolist(), grid_lon.ravel().tolist()))
+
+def station_points(db, step: float = GRID_STEP_DEG):
+    """The grid points nearest to every location that has air quality data."""
+    rows = db.execute(text(f"""
+        SELECT DISTINCT ROUND(latitude / {step}) * {step}, ROUND(longitude / {step}) * {step}
+        FROM air_quality_data;
+    """)).all()
+    return [(float(lat), float(lon)) for lat, lon in rows]
+
+
+class _Pacer:
+    """Spaces requests so that no more than `per_minute` locations are requested per minute."""
+
+    def __init__(self, per_minute: int):
+        self.seconds_per_location = 60.0 / max(1, per_minute)
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self, locations: int):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_slot)
+            self.next_slot = start + locations * self.seconds_per_location
+        time.sleep(start - now)
+
+_pacer = _Pacer(LOCATIONS_PER_MINUTE)
+
+
+def _fetch_batch(points):
+    """Open-Meteo results for one batch, or None once MAX_RETRIES attempts have failed."""
+    params = {
+        "latitude": ",".join(f"{lat:.4f}" for lat, _ in points),
+        "longitude": ",".join(f"{lon:.4f}" for _, lon in points),
+        "hourly": ",".join(VARIABLES),
+        "forecast_days": FORECAST_DAYS,
+        "past_days": PAST_DAYS,
+        "timeformat": "unixtime",
+    }
+    for attempt in range(MAX_RETRIES):
+        _pacer.wait(len(points))
+        try:
+            response = requests.get(API_URL, params=params, timeout=60)
+            if response.status_code == 429:
+                retry_after = response.headers.get("Retry-After", "")
+                time.sleep(int(retry_after) if retry_after.isdigit() else 2 ** attempt * 15)
+                continue
+            response.raise_for_status()
+            data = response.json()
+            return data if isinstance(data, list) else [data]
+        except requests.exceptions.RequestException as e:
+            print(f"Weather batch of {len(points)} locations failed (attempt {attempt + 1}): {e}")
+            time.sleep(2 ** attempt)
+    return None
+
+def fetch_weather(points) -> dict:
+    """
+    Fetches hourly weather for every point, LOCATIONS_PER_REQUEST per call
+    and MAX_CONCURRENT_REQUESTS calls at a time. Returns equal-length
+    columns keyed like COLUMN_TYPES for the batches that succeeded; raises
+    RequestException only if none did. Coordinates are the requested (grid)
+    ones, not the model cell Open-Meteo echoes back.
+    """
+    batches = [points[i:i + LOCATIONS_PER_REQUEST] for i in range(0, len(points), LOCATIONS_PER_REQUEST)]
+    parts = {name: [] for name in COLUMN_TYPES}
+    failed = 0
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as pool:
+        for batch, results in zip(batches, pool.map(_fetch_batch, batches)):
+            if results is None:
+                failed += 1
+                continue
+            for (lat, lon), result in zip(batch, results):
+                hourly = result.get('hourly', {})
+                ts = np.asarray(hourly.get('time', []), dtype=np.int64)
+                parts["time"].append(ts)
+                parts["latitude"].append(np.full(len(ts), lat))
+                parts["longitude"].append(np.full(len(ts), lon))
+                for var in VARIABLES:
+                    parts[var].append(np.asarray(hourly.get(var) or [np.nan] * len(ts), dtype=float))
+
+    if batches and failed == len(batches):
+        raise requests.exceptions.RequestException(f"All {failed} weather batches failed.")
+    if failed:
+        print(f"❌ {failed} of {len(batches)} weather batches failed; storing the rest.")
+    columns = {name: np.concatenate(arrays) if arrays else np.array([]) for name, arrays in parts.items()}
+    columns["time"] = columns["time"].astype('datetime64[s]')
+    return columns
+
+def store_weather(db, columns: dict) -> int:
+    """Upserts weather columns by (time, latitude, longitude); nothing is deleted."""
+    return bulk_writer.upsert_columns(db, "weather_forecasts", columns, COLUMN_TYPES,
+                                      conflict_columns=["time", "latitude", "longitude"])
@@ -1,14 +1,13 @@
 "use client";
 
 import React, { useState, useEffect } from "react";
-import Map, { ViewState } from "react-map-gl/maplibre";
+import Map, { ViewState, Source, Layer } from "react-map-gl/maplibre";
 import DeckGL from "@deck.gl/react";
-import { HeatmapLayer } from "@deck.gl/aggregation-layers";
-import { Color } from "@deck.gl/core";
 import "maplibre-gl/dist/maplibre-gl.css";
 
 // --- CONSTANTS ---
 const MAP_STYLE = "https://basemaps.cartocdn.com/gl/dark-matter-gl-style/style.json";
+const API_BASE = "http://127.0.0.1:8000";
 
 // The initial camera position, zoomed out to show a global view
 const INITIAL_VIEW_STATE: ViewState = {
@@ -20,25 +19,28 @@ const INITIAL_VIEW_STATE: ViewState = {
   padding: { top: 0, right: 0, bottom: 0, left: 0 }
 };
 
-// A beautiful color range for the heatmap visualization
-const HEATMAP_COLOR_RANGE: Color[] = [
-    [76, 175, 80, 0], [76, 175, 80, 180], [255, 235, 59, 200],
-    [255, 152, 0, 220], [244, 67, 54, 240], [156, 39, 176, 255]
-];
+// The fused TEMPO + ground-station surface, served as map tiles (backend/fusion_pipeline.py)
+interface FusedLayer {
+  variable: string;
+  hour: string;
+  tiles: string;
+  vmin: number;
+  vmax: number;
+}
 
 export default function TempoMapPage() {
   const [viewState, setViewState] = useState<ViewState>(INITIAL_VIEW_STATE);
-  const [mapData, setMapData] = useState([]);
+  const [fusedLayer, setFusedLayer] = useState<FusedLayer | null>(null);
   const [isLoading, setIsLoading] = useState(true);
 
-  // Fetch the combined data from our new, unified backend endpoint
+  // Fetch the description of the newest fused layer; the tiles load as the map moves
   useEffect(() => {
     const fetchData = async () => {
       setIsLoading(true);
       try {
-        const response = await fetch("http://127.0.0.1:8000/api/v1/maps/combined_view");
+        const response = await fetch(`${API_BASE}/api/v1/maps/combined_view`);
         const data = await response.json();
-        setMapData(data);
+        if (!data.error) setFusedLayer(data);
       } catch (error) {
         console.error("Failed to fetch combined map data:", error);
       } finally {
@@ -48,33 +50,28 @@ export default function TempoMapPage() {
     fetchData();
   }, []);
 
-  // Use the HeatmapLayer to create a smooth, blended visualization
-  const layers = [
-    new HeatmapLayer({
-      id: 'combined-heatmap-layer',
-      data: mapData,
-      getPosition: (d: any) => [d.lon, d.lat],
-      getWeight: (d: any) => d.aqi,
-      radiusPixels: 60,
-      intensity: 1.2,
-      colorRange: HEATMAP_COLOR_RANGE,
-    }),
-  ];
-
   return (
     <div style={{ width: "100vw", height: "100vh", position: "relative" }}>
       <DeckGL
-        layers={layers}
         viewState={viewState}
         onViewStateChange={e => setViewState(e.viewState)}
         controller={true}
       >
-        <Map mapStyle={MAP_STYLE} reuseMaps />
+        <Map mapStyle={MAP_STYLE} reuseMaps>
+          {fusedLayer && (
+            <Source key={fusedLayer.hour} id="fused-surface" type="raster" tiles={[`${API_BASE}${fusedLayer.tiles}`]} tileSize={256}>
+              <Layer id="fused-surface-layer" type="raster" paint={{ "raster-opacity": 0.75 }} />
+            </Source>
+          )}
+        </Map>
       </DeckGL>
       
       <div className="absolute bottom-4 left-4 bg-black/50 text-white p-4 rounded-lg text-sm shadow-lg">
         <p className="font-bold text-lg">Global Air Quality View</p>
-        <p>Source: NASA TEMPO & Ground Stations</p>
+        <p>Source: NASA TEMPO & Ground Stations (fused NO2)</p>
+        {fusedLayer && (
+          <p>{new Date(fusedLayer.hour).toLocaleString()} · {fusedLayer.vmin.toFixed(1)}–{fusedLayer.vmax.toFixed(1)}</p>
+        )}
       </div>
 
       {isLoading && (
@@ -5,8 +5,9 @@ import Map, { ViewState, ViewStateChangeEvent } from "react-map-gl/maplibre";
 import DeckGL from "@deck.gl/react";
 import { HeatmapLayer } from "@deck.gl/aggregation-layers";
 import { IconLayer, ScatterplotLayer, TextLayer } from "@deck.gl/layers";
-import { Color } from "@deck.gl/core";
+import { Color, WebMercatorViewport } from "@deck.gl/core";
 import "maplibre-gl/dist/maplibre-gl.css";
+import { DecodedFrames, decodeFrameBundle, framePoints } from "@/lib/frameBundle";
 
 // --- TYPE DEFINITIONS ---
 interface MapContainerProps {
@@ -43,27 +44,34 @@ export default function MapContainer({
   onViewStateChange 
 }: MapContainerProps) {
   
-  const [gridData, setGridData] = useState([]);
+  const [frames, setFrames] = useState<DecodedFrames | null>(null);
   const [stationData, setStationData] = useState([]);
   const [globalStationData, setGlobalStationData] = useState([]);
   const [citizenReports, setCitizenReports] = useState([]);
 
-  // Effect to fetch heatmap data
+  // Effect to fetch heatmap data: one frame bundle per layer; scrubbing is client-side
   useEffect(() => {
     const fetchData = async () => {
       // Only fetch if a heatmap layer is active
       if (!activeLayer || ['stations', 'global_stations', 'citizen'].includes(activeLayer)) {
-        setGridData([]);
+        setFrames(null);
         return;
       }
       const pollutantQuery = activeLayer === 'aqi' ? 'auto' : activeLayer;
       try {
-        const response = await fetch(`http://127.0.0.1:8000/api/v1/grid/current?pollutant=${pollutantQuery}&time_offset=${timeOffset}`);
-        setGridData(await response.json());
-      } catch (error) { console.error("Failed to fetch grid data:", error); }
+        const response = await fetch(`http://127.0.0.1:8000/api/v1/grid/frames?pollutant=${pollutantQuery}`);
+        const bundle = await response.json();
+        setFrames(bundle.frames ? await decodeFrameBundle(bundle) : null);
+      } catch (error) { console.error("Failed to fetch grid frames:", error); }
     };
     fetchData();
-  }, [activeLayer, timeOffset]);
+  }, [activeLayer]);
+
+  // The last frame is "Now"; offsets past it have no data yet
+  const gridData = useMemo(
+    () => (frames && timeOffset <= 0 ? framePoints(frames, frames.frames.length - 1 + timeOffset) : []),
+    [frames, timeOffset]
+  );
 
   // Effect to fetch live station data (India)
   useEffect(() => {
@@ -87,19 +95,29 @@ export default function MapContainer({
     fetchGlobalData();
   }, []);
 
-  // Effect to fetch citizen reports
+  // Effect to fetch citizen reports for the visible viewport (clustered by the server when zoomed out)
   useEffect(() => {
-    const fetchReports = async () => {
+    if (activeLayer !== 'citizen') return;
+    const viewport = new WebMercatorViewport({ ...viewState, width: window.innerWidth, height: window.innerHeight });
+    const [[west, south], [east, north]] = [viewport.unproject([0, window.innerHeight]), viewport.unproject([window.innerWidth, 0])];
+    const bbox = [west, south, east, north].map(v => v.toFixed(3)).join(",");
+    const zoom = Math.floor(viewState.zoom);
+
+    // Wait for panning to settle before asking for the new viewport
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
       try {
-        const response = await fetch("http://127.0.0.1:8000/api/v1/reports/verified");
+        const response = await fetch(`http://127.0.0.1:8000/api/v1/reports/verified?bbox=${bbox}&zoom=${zoom}`, { signal: controller.signal });
         if (response.ok) {
             const reports = await response.json();
-            if (Array.isArray(reports)) setCitizenReports(reports);
+            if (Array.isArray(reports.items)) setCitizenReports(reports.items);
         }
-      } catch (error) { console.error("Failed to fetch citizen reports:", error); }
-    };
-    fetchReports();
-  }, []);
+      } catch (error) {
+        if ((error as Error).name !== "AbortError") console.error("Failed to fetch citizen reports:", error);
+      }
+    }, 300);
+    return () => { clearTimeout(timer); controller.abort(); };
+  }, [activeLayer, viewState]);
 
   // Prepare layers for Deck.gl using the performant 'visible' property
   const layers = useMemo(() => [
@@ -143,7 +161,7 @@ export default function MapContainer({
         iconMapping: { "marker": { "x": 0, "y": 0, "width": 128, "height": 128, "mask": true } },
         getIcon: d => 'marker',
         getPosition: d => [d.lon, d.lat],
-        getSize: 40,
+        getSize: (d: any) => d.count ? 40 + 8 * Math.log2(d.count) : 40, // clusters grow with their report count
         getColor: [255, 0, 0, 255],
     })
   ], [activeLayer, gridData, stationData, globalStationData, citizenReports]);
@@ -0,0 +1,58 @@
+// /frontend/src/lib/frameBundle.ts
+// Decoder for /api/v1/grid/frames (see backend/frame_bundles.py): one download
+// holds every hourly frame, so the time scrubber never goes back to the server.
+
+export interface FrameBundle {
+  pollutant: string;
+  anchor: string;
+  frames: string[];
+  cells: { lat: number[]; lon: number[] };
+  encoding: { dtype: "uint8" | "uint16"; offset: number; scale: number; nodata: number };
+  data: string;
+}
+
+export interface DecodedFrames {
+  frames: string[];
+  lat: number[];
+  lon: number[];
+  values: Float32Array[]; // one per frame, NaN where a cell has no value
+}
+
+async function inflate(base64: string): Promise<ArrayBuffer> {
+  const bytes = Uint8Array.from(atob(base64), c => c.charCodeAt(0));
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("deflate"));
+  return new Response(stream).arrayBuffer();
+}
+
+export async function decodeFrameBundle(bundle: FrameBundle): Promise<DecodedFrames> {
+  const { dtype, offset, scale, nodata } = bundle.encoding;
+  const nFrames = bundle.frames.length;
+  const nCells = bundle.cells.lat.length;
+  const buffer = await inflate(bundle.data);
+  const deltas = dtype === "uint8" ? new Uint8Array(buffer) : new Uint16Array(buffer);
+  const mask = dtype === "uint8" ? 0xff : 0xffff;
+
+  // Undo the frame-to-frame deltas (they wrap within the dtype) and dequantize
+  const q = new Uint32Array(nCells);
+  const values: Float32Array[] = [];
+  for (let f = 0; f < nFrames; f++) {
+    const frame = new Float32Array(nCells);
+    for (let c = 0; c < nCells; c++) {
+      q[c] = f === 0 ? deltas[c] : (q[c] + deltas[f * nCells + c]) & mask;
+      frame[c] = q[c] === nodata ? NaN : offset + q[c] * scale;
+    }
+    values.push(frame);
+  }
+  return { frames: bundle.frames, lat: bundle.cells.lat, lon: bundle.cells.lon, values };
+}
+
+// Points for one frame in the shape the heatmap layer expects
+export function framePoints(decoded: DecodedFrames, frameIndex: number) {
+  const frame = decoded.values[frameIndex];
+  if (!frame) return [];
+  const points = [];
+  for (let c = 0; c < frame.length; c++) {
+    if (!Number.isNaN(frame[c])) points.push({ lat: decoded.lat[c], lon: decoded.lon[c], aqi: frame[c] });
+  }
+  return points;
+}